@@ -0,0 +1,148 @@
+"""Fill in missing city/state/country on courses from their coordinates.
+
+Admin-created courses and approved new-course requests often only carry a
+name and a pin. This walks every course with a blank location field in id
+order, resolves each chunk in parallel through a reverse geocoder, and
+commits one transaction per chunk. After each commit the last processed id
+is checkpointed to disk, so an interrupted run picks up where it stopped.
+
+    uv run python -m app.backfill --dry-run            # print the diff only
+    uv run python -m app.backfill                      # offline geocoder
+    uv run python -m app.backfill --geocoder nominatim # also fills city (1 req/s)
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.geocoder import GeoResult, NominatimGeocoder, ReverseGeocoder, get_geocoder
+from app.models import Courses
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("city", "state", "country")
+DEFAULT_CHECKPOINT = Path("backfill_checkpoint.json")
+
+
+def _blank(column):
+    return or_(column.is_(None), column == "")
+
+
+def read_checkpoint(path: Path) -> int:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))["last_id"]
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: Path, last_id: int) -> None:
+    # Write-then-rename so a crash mid-write can't leave a truncated checkpoint.
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"last_id": last_id}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def iter_chunks(db: Session, after_id: int, chunk_size: int) -> Iterator[list[tuple]]:
+    """Keyset-paginate courses with any blank location field, by ascending id."""
+    while True:
+        rows = (
+            db.query(Courses.id, Courses.latitude, Courses.longitude, Courses.city, Courses.state, Courses.country)
+            .filter(
+                Courses.id > after_id,
+                Courses.latitude.isnot(None),
+                Courses.longitude.isnot(None),
+                or_(*(_blank(getattr(Courses, field)) for field in FIELDS)),
+            )
+            .order_by(Courses.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+
+def changes_for(row, match: GeoResult | None) -> dict[str, str]:
+    """Only blank fields are filled — existing values are never overwritten."""
+    if match is None:
+        return {}
+    return {field: getattr(match, field) for field in FIELDS if not getattr(row, field) and getattr(match, field)}
+
+
+def run_backfill(
+    session_factory: Callable[[], Session],
+    geocoder: ReverseGeocoder,
+    *,
+    checkpoint: Path = DEFAULT_CHECKPOINT,
+    chunk_size: int = 500,
+    workers: int = 8,
+    dry_run: bool = False,
+    out=sys.stdout,
+) -> dict[str, int]:
+    # A dry run neither reads nor advances the checkpoint: it should show
+    # everything a real run would still do.
+    after_id = 0 if dry_run else read_checkpoint(checkpoint)
+    totals = {"scanned": 0, "updated": 0}
+    db = session_factory()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for rows in iter_chunks(db, after_id, chunk_size):
+                matches = pool.map(lambda r: geocoder.reverse(r.latitude, r.longitude), rows)
+                updates = {}
+                for row, match in zip(rows, matches, strict=True):
+                    changes = changes_for(row, match)
+                    if changes:
+                        updates[row.id] = changes
+                        if dry_run:
+                            diff = ", ".join(f"{f}: {getattr(row, f)!r} -> {v!r}" for f, v in changes.items())
+                            print(f"course {row.id}: {diff}", file=out)
+                if not dry_run:
+                    for course_id, changes in updates.items():
+                        db.query(Courses).filter(Courses.id == course_id).update(changes, synchronize_session=False)
+                    db.commit()
+                    write_checkpoint(checkpoint, rows[-1].id)
+                totals["scanned"] += len(rows)
+                totals["updated"] += len(updates)
+                logger.info("Backfill through course %s: %s", rows[-1].id, totals)
+    finally:
+        db.close()
+    return totals
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="print the changes without writing anything")
+    parser.add_argument("--geocoder", choices=("offline", "nominatim"), default="offline")
+    parser.add_argument("--chunk-size", type=int, default=500, help="courses per transaction")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    if args.restart:
+        args.checkpoint.unlink(missing_ok=True)
+    geocoder = NominatimGeocoder(user_agent="golfmapper3-backfill") if args.geocoder == "nominatim" else get_geocoder()
+    totals = run_backfill(
+        SessionLocal,
+        geocoder,
+        checkpoint=args.checkpoint,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+    )
+    print(f"Scanned {totals['scanned']} courses, {'would update' if args.dry_run else 'updated'} {totals['updated']}.")
+
+
+if __name__ == "__main__":
+    main()
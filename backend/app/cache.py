@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Hashable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# The app runs as a single uvicorn process (see Dockerfile), so in-process
+# state is the source of truth for "has this data changed since I cached
+# it". Counters start over on restart, which is fine: so do the caches.
+
+
+def content_etag(content: str | bytes) -> str:
+    """A strong ETag derived from the bytes themselves."""
+    if isinstance(content, str):
+        content = content.encode()
+    return '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+
+
+class DataVersions:
+    """Monotonic counters bumped on every write that changes a user's courses.
+
+    Anything derived from a user's data caches against `user(user_id)`; a
+    write only has to bump the counter, never know which caches exist.
+    Per-year derivations cache against `user_year(user_id, year)` instead,
+    so a write touching one year leaves every other year's entries valid.
+    Every bump also moves `data()`, for things derived from everyone's data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = 0
+        self._users: dict[int, int] = defaultdict(int)
+        # Bumped by writes that aren't tied to specific years — invalidates all of them.
+        self._user_epochs: dict[int, int] = defaultdict(int)
+        self._user_years: dict[tuple[int, int | None], int] = defaultdict(int)
+        self._catalog = 0
+
+    def data(self) -> int:
+        """Bumped by every user_courses, courses and users write."""
+        return self._data
+
+    def bump_accounts(self) -> None:
+        """A users row changed (created, (de)activated, role change)."""
+        with self._lock:
+            self._data += 1
+
+    def catalog(self) -> int:
+        """Bumped whenever a course row is created, edited or deleted."""
+        return self._catalog
+
+    def bump_catalog(self) -> None:
+        with self._lock:
+            self._data += 1
+            self._catalog += 1
+
+    def user(self, user_id: int) -> int:
+        return self._users.get(user_id, 0)
+
+    def user_year(self, user_id: int, year: int | None) -> tuple[int, int]:
+        return self._user_epochs.get(user_id, 0), self._user_years.get((user_id, year), 0)
+
+    def bump_user(self, user_id: int, years: Iterable[int | None] | None = None) -> None:
+        """Record a change to a user's data; `years=None` means it may affect any year."""
+        with self._lock:
+            self._data += 1
+            self._users[user_id] += 1
+            if years is None:
+                self._user_epochs[user_id] += 1
+            else:
+                for year in set(years):
+                    self._user_years[(user_id, year)] += 1
+
+
+versions = DataVersions()
+
+_MISSING = object()
+# Everything holding cached values, so clear_caches() can reach it.
+_all_caches: weakref.WeakSet = weakref.WeakSet()
+
+
+class VersionedCache:
+    """Bounded LRU whose entries are only valid for the version they were computed at."""
+
+    MISSING = _MISSING
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Hashable, object]] = OrderedDict()
+        _all_caches.add(self)
+
+    def get(self, key: Hashable, version: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def latest(self, key: Hashable):
+        """The key's value from whichever version it was last computed at, for serving stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return _MISSING if entry is None else entry[1]
+
+    def put(self, key: Hashable, version: Hashable, value) -> None:
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Regeneration work runs on threads rather than event-loop tasks: a build is
+# blocking (DB + CPU), and a thread-side Future can be awaited from any
+# request's loop — including one that outlives the request that started it.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-build")
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller starts `fn`; everyone asking for that key while it's
+    still running gets the same Future instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict[Hashable, Future] = {}
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> Future:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = _executor.submit(fn, *args)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def run(self, key: Hashable, fn: Callable, *args):
+        return await asyncio.wrap_future(self.submit(key, fn, *args))
+
+
+class StaleWhileRevalidate:
+    """One value, rebuilt in the background whenever the data version moves on.
+
+    A request that finds the value outdated gets the previous one straight
+    away and kicks off (or joins) a single rebuild; only the very first
+    request, with nothing to serve yet, waits for a build. At most one
+    build runs at a time: writes landing during it don't start another,
+    the running one just goes round again once it's done if `version()`
+    has moved past what it read.
+    """
+
+    def __init__(self, build: Callable[[], object], version: Callable[[], int]):
+        self._build = build
+        self._version = version
+        self._lock = threading.Lock()
+        self._entry: tuple[int, object] | None = None
+        self._running: Future | None = None
+        # Bumped by clear(), so a build started before it doesn't store afterwards.
+        self._generation = 0
+        _all_caches.add(self)
+
+    def _rebuild(self, generation: int) -> tuple[int, object]:
+        while True:
+            version = self._version()
+            try:
+                value = self._build()
+            except BaseException:
+                with self._lock:
+                    if self._generation == generation:
+                        self._running = None
+                raise
+            with self._lock:
+                if self._generation != generation:
+                    return version, value
+                # Never replace a newer value with an older one.
+                if self._entry is None or version >= self._entry[0]:
+                    self._entry = (version, value)
+                # Checked under the lock get() starts builds under: a write
+                # after this point finds nothing running and starts one.
+                if self._version() == version:
+                    self._running = None
+                    return self._entry
+
+    async def get(self) -> tuple[int, object]:
+        """Returns (version the value was built at, value)."""
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == self._version():
+                return entry
+            if self._running is None:
+                self._running = _executor.submit(self._rebuild, self._generation)
+            future = self._running
+        if entry is not None:
+            future.add_done_callback(_log_failure)
+            return entry
+        return await asyncio.wrap_future(future)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entry = None
+            self._running = None
+            self._generation += 1
+
+
+class BackgroundRefresh:
+    """Run `refresh(key)` on background threads after a key's data changes.
+
+    Deduplicated per key: asking while a run is still queued is a no-op (it
+    hasn't read anything yet, so it will see the change), and asking while
+    one is running queues exactly one more, for the change it may have read
+    too early to see — however many requests arrive meanwhile.
+    """
+
+    def __init__(self, refresh: Callable[[Hashable], None], workers: int, name: str):
+        self._refresh = refresh
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # key -> "queued" | "running" | "rerun"
+        self._state: dict[Hashable, str] = {}
+
+    def request(self, key: Hashable) -> None:
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                self._state[key] = "queued"
+                self._executor.submit(self._run, key)
+            elif state == "running":
+                self._state[key] = "rerun"
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._state)
+
+    def _run(self, key: Hashable) -> None:
+        while True:
+            with self._lock:
+                self._state[key] = "running"
+            try:
+                self._refresh(key)
+            except Exception:
+                logger.exception("Background refresh failed for %r", key)
+            with self._lock:
+                if self._state[key] != "rerun":
+                    del self._state[key]
+                    return
+
+
+def _log_failure(future: Future) -> None:
+    if future.exception() is not None:
+        logger.error("Background cache rebuild failed", exc_info=future.exception())
+
+
+def clear_caches() -> None:
+    """Drop every cache's entries (tests reseed the DB behind the app's back)."""
+    for cache in list(_all_caches):
+        cache.clear()
+
+
+def register(cache) -> None:
+    """Have clear_caches() clear `cache` (anything with a clear() method) too."""
+    _all_caches.add(cache)
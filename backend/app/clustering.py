@@ -0,0 +1,78 @@
+"""Zoom-level marker clustering over a hierarchical Web Mercator grid.
+
+Like supercluster, each zoom level merges nearby points into one weighted
+cluster, and a zoom's clusters are built from the level below rather than
+from the raw points. Here "nearby" means "in the same grid cell", with cells
+CELL_PX screen pixels wide; each cell splits into exactly four at the next
+zoom, so the whole hierarchy is a few vectorized group-bys instead of a
+radius search per point per zoom.
+"""
+
+import math
+
+import numpy as np
+
+from app.tiles import mercator
+
+# Cell width in screen pixels (of 256px tiles) — roughly the distance under
+# which two markers would overlap.
+CELL_PX = 64
+# Deepest clustered zoom. Past it the map shows this level: individual
+# points, plus any that share a cell — 2^18 cells around the world, so
+# ~150 m at the equator and ~120 m at 40° (the same course played twice,
+# or courses sharing a clubhouse).
+MAX_CLUSTER_ZOOM = 16
+_CELLS_PER_TILE_BITS = int(math.log2(256 // CELL_PX))
+
+# (latitude, longitude, count, index of the cluster's first point) arrays
+Clusters = tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _group(cell: np.ndarray, x: np.ndarray, y: np.ndarray, weight: np.ndarray, first: np.ndarray):
+    keys, inverse = np.unique(cell, return_inverse=True)
+    count = np.bincount(inverse, weights=weight, minlength=len(keys))
+    cx = np.bincount(inverse, weights=x * weight, minlength=len(keys)) / count
+    cy = np.bincount(inverse, weights=y * weight, minlength=len(keys)) / count
+    lowest = np.full(len(keys), np.iinfo(np.int64).max)
+    np.minimum.at(lowest, inverse, first)
+    return keys, cx, cy, count.astype(np.int64), lowest
+
+
+def _unproject(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    return np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y)))), x * 360.0 - 180.0
+
+
+class ClusterIndex:
+    """Clusters for every zoom 0..MAX_CLUSTER_ZOOM over one set of points."""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        x, y = mercator(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+        bits = MAX_CLUSTER_ZOOM + _CELLS_PER_TILE_BITS
+        side = 1 << bits
+        cx = np.clip((x * side).astype(np.int64), 0, side - 1)
+        cy = np.clip((y * side).astype(np.int64), 0, side - 1)
+        weight = np.ones(len(x))
+        first = np.arange(len(x), dtype=np.int64)
+        levels = []
+        for _ in range(MAX_CLUSTER_ZOOM + 1):
+            keys, x, y, count, first = _group((cx << bits) | cy, x, y, weight, first)
+            levels.append((x, y, count, first))
+            # The next zoom out: every cell merges with its three siblings.
+            cx, cy, bits = (keys >> bits) >> 1, (keys & ((1 << bits) - 1)) >> 1, bits - 1
+            weight = count.astype(np.float64)
+        # Built deepest first; index by zoom.
+        self._levels = levels[::-1]
+
+    def clusters(self, zoom: int, bbox: tuple[float, float, float, float] | None = None) -> Clusters:
+        """Clusters at `zoom` whose centre is inside bbox (lat-first, see app.spatial.BBox)."""
+        x, y, count, first = self._levels[min(zoom, MAX_CLUSTER_ZOOM)]
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            x0, x1 = (min_lon + 180) / 360, (max_lon + 180) / 360
+            # Mercator y grows southwards, so the box's top edge is max_lat.
+            _, (y0, y1) = mercator(np.array([max_lat, min_lat]), np.zeros(2))
+            in_x = (x >= x0) & (x <= x1) if x0 <= x1 else (x >= x0) | (x <= x1)
+            keep = in_x & (y >= y0) & (y <= y1)
+            x, y, count, first = x[keep], y[keep], count[keep], first[keep]
+        lat, lon = _unproject(x, y)
+        return lat, lon, count, first
@@ -0,0 +1,93 @@
+"""Response bodies compressed once, when they're built, and picked per request
+by Accept-Encoding.
+
+Maps are large, highly repetitive HTML/JSON and are served far more often
+than they change, so each artifact is compressed at render time (best
+ratio, since it's paid once) and a request only chooses among the stored
+variants — there's no compression on the request path.
+"""
+
+import gzip
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+import brotli
+
+from app.cache import content_etag
+
+GZIP = "gzip"
+BROTLI = "br"
+# Server preference when the client is indifferent: br is ~15-20% smaller.
+PREFERENCE = (BROTLI, GZIP)
+# File name suffix of each encoding's variant, stored next to the artifact.
+SUFFIXES = {BROTLI: ".br", GZIP: ".gz"}
+VARY = {"Vary": "Accept-Encoding"}
+
+
+def compress(content: str | bytes) -> dict[str, bytes]:
+    """Every encoding this server offers of `content`, keyed by Content-Encoding token."""
+    if isinstance(content, str):
+        content = content.encode()
+    return {
+        GZIP: gzip.compress(content, compresslevel=9, mtime=0),
+        BROTLI: brotli.compress(content, mode=brotli.MODE_TEXT, quality=11),
+    }
+
+
+def _accepted(accept_encoding: str) -> dict[str, float]:
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def negotiate(accept_encoding: str | None, available: Iterable[str]) -> str | None:
+    """The encoding to send: the client's highest-weighted of `available`, ties going to
+    PREFERENCE order. None means the identity (uncompressed) body."""
+    if not accept_encoding:
+        return None
+    weights = _accepted(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in sorted(available, key=PREFERENCE.index):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def variant_etag(etag: str, encoding: str | None) -> str:
+    """Each encoding is its own representation, so it gets its own strong ETag."""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+@dataclass(frozen=True)
+class Precompressed:
+    """A response body with its ETag and every compressed variant of it."""
+
+    content: bytes
+    etag: str
+    variants: dict[str, bytes] = field(repr=False)
+
+    @classmethod
+    def of(cls, content: str | bytes) -> "Precompressed":
+        if isinstance(content, str):
+            content = content.encode()
+        return cls(content, content_etag(content), compress(content))
+
+    def select(self, accept_encoding: str | None) -> tuple[bytes, str, str | None]:
+        """(body, ETag, Content-Encoding or None) to send for the request's Accept-Encoding."""
+        encoding = negotiate(accept_encoding, self.variants)
+        body = self.content if encoding is None else self.variants[encoding]
+        return body, variant_etag(self.etag, encoding), encoding
@@ -21,6 +21,20 @@ class Settings(BaseSettings):
     FROM_EMAIL: str = "noreply@bronnerapp.com"
     FROM_NAME: str = "GolfMapper"
     MAP_FILES_DIR: str = "./static/user_maps"
+    MAP_RENDER_WORKERS: int = 2
+    # Renders queued or running before further map requests get a 503.
+    MAP_RENDER_QUEUE_LIMIT: int = 8
+    MAP_RENDER_TIMEOUT_SECONDS: float = 30.0
+    # Disk space for stored map pages; least recently viewed go first.
+    MAP_STORE_QUOTA_MB: int = 1024
+    # Send map coordinates polyline-encoded rather than as JSON numbers (see
+    # app/map_render.py): half the bytes of the coordinates, about 16% off a
+    # large all-users page (11-13% once compressed; labels are most of the
+    # rest). Off until every cached copy of the map shell can decode them.
+    MAP_COMPACT_COORDINATES: bool = False
+    # Pre-render maps for this many of the most recently active users at
+    # startup, so their first view after a deploy is served from cache. 0 = off.
+    MAP_WARMUP_USERS: int = 0
     TRACES_SAMPLE_RATE: float = 0.1
     TOKEN_EXPIRE_MINUTES: int = 90
     # Overridable per deployment without a code change via the CORS_ORIGINS
@@ -0,0 +1,224 @@
+import gzip
+import json
+import logging
+from dataclasses import dataclass, replace
+from functools import cache
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+from app.spatial import GridIndex, bbox_around
+
+logger = logging.getLogger(__name__)
+
+# Built by scripts/build_boundaries.py — simplified Natural Earth countries
+# plus US states, coordinates rounded to ~100 m.
+BOUNDARIES_FILE = Path(__file__).parent / "data" / "boundaries.json.gz"
+
+# The bundled polygons are simplified, so a course right on a coastline or
+# border can land a few km outside every polygon. Within this distance the
+# nearest boundary wins instead of returning no match.
+NEAREST_FALLBACK_KM = 25.0
+
+
+@dataclass(frozen=True, slots=True)
+class GeoResult:
+    # ISO 3166-1 alpha-3 — what the frontend's geoLookup.js stores for new courses.
+    country: str
+    country_name: str
+    country_alpha2: str | None = None
+    # Postal/ISO 3166-2 subdivision code (e.g. "AL"), only where admin-1 data is bundled.
+    state: str | None = None
+    state_name: str | None = None
+    city: str | None = None
+
+
+class ReverseGeocoder(Protocol):
+    def reverse(self, latitude: float, longitude: float) -> GeoResult | None: ...
+
+
+class _Shape:
+    """All rings of one country/region flattened into edge arrays.
+
+    Ray casting with the even-odd rule over every edge of every ring handles
+    multipolygons and holes in a single vectorized pass.
+    """
+
+    __slots__ = ("bbox", "x0", "y0", "x1", "y1", "dxdy")
+
+    def __init__(self, rings: list[list[float]]):
+        x0, y0, x1, y1 = [], [], [], []
+        for ring in rings:
+            pts = np.asarray(ring, dtype=np.float64).reshape(-1, 2)
+            x0.append(pts[:, 0])
+            y0.append(pts[:, 1])
+            x1.append(np.roll(pts[:, 0], -1))
+            y1.append(np.roll(pts[:, 1], -1))
+        self.x0, self.y0 = np.concatenate(x0), np.concatenate(y0)
+        self.x1, self.y1 = np.concatenate(x1), np.concatenate(y1)
+        dy = self.y1 - self.y0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.dxdy = np.where(dy != 0, (self.x1 - self.x0) / dy, 0.0)
+        self.bbox = (
+            float(min(self.y0.min(), self.y1.min())),
+            float(min(self.x0.min(), self.x1.min())),
+            float(max(self.y0.max(), self.y1.max())),
+            float(max(self.x0.max(), self.x1.max())),
+        )
+
+    def in_bbox(self, lat: float, lon: float) -> bool:
+        return self.bbox[0] <= lat <= self.bbox[2] and self.bbox[1] <= lon <= self.bbox[3]
+
+    def contains(self, lat: float, lon: float) -> bool:
+        straddles = (self.y0 > lat) != (self.y1 > lat)
+        x_cross = self.x0 + (lat - self.y0) * self.dxdy
+        return bool(np.count_nonzero(straddles & (lon < x_cross)) % 2)
+
+    def distance_km(self, lat: float, lon: float) -> float:
+        # Equirectangular projection around the query point — accurate to well
+        # under 1% at the tens-of-km range the fallback cares about.
+        kx = 111.32 * np.cos(np.radians(lat))
+        ky = 110.57
+        ax, ay = (self.x0 - lon) * kx, (self.y0 - lat) * ky
+        bx, by = (self.x1 - lon) * kx, (self.y1 - lat) * ky
+        ex, ey = bx - ax, by - ay
+        seg_len2 = ex * ex + ey * ey
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip(np.where(seg_len2 > 0, -(ax * ex + ay * ey) / seg_len2, 0.0), 0.0, 1.0)
+        dx, dy = ax + t * ex, ay + t * ey
+        return float(np.sqrt((dx * dx + dy * dy).min()))
+
+
+class _Layer:
+    def __init__(self, features: list[dict], cell_deg: float):
+        self.features = features
+        self.shapes = [_Shape(f["rings"]) for f in features]
+        self.index = GridIndex(cell_deg)
+        for i, shape in enumerate(self.shapes):
+            self.index.insert(i, shape.bbox)
+
+    def locate(self, lat: float, lon: float, allowed: set[int] | None = None) -> dict | None:
+        for i in self.index.query_point(lat, lon):
+            if allowed is not None and i not in allowed:
+                continue
+            shape = self.shapes[i]
+            if shape.in_bbox(lat, lon) and shape.contains(lat, lon):
+                return self.features[i]
+        best, best_km = None, NEAREST_FALLBACK_KM
+        for i in self.index.query_bbox(bbox_around(lat, lon, NEAREST_FALLBACK_KM)):
+            if allowed is not None and i not in allowed:
+                continue
+            km = self.shapes[i].distance_km(lat, lon)
+            if km <= best_km:
+                best, best_km = self.features[i], km
+        return best
+
+
+class OfflineGeocoder:
+    """Country and state lookup against bundled boundary polygons — no network.
+
+    Polygon bounding boxes are bucketed in a GridIndex, so each lookup runs
+    point-in-polygon only on the handful of shapes whose cells it falls in.
+    """
+
+    def __init__(self, countries: list[dict], regions: list[dict], cell_deg: float = 2.0):
+        self._countries = _Layer(countries, cell_deg)
+        self._regions = _Layer(regions, cell_deg)
+        self._regions_by_country: dict[str, set[int]] = {}
+        for i, region in enumerate(regions):
+            self._regions_by_country.setdefault(region["country"], set()).add(i)
+        # Lower-cased code or name -> every code and name of the places it names.
+        self._aliases: dict[str, set[str]] = {}
+        for place in (*countries, *regions):
+            names = {place[field].lower() for field in ("code", "alpha2", "name") if place.get(field)}
+            for name in names:
+                self._aliases.setdefault(name, set()).update(names)
+
+    @classmethod
+    def from_file(cls, path: Path = BOUNDARIES_FILE) -> "OfflineGeocoder":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["countries"], data["regions"])
+
+    def aliases(self, name: str) -> frozenset[str]:
+        """`name` plus every other code and name (lower-cased) of the country or state it's one of.
+
+        Courses store either form ("USA" or "United States of America", "AL"
+        or "Alabama"), depending on where their location came from.
+        """
+        name = name.lower()
+        return frozenset({name, *self._aliases.get(name, ())})
+
+    def reverse(self, latitude: float, longitude: float) -> GeoResult | None:
+        country = self._countries.locate(latitude, longitude)
+        if country is None:
+            return None
+        region = None
+        region_ids = self._regions_by_country.get(country["code"])
+        if region_ids:
+            # Restricted to the matched country so a border-hugging point can't
+            # come back as e.g. Canada + Washington.
+            region = self._regions.locate(latitude, longitude, allowed=region_ids)
+        return GeoResult(
+            country=country["code"],
+            country_name=country["name"],
+            country_alpha2=country.get("alpha2"),
+            state=region["code"] if region else None,
+            state_name=region["name"] if region else None,
+        )
+
+
+class NominatimGeocoder:
+    """City names from OpenStreetMap Nominatim, on top of the offline codes.
+
+    Country/state codes still come from the offline geocoder so both paths
+    write identical values; Nominatim only contributes what the bundled
+    polygons can't — the city. Throttled to Nominatim's usage policy of one
+    request per second (geopy's RateLimiter is thread-safe, so this can be
+    shared across worker threads).
+    """
+
+    def __init__(self, user_agent: str = "golfmapper3", min_delay_seconds: float = 1.0):
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+
+        self._reverse = RateLimiter(Nominatim(user_agent=user_agent).reverse, min_delay_seconds=min_delay_seconds)
+
+    def reverse(self, latitude: float, longitude: float) -> GeoResult | None:
+        base = get_geocoder().reverse(latitude, longitude)
+        if base is None:
+            return None
+        location = self._reverse((latitude, longitude), exactly_one=True, zoom=10)
+        if location is None:
+            return base
+        address = location.raw.get("address", {})
+        city = address.get("city") or address.get("town") or address.get("village") or address.get("hamlet")
+        return replace(base, city=city)
+
+
+@cache
+def get_geocoder() -> OfflineGeocoder:
+    # Loaded lazily and once per process: parsing and indexing the polygons
+    # costs tens of ms, which shouldn't land on app import.
+    return OfflineGeocoder.from_file()
+
+
+def fill_missing_location(course, geocoder: ReverseGeocoder | None = None) -> None:
+    """Fill a course's empty state/country from its coordinates. Never overwrites."""
+    if course.state and course.country:
+        return
+    if course.latitude is None or course.longitude is None:
+        return
+    try:
+        match = (geocoder or get_geocoder()).reverse(course.latitude, course.longitude)
+    except Exception:
+        # Best-effort enrichment: a geocoder failure must never block creating the course.
+        logger.exception("Reverse geocoding failed for (%s, %s)", course.latitude, course.longitude)
+        return
+    if match is None:
+        return
+    if not course.country:
+        course.country = match.country
+    if not course.state and match.state:
+        course.state = match.state
@@ -0,0 +1,44 @@
+import json
+from collections.abc import Iterable, Iterator
+
+from fastapi import HTTPException
+
+from app.spatial import BBox
+
+MEDIA_TYPE = "application/geo+json"
+# Features per chunk handed to the response: small enough that memory stays
+# flat however large the collection, big enough not to send a packet per feature.
+CHUNK_FEATURES = 256
+
+
+def parse_bbox(bbox: str | None) -> BBox | None:
+    """Parse a GeoJSON-order "min_lon,min_lat,max_lon,max_lat" query value into our lat-first BBox."""
+    if bbox is None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be min_lon,min_lat,max_lon,max_lat") from None
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise HTTPException(status_code=422, detail="bbox is out of range")
+    # min_lon > max_lon is allowed: the box crosses the antimeridian.
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def point_feature(latitude: float, longitude: float, properties: dict) -> dict:
+    geometry = {"type": "Point", "coordinates": [longitude, latitude]}
+    return {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def stream_feature_collection(features: Iterable[dict]) -> Iterator[str]:
+    """Encode a FeatureCollection incrementally, never holding more than one chunk of it."""
+    yield '{"type":"FeatureCollection","features":['
+    chunk, first = [], True
+    for feature in features:
+        chunk.append(json.dumps(feature, separators=(",", ":")))
+        if len(chunk) == CHUNK_FEATURES:
+            yield ("" if first else ",") + ",".join(chunk)
+            chunk, first = [], False
+    if chunk:
+        yield ("" if first else ",") + ",".join(chunk)
+    yield "]}"
@@ -0,0 +1,191 @@
+"""Play-activity density: how many plays (active users' user_courses rows)
+fall in each cell of a Web Mercator grid, at every zoom 0..MAX_HEAT_ZOOM.
+
+Past a few thousand markers a zoomed-out map is one overlapping blob; a
+density surface says the same thing in a few hundred cells. Each zoom's
+tiles are split into GRID x GRID cells (GRID_PX screen pixels each), and a
+cell at zoom z is exactly four cells at z + 1, so one binning of the points
+(NumPy, at startup) fills every level.
+
+After that the grid is kept current a course at a time: a write that adds,
+removes or moves plays calls refresh_courses(), which re-counts just those
+courses and moves their plays between cells on every level. Counts, not
+deltas — re-reading the course is idempotent, so a write landing while the
+grid is first built can't be counted twice.
+"""
+
+import json
+import threading
+from collections.abc import Iterable
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.cache import register
+from app.database import SessionLocal
+from app.models import Courses, UserCourses, Users
+from app.tiles import mercator
+
+# Heat is for zoomed-out views; past this the map has room for markers.
+MAX_HEAT_ZOOM = 10
+GRID = 32
+_GRID_BITS = GRID.bit_length() - 1
+GRID_PX = 256 // GRID
+
+# tile (x, y) -> {cell index (row * GRID + column) -> plays}
+_Level = dict[tuple[int, int], dict[int, int]]
+
+
+def _finest_cells(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Cell column and row at MAX_HEAT_ZOOM."""
+    x, y = mercator(np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64))
+    side = 1 << (MAX_HEAT_ZOOM + _GRID_BITS)
+    return np.clip((x * side).astype(np.int64), 0, side - 1), np.clip((y * side).astype(np.int64), 0, side - 1)
+
+
+class DensityGrid:
+    """Plays per cell at every zoom, with per-course bookkeeping so a course's plays can be moved or dropped."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levels: list[_Level] = [{} for _ in range(MAX_HEAT_ZOOM + 1)]
+        # course id -> (finest column, finest row, plays), for courses that are on the grid
+        self._courses: dict[int, tuple[int, int, int]] = {}
+        self._peaks: list[int | None] = [None] * (MAX_HEAT_ZOOM + 1)
+
+    @classmethod
+    def from_plays(cls, course_ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, plays: np.ndarray) -> "DensityGrid":
+        grid = cls()
+        cx, cy = _finest_cells(lat, lon)
+        grid._courses = {
+            course_id: (x, y, n)
+            for course_id, x, y, n in zip(course_ids.tolist(), cx.tolist(), cy.tolist(), plays.tolist(), strict=True)
+        }
+        weights = np.asarray(plays, dtype=np.float64)
+        for z in range(MAX_HEAT_ZOOM, -1, -1):
+            shift = MAX_HEAT_ZOOM - z
+            keys, inverse = np.unique(((cx >> shift) << 32) | (cy >> shift), return_inverse=True)
+            counts = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+            for key, count in zip(keys.tolist(), counts.tolist(), strict=True):
+                grid._add(z, key >> 32, key & 0xFFFFFFFF, count)
+        return grid
+
+    def _add(self, z: int, gx: int, gy: int, plays: int) -> None:
+        level = self._levels[z]
+        tile = (gx >> _GRID_BITS, gy >> _GRID_BITS)
+        index = ((gy & (GRID - 1)) << _GRID_BITS) | (gx & (GRID - 1))
+        cells = level.setdefault(tile, {})
+        count = cells.get(index, 0) + plays
+        if count > 0:
+            cells[index] = count
+        else:
+            cells.pop(index, None)
+            if not cells:
+                del level[tile]
+        self._peaks[z] = None
+
+    def _move(self, cx: int, cy: int, plays: int) -> None:
+        for z in range(MAX_HEAT_ZOOM + 1):
+            shift = MAX_HEAT_ZOOM - z
+            self._add(z, cx >> shift, cy >> shift, plays)
+
+    def set_course(self, course_id: int, lat: float | None, lon: float | None, plays: int) -> None:
+        """Make the grid show `plays` plays at (lat, lon) for the course; no location or no plays takes it off."""
+        with self._lock:
+            old = self._courses.pop(course_id, None)
+            if old is not None:
+                self._move(old[0], old[1], -old[2])
+            if lat is None or lon is None or plays <= 0:
+                return
+            cx, cy = (int(v[0]) for v in _finest_cells(np.array([lat]), np.array([lon])))
+            self._courses[course_id] = (cx, cy, plays)
+            self._move(cx, cy, plays)
+
+    def tile(self, z: int, x: int, y: int) -> tuple[list[int], int]:
+        """([cell index, plays, ...] for the tile's non-empty cells in index order, busiest cell on the level)."""
+        with self._lock:
+            cells = sorted(self._levels[z].get((x, y), {}).items())
+            if self._peaks[z] is None:
+                self._peaks[z] = max((max(c.values()) for c in self._levels[z].values()), default=0)
+            peak = self._peaks[z]
+        return [v for cell in cells for v in cell], peak
+
+    def total(self) -> int:
+        with self._lock:
+            return sum(sum(cells.values()) for cells in self._levels[0].values())
+
+
+def _play_counts(db: Session, course_ids: Iterable[int] | None = None) -> list[tuple[int, float, float, int]]:
+    """(course id, latitude, longitude, active users' plays) for played courses that have a location."""
+    counts = (
+        select(UserCourses.course_id, func.count().label("plays"))
+        .join(Users, Users.id == UserCourses.user_id)
+        .where(Users.is_active.is_(True))
+        .group_by(UserCourses.course_id)
+    )
+    if course_ids is not None:
+        counts = counts.where(UserCourses.course_id.in_(list(course_ids)))
+    counts = counts.subquery()
+    query = (
+        select(counts.c.course_id, Courses.latitude, Courses.longitude, counts.c.plays)
+        .join(Courses, Courses.id == counts.c.course_id)
+        .where(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+    )
+    return [tuple(row) for row in db.execute(query)]
+
+
+class ActivityHeatmap:
+    """The app's one DensityGrid: built from the database on first use, then kept current by refresh_courses()."""
+
+    def __init__(self):
+        # Serializes the first build against refreshes, so none can slip in
+        # between the build's read and the grid going live.
+        self._lock = threading.Lock()
+        self._grid: DensityGrid | None = None
+        register(self)
+
+    def _build(self, db: Session) -> DensityGrid:
+        rows = _play_counts(db)
+        if not rows:
+            return DensityGrid()
+        course_ids, lat, lon, plays = (np.array(column) for column in zip(*rows, strict=True))
+        return DensityGrid.from_plays(course_ids, lat, lon, plays)
+
+    def grid(self) -> DensityGrid:
+        grid = self._grid
+        if grid is not None:
+            return grid
+        with self._lock:
+            if self._grid is None:
+                db = SessionLocal()
+                try:
+                    self._grid = self._build(db)
+                finally:
+                    db.close()
+            return self._grid
+
+    def refresh_courses(self, db: Session, course_ids: Iterable[int]) -> None:
+        """Re-count the courses' plays after a committed write that added, removed or moved some."""
+        course_ids = set(course_ids)
+        with self._lock:
+            if self._grid is None or not course_ids:
+                # Not built yet: the build will read the write itself.
+                return
+            found = {course_id: (lat, lon, plays) for course_id, lat, lon, plays in _play_counts(db, course_ids)}
+            for course_id in course_ids:
+                self._grid.set_course(course_id, *found.get(course_id, (None, None, 0)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._grid = None
+
+
+heatmap = ActivityHeatmap()
+
+
+def tile_payload(z: int, x: int, y: int) -> str:
+    """The tile's heat as JSON: the cells are a sparse GRID x GRID raster, flattened to [index, plays, ...]
+    with index = row * GRID + column; `peak` is the busiest cell at this zoom, for a shared color scale."""
+    cells, peak = heatmap.grid().tile(z, x, y)
+    return json.dumps({"z": z, "x": x, "y": y, "size": GRID, "peak": peak, "cells": cells}, separators=(",", ":"))
@@ -1,6 +1,7 @@
 import json
 import logging
 import secrets
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -14,10 +15,12 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from starlette.middleware.cors import CORSMiddleware
 
+from app import heatmap, user_maps
 from app.config import settings
 from app.database import engine, ensure_columns, ensure_index
 from app.limiter import limiter
 from app.models import Base
+from app.render_pool import render_pool
 from app.routers import admin, auth, course_requests, garmin_courses, map, password_reset, user_courses, users
 
 try:
@@ -55,18 +58,41 @@ if sentry_sdk_available and settings.SENTRY_DSN:
         profiles_sample_rate=0.0,
     )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    user_maps.remove_legacy_files()
+    # One pass over user_courses; from here on writes update it in place.
+    heatmap.heatmap.grid()
+    if settings.MAP_WARMUP_USERS:
+        # Only queues the renders; startup doesn't wait for them.
+        user_maps.warm_up(settings.MAP_WARMUP_USERS)
+    yield
+    user_maps.store.flush()
+    render_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 add_pagination(app)
 Base.metadata.create_all(bind=engine)
 ensure_columns("users", {"token_version": "INTEGER NOT NULL DEFAULT 0"})
-# create_all only creates the partial unique index below on fresh databases;
-# this backfills it onto ones that predate it (see ensure_index's docstring).
+# create_all only creates the indexes below on fresh databases; this
+# backfills them onto ones that predate them (see ensure_index's docstring).
 ensure_index(
     "uq_pending_location_change",
     "CREATE UNIQUE INDEX IF NOT EXISTS uq_pending_location_change "
     "ON course_requests (submitted_by_user_id, request_type, course_id) "
     "WHERE status = 'pending'",
 )
+ensure_index("ix_courses_lat_lon", "CREATE INDEX IF NOT EXISTS ix_courses_lat_lon ON courses (latitude, longitude)")
+ensure_index(
+    "ix_user_courses_user_year",
+    "CREATE INDEX IF NOT EXISTS ix_user_courses_user_year ON user_courses (user_id, year, course_id)",
+)
+ensure_index(
+    "ix_user_courses_year",
+    "CREATE INDEX IF NOT EXISTS ix_user_courses_year ON user_courses (year, user_id, course_id)",
+)
 Instrumentator().instrument(app).expose(app, endpoint="/metrics")
 
 # --- Rate limiting ---
@@ -90,27 +116,26 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Set here rather than relying on the reverse proxy, so they apply
 # consistently regardless of which NPM host config is deployed.
 #
-# The golf-course map is server-rendered by folium and embedded in the SPA
+# The golf-course map is server-rendered (app/map_render.py) and embedded in the SPA
 # via <iframe srcDoc=...> (see Map.jsx / AllUsersMap.jsx) rather than a
 # same-origin navigation, so the browser treats it as an about:srcdoc
 # document with no CSP of its own — it inherits the SPA shell's policy
-# wholesale. Folium's output needs a fixed set of third-party script/style
-# hosts plus two inline <script> blocks (its Leaflet init code, which
-# embeds real course coordinates and so can't be hashed ahead of time).
+# wholesale. The map page needs Leaflet, which this app serves itself (see
+# app/map_assets.py), so 'self' covers it, plus one inline <script> block
+# (its init code, which embeds real course coordinates and so can't be
+# hashed ahead of time).
 # Rather than blanket 'unsafe-inline' for the whole app, the SPA shell gets
 # a fresh nonce per request; the frontend copies that nonce onto the
 # fetched map HTML's <script> tags before handing it to the iframe.
-_MAP_SCRIPT_HOSTS = "https://cdn.jsdelivr.net https://code.jquery.com https://cdnjs.cloudflare.com"
-_MAP_STYLE_HOSTS = "https://cdn.jsdelivr.net https://cdnjs.cloudflare.com https://netdna.bootstrapcdn.com"
 
 
 def build_csp(nonce: str | None = None) -> str:
-    script_src = "script-src 'self'" + (f" 'nonce-{nonce}' {_MAP_SCRIPT_HOSTS}" if nonce else "")
+    script_src = "script-src 'self'" + (f" 'nonce-{nonce}'" if nonce else "")
     return (
         "default-src 'self'; "
         f"{script_src}; "
-        f"style-src 'self' 'unsafe-inline' https://fonts.googleapis.com {_MAP_STYLE_HOSTS}; "
-        "font-src 'self' https://fonts.gstatic.com https://cdn.jsdelivr.net; "
+        "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+        "font-src 'self' https://fonts.gstatic.com; "
         "img-src 'self' data: https://*.tile.openstreetmap.org https://tile.openstreetmap.org; "
         "connect-src 'self' https://nominatim.openstreetmap.org; "
         "object-src 'none'; "
@@ -0,0 +1,36 @@
+"""Third-party files the map pages load, bundled with the app.
+
+The map template references these rather than a CDN, so a map's first load
+doesn't wait on another origin's DNS and TLS, and the CSP needs no hosts
+beyond 'self'. Each is served under a name carrying a hash of its content,
+so it can be cached forever and a new copy gets a new URL.
+
+Only what the map draws with is bundled: Leaflet's script and stylesheet
+(unmodified, bar the dropped source map comment), not its marker and
+layer-toggle images, which circle markers and the expanded layer control
+never show.
+
+Stdlib only: app.map_render imports this in the render pool's workers.
+"""
+
+import hashlib
+from pathlib import Path
+
+ASSET_DIR = Path(__file__).parent / "data" / "map_assets"
+# Where app.routers.map serves them.
+URL_PREFIX = "/api/v1/map/assets/"
+
+MEDIA_TYPES = {".js": "text/javascript", ".css": "text/css"}
+
+
+def _hashed_name(path: Path) -> str:
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+# file name in ASSET_DIR -> name it's served under
+HASHED_NAMES = {path.name: _hashed_name(path) for path in sorted(ASSET_DIR.iterdir()) if path.suffix in MEDIA_TYPES}
+
+
+def url(name: str) -> str:
+    return URL_PREFIX + HASHED_NAMES[name]
@@ -0,0 +1,124 @@
+"""What a map can be narrowed to — a range of years played, an area — and the
+SQL each filter becomes.
+
+A MapFilters is normalized and hashable, so it doubles as the cache key of
+the filtered map: requests that mean the same thing share one render.
+"""
+
+from dataclasses import astuple, dataclass, fields
+from typing import Annotated
+from urllib.parse import urlencode
+
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import and_, func, or_
+
+from app import geojson
+from app.geocoder import get_geocoder
+from app.models import Courses, UserCourses
+from app.spatial import BBox
+
+
+def bbox_clause(bbox: BBox):
+    min_lat, min_lon, max_lat, max_lon = bbox
+    lon = (
+        Courses.longitude.between(min_lon, max_lon)
+        if min_lon <= max_lon
+        else or_(Courses.longitude >= min_lon, Courses.longitude <= max_lon)
+    )
+    return and_(Courses.latitude.between(min_lat, max_lat), lon)
+
+
+@dataclass(frozen=True)
+class MapFilters:
+    year_from: int | None = None
+    year_to: int | None = None
+    bbox: BBox | None = None
+    # A country or state/province code or name, lower-cased: matches either
+    # column, in any of the forms the bundled boundaries know for it.
+    region: str | None = None
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in astuple(self))
+
+    def play_clauses(self) -> list:
+        """Conditions on UserCourses: a course is on the map if any play of it matches."""
+        clauses = []
+        if self.year_from is not None:
+            clauses.append(UserCourses.year >= self.year_from)
+        if self.year_to is not None:
+            clauses.append(UserCourses.year <= self.year_to)
+        return clauses
+
+    def course_clauses(self) -> list:
+        """Conditions on Courses."""
+        clauses = []
+        if self.bbox is not None:
+            clauses.append(bbox_clause(self.bbox))
+        if self.region is not None:
+            names = sorted(get_geocoder().aliases(self.region))
+            clauses.append(or_(func.lower(Courses.country).in_(names), func.lower(Courses.state).in_(names)))
+        return clauses
+
+    def query_string(self) -> str:
+        """Canonical query-string form of the filters; empty when unfiltered."""
+        params = {field.name: getattr(self, field.name) for field in fields(self)}
+        for name, value in params.items():
+            if isinstance(value, tuple):
+                params[name] = ",".join(map(str, value))
+        if self.bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            params["bbox"] = f"{min_lon},{min_lat},{max_lon},{max_lat}"
+        return urlencode({name: value for name, value in params.items() if value is not None})
+
+
+@dataclass(frozen=True)
+class AllUsersFilters(MapFilters):
+    # Sorted and de-duplicated, so any order of the same ids is one cache entry.
+    user_ids: tuple[int, ...] | None = None
+
+    def play_clauses(self) -> list:
+        clauses = super().play_clauses()
+        if self.user_ids is not None:
+            clauses.append(UserCourses.user_id.in_(self.user_ids))
+        return clauses
+
+
+NO_FILTERS = MapFilters()
+NO_ALL_USERS_FILTERS = AllUsersFilters()
+
+
+def map_filters(
+    year_from: int | None = Query(None, ge=1900),
+    year_to: int | None = Query(None, ge=1900),
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    region: str | None = Query(
+        None,
+        max_length=100,
+        description=(
+            "Country or state/province, by code or name: 'USA', 'US' or 'United States of America'; 'AL' or"
+            " 'Alabama'. Other places (e.g. 'Scotland') match only as the courses store them."
+        ),
+    ),
+) -> MapFilters:
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise HTTPException(status_code=422, detail="year_from must not be after year_to")
+    region = (region or "").strip().lower() or None
+    return MapFilters(year_from, year_to, geojson.parse_bbox(bbox), region)
+
+
+# Bounds the IN list one request can put in the query.
+MAX_USER_IDS = 50
+
+
+def all_users_filters(
+    filters: MapFilters = Depends(map_filters),
+    user_id: list[int] | None = Query(None, description="Only these users; repeat for several"),
+) -> AllUsersFilters:
+    user_ids = tuple(sorted(set(user_id))) if user_id else None
+    if user_ids is not None and len(user_ids) > MAX_USER_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_USER_IDS} user_id values")
+    return AllUsersFilters(**{field.name: getattr(filters, field.name) for field in fields(filters)}, user_ids=user_ids)
+
+
+map_filters_dependency = Annotated[MapFilters, Depends(map_filters)]
+all_users_filters_dependency = Annotated[AllUsersFilters, Depends(all_users_filters)]
@@ -0,0 +1,305 @@
+"""Map HTML renderer.
+
+Emits the same Leaflet page folium used to build for us, but from one fixed
+template: all markers go into a single JSON blob that a short loop in the
+page turns into circle markers, instead of a generated JS statement (and a
+Python object graph) per marker. At tens of thousands of markers that is
+more than an order of magnitude faster to render and several times smaller
+to ship — see scripts/bench_map_render.py. The same page also exists
+without data (SHELL), drawing map documents its parent window posts in.
+
+Coordinates go out as a flat [lat, lon, ...] array or, with compact=True,
+as one polyline-encoded string (see encode_points) that the page decodes
+before drawing; the page reads either, so cached documents of both kinds
+keep working when MAP_COMPACT_COORDINATES is switched.
+
+A document's layers either carry every marker or, for the all-users map,
+clusters (see app.clustering): a few low zooms embedded, and past those the
+page asks its parent for the clusters in view as the user pans and zooms.
+
+These run in the render pool's worker processes (see app.render_pool), so
+they take plain data — (latitude, longitude, label) tuples — and this
+module deliberately imports nothing from the rest of the app but the
+stdlib-only app.map_assets.
+"""
+
+import base64
+import hashlib
+import html
+import json
+
+from app import map_assets
+
+# (latitude, longitude, plain-text label)
+Marker = tuple[float, float, str]
+
+USER_COLORS = [
+    "#e74c3c",
+    "#3498db",
+    "#2ecc71",
+    "#9b59b6",
+    "#f39c12",
+    "#1abc9c",
+    "#e67e22",
+    "#e91e8c",
+    "#00bcd4",
+    "#8d6e63",
+]
+
+# Coordinates are sent to 6 decimal places (~0.1 m) either way.
+COORDINATE_DIGITS = 6
+COORDINATE_SCALE = 10**COORDINATE_DIGITS
+
+# Exactly two <script> tags (Leaflet + the init script), whatever the data —
+# the frontend only CSP-nonces that many (see frontend/src/utils/cspNonce.js).
+# Labels and layer names are HTML, not text: Leaflet innerHTML's both, which
+# is what lets the all-users layer names carry a coloured dot. Callers'
+# strings are escaped in _layer before they get here.
+_TEMPLATE = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
+<link rel="stylesheet" href="{map_assets.url("leaflet.css")}">
+<script src="{map_assets.url("leaflet.js")}"></script>
+<style>html, body, #map {{ width: 100%; height: 100%; margin: 0; padding: 0; }}
+.leaflet-container {{ font-size: 1rem; }}
+.cluster-count {{ background: none; border: none; box-shadow: none; padding: 0; font-weight: bold; }}
+.cluster-count::before {{ display: none; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+const map = L.map("map", {{center: [40, -90], zoom: 4, preferCanvas: true}});
+L.control.scale().addTo(map);
+L.tileLayer("https://tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png", {{
+  maxZoom: 19,
+  attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
+}}).addTo(map);
+// encode_points() in app/map_render.py, undone.
+function points(p) {{
+  if (typeof p !== "string") return p;
+  const out = [], last = [0, 0];
+  for (let i = 0, k = 0; i < p.length; k++) {{
+    let b, r = 0, shift = 0;
+    do {{
+      b = p.charCodeAt(i++) - 63;
+      r |= (b & 31) << shift;
+      shift += 5;
+    }} while (b >= 32);
+    out.push((last[k & 1] += r & 1 ? ~(r >> 1) : r >> 1) / {COORDINATE_SCALE});
+  }}
+  return out;
+}}
+let shown = [];
+let clustered = null;
+function draw(data) {{
+  for (const item of shown) item.remove();
+  shown = [];
+  clustered = data.clusters ? {{...data.clusters, layers: data.layers, groups: []}} : null;
+  const overlays = {{}};
+  for (const layer of data.layers) {{
+    const group = L.featureGroup();
+    if (clustered) clustered.groups.push(group);
+    else for (let i = 0, p = points(layer.points); i < layer.labels.length; i++) {{
+      L.circleMarker([p[2 * i], p[2 * i + 1]], layer.style).bindPopup(layer.labels[i]).addTo(group);
+    }}
+    shown.push(group.addTo(map));
+    overlays[layer.name] = group;
+  }}
+  if (data.layerControl) shown.push(L.control.layers({{}}, overlays, {{collapsed: false}}).addTo(map));
+  if (clustered) onView();
+}}
+function clusterZoom() {{
+  return Math.min(map.getZoom(), clustered.maxZoom);
+}}
+function drawClusters(levels) {{
+  const zoom = clusterZoom();
+  clustered.groups.forEach((group, j) => {{
+    const style = clustered.layers[j].style, level = levels[j], p = points(level.points);
+    group.clearLayers();
+    for (let i = 0; i < level.counts.length; i++) {{
+      const n = level.counts[i], at = [p[2 * i], p[2 * i + 1]];
+      if (n === 1) {{
+        L.circleMarker(at, style).bindPopup(level.labels[i]).addTo(group);
+        continue;
+      }}
+      const marker = L.circleMarker(at, {{...style, radius: style.radius + 4 * Math.log10(n)}})
+        .bindTooltip(String(n), {{permanent: true, direction: "center", className: "cluster-count"}})
+        .addTo(group);
+      if (zoom < clustered.maxZoom) marker.on("click", () => map.setView(at, zoom + 2));
+      else marker.bindPopup(`${{level.labels[i]}} and ${{n - 1}} more`);
+    }}
+  }});
+}}
+function onView() {{
+  if (!clustered) return;
+  const zoom = clusterZoom();
+  if (zoom <= clustered.embedded) return drawClusters(clustered.layers.map((layer) => layer.levels[zoom]));
+  // Ask for a margin around the view, so a short pan doesn't show empty edges.
+  const b = map.getBounds().pad(0.5);
+  const wrap = (lng) => L.Util.wrapNum(lng, [-180, 180], true);
+  const [west, east] = b.getEast() - b.getWest() >= 360 ? [-180, 180] : [wrap(b.getWest()), wrap(b.getEast())];
+  const box = [west, Math.max(b.getSouth(), -90), east, Math.min(b.getNorth(), 90)];
+  window.parent.postMessage({{type: "view", zoom, bbox: box.map((v) => v.toFixed(5)).join(",")}}, "*");
+}}
+map.on("moveend", onView);
+__LOAD_DATA__
+</script>
+</body>
+</html>
+"""
+_TOP, _BOTTOM = _TEMPLATE.split("__LOAD_DATA__")
+
+# The same page without data: it draws whatever map document (see
+# user_map_data / all_users_map_data) its parent window posts to it, so one
+# long-cached copy serves every map and only the data is fetched per change.
+# Cluster replies for a view are drawn only if they're for the current zoom
+# and were cut from the same build as the document; a reply from a newer
+# build means the document is out of date, so the page asks for a new one.
+SHELL = (
+    _TOP
+    + """window.addEventListener("message", (e) => {
+  if (e.source !== window.parent) return;
+  if (e.data.type !== "clusters") draw(e.data);
+  else if (clustered && e.data.build !== clustered.build) window.parent.postMessage({type: "stale"}, "*");
+  else if (clustered && e.data.zoom === clusterZoom()) drawClusters(e.data.layers);
+});
+"""
+    + _BOTTOM
+)
+
+# Self-contained page: the data is inlined. Split once at import; a render
+# is then two concatenations around the data.
+_HEAD, _TAIL = _TOP + "draw(", ");" + _BOTTOM
+
+
+def encode_points(points: list[float]) -> str:
+    """A flat [lat, lon, ...] list as an encoded polyline (Google's algorithm, at COORDINATE_SCALE rather than
+    1e5): fixed-point integers, each the difference from the previous latitude or longitude, zig-zagged and
+    written five bits to a printable ASCII character. Nearby points cost a few characters apiece instead of
+    two ~10-digit numbers; of the characters used, only the backslash needs escaping in JSON."""
+    out = []
+    last = [0, 0]
+    for k, value in enumerate(points):
+        n = round(value * COORDINATE_SCALE)
+        delta, last[k & 1] = n - last[k & 1], n
+        delta = ~(delta << 1) if delta < 0 else delta << 1
+        while delta >= 0x20:
+            out.append(chr((0x20 | (delta & 0x1F)) + 63))
+            delta >>= 5
+        out.append(chr(delta + 63))
+    return "".join(out)
+
+
+def _points(lat: list[float], lon: list[float], compact: bool) -> list[float] | str:
+    points = []
+    for la, lo in zip(lat, lon, strict=True):
+        points += (round(la, COORDINATE_DIGITS), round(lo, COORDINATE_DIGITS))
+    return encode_points(points) if compact else points
+
+
+def _layer(name: str, markers: list[Marker], style: dict, compact: bool) -> dict:
+    return {
+        "name": name,
+        "style": style,
+        "points": _points([lat for lat, _, _ in markers], [lon for _, lon, _ in markers], compact),
+        "labels": [html.escape(label) for _, _, label in markers],
+    }
+
+
+def _document(layers: list[dict], layer_control: bool) -> str:
+    return json.dumps({"layers": layers, "layerControl": layer_control}, separators=(",", ":"))
+
+
+def _page(data: str) -> str:
+    # Keeps the payload from closing the <script> ("</script>", "<!--") or
+    # being read as markup. "&" is left alone: it's inert inside a script
+    # element and the entity-escaped labels are meant to reach Leaflet as written.
+    return _HEAD + data.replace("<", "\\u003c").replace(">", "\\u003e") + _TAIL
+
+
+def script_hash(page: str) -> str:
+    """CSP hash source ('sha256-...') for a page's inline script, for serving it outside the SPA's nonces."""
+    start = page.index("<script>") + len("<script>")
+    script = page[start : page.index("</script>", start)]
+    return f"'sha256-{base64.b64encode(hashlib.sha256(script.encode()).digest()).decode()}'"
+
+
+def user_map_data(username: str, markers: list[Marker], compact: bool = False) -> str:
+    style = {"color": "red", "opacity": 0.7, "fill": False, "radius": 7}
+    return _document([_layer(html.escape(username), markers, style, compact)] if markers else [], layer_control=False)
+
+
+def _colored_layer(color: str, name: str) -> tuple[str, dict]:
+    """(layer name with a dot of `color` before it, marker style) for a plain-text `name`."""
+    dot = (
+        f'<span style="display:inline-block;width:10px;height:10px;border-radius:50%;'
+        f'background:{color};margin-right:6px;vertical-align:middle;"></span>'
+    )
+    style = {"color": color, "opacity": 0.9, "fill": True, "fillColor": color, "fillOpacity": 0.7, "radius": 7}
+    return dot + html.escape(name), style
+
+
+def _user_layer(i: int, username: str) -> tuple[str, dict]:
+    """(layer name, marker style) for the i-th user on the all-users map."""
+    return _colored_layer(USER_COLORS[i % len(USER_COLORS)], username)
+
+
+def all_users_map_data(layers: list[tuple[str, list[Marker]]], compact: bool = False) -> str:
+    rendered = []
+    for i, (username, markers) in enumerate(layers):
+        name, style = _user_layer(i, username)
+        rendered.append(_layer(name, markers, style, compact))
+    return _document(rendered, layer_control=True)
+
+
+# Played by both users, by the first only, by the second only.
+COMPARE_COLORS = ("#9b59b6", "#e74c3c", "#3498db")
+
+
+def compare_map(
+    username_a: str,
+    username_b: str,
+    both: list[Marker],
+    only_a: list[Marker],
+    only_b: list[Marker],
+    compact: bool = False,
+) -> str:
+    """Two users' courses side by side: three layers, each in its own color."""
+    names = (f"Both ({len(both)})", f"Only {username_a} ({len(only_a)})", f"Only {username_b} ({len(only_b)})")
+    rendered = []
+    for color, name, markers in zip(COMPARE_COLORS, names, (both, only_a, only_b), strict=True):
+        layer_name, style = _colored_layer(color, name)
+        rendered.append(_layer(layer_name, markers, style, compact))
+    return _page(_document(rendered, layer_control=True))
+
+
+def cluster_level(
+    lat: list[float], lon: list[float], counts: list[int], labels: list[str], compact: bool = False
+) -> dict:
+    """One zoom's clusters for one layer; labels are the plain-text label of each cluster's first point."""
+    return {"points": _points(lat, lon, compact), "counts": counts, "labels": [html.escape(label) for label in labels]}
+
+
+def all_users_cluster_data(build: str, embedded: int, max_zoom: int, layers: list[tuple[str, list[dict]]]) -> str:
+    """The clustered all-users document: per user, the cluster_level()s for zooms 0..embedded."""
+    rendered = []
+    for i, (username, levels) in enumerate(layers):
+        name, style = _user_layer(i, username)
+        rendered.append({"name": name, "style": style, "levels": levels})
+    clusters = {"build": build, "embedded": embedded, "maxZoom": max_zoom}
+    return json.dumps({"layers": rendered, "layerControl": True, "clusters": clusters}, separators=(",", ":"))
+
+
+def cluster_update(build: str, zoom: int, levels: list[dict]) -> str:
+    """Clusters in view at `zoom`, one cluster_level() per layer of the `build` document, posted into the shell."""
+    return json.dumps({"type": "clusters", "build": build, "zoom": zoom, "layers": levels}, separators=(",", ":"))
+
+
+def user_map(username: str, markers: list[Marker], compact: bool = False) -> str:
+    return _page(user_map_data(username, markers, compact))
+
+
+def all_users_map(layers: list[tuple[str, list[Marker]]], compact: bool = False) -> str:
+    return _page(all_users_map_data(layers, compact))
@@ -0,0 +1,55 @@
+"""Public share links for user maps.
+
+A share is a MapShares row; its link carries the row id and an HMAC of it
+under SECRET_KEY_AUTH, so the link can't be guessed from the id, and a
+forged or mistyped one is turned away without touching the database.
+Revoking sets revoked_at; the link stops working as soon as the copies
+already cached downstream expire (see SHARED_PAGE_MAX_AGE in app/routers/map.py).
+Rotating SECRET_KEY_AUTH invalidates every link.
+
+Opening a link needs no login: it redirects to the user's current map
+page, which is immutable and publicly cacheable, so nginx or the browser
+answers repeat views of a widely shared link without reaching the app.
+"""
+
+import base64
+import hashlib
+import hmac
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import MapShares, Users
+
+_SIGNATURE_BYTES = 16
+
+
+def _signature(share_id: int) -> str:
+    digest = hmac.new(settings.SECRET_KEY_AUTH.encode(), f"map-share:{share_id}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:_SIGNATURE_BYTES]).rstrip(b"=").decode()
+
+
+def token(share_id: int) -> str:
+    return f"{share_id}.{_signature(share_id)}"
+
+
+def share_id(share_token: str) -> int | None:
+    """The share id a token was signed for; None if the signature doesn't match."""
+    raw_id, _, signature = share_token.partition(".")
+    if not (raw_id.isascii() and raw_id.isdigit()):
+        return None
+    if not hmac.compare_digest(signature.encode(), _signature(int(raw_id)).encode()):
+        return None
+    return int(raw_id)
+
+
+def active_share(db: Session, share_token: str) -> MapShares | None:
+    """The share the token opens, if it's genuine, not revoked, and its owner's account is active."""
+    if (shared := share_id(share_token)) is None:
+        return None
+    return (
+        db.query(MapShares)
+        .join(Users, Users.id == MapShares.user_id)
+        .filter(MapShares.id == shared, MapShares.revoked_at.is_(None), Users.is_active.is_(True))
+        .first()
+    )
@@ -0,0 +1,355 @@
+"""On-disk store for rendered map artifacts.
+
+Files live at <root>/ab/cd/<sha256 of key>.html, so no directory grows past
+a few hundred entries however many users there are; precompressed variants
+(see app.compression) sit beside each file as <name>.html.br / .html.gz.
+The store keeps a byte quota, evicting least-recently-accessed artifacts
+when a write goes over it, and an index of what it holds — key, size, last
+access, group, encodings — so nothing has to list the tree to answer "is
+this cached?".
+
+The index is a snapshot (<root>/index.json) plus a journal
+(<root>/journal.jsonl) of the puts and deletes since, so a write appends a
+line or two rather than rewriting a row per artifact. The two are folded
+into a new snapshot on a background thread — at most every
+INDEX_FLUSH_SECONDS, or once the journal reaches JOURNAL_MAX_LINES — and
+at shutdown (flush()). Access times are only kept in memory until then; losing the last few on a crash just makes
+eviction slightly less precise. Keys can't be recovered from hashed file
+names, so if the snapshot is missing or unreadable the store starts empty
+and deletes the files it can't account for; they're re-rendered on demand.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+
+from prometheus_client import Counter, Gauge
+
+from app import compression
+from app.cache import BackgroundRefresh
+
+logger = logging.getLogger(__name__)
+
+STORE_HITS = Counter("map_store_hits_total", "Map artifact lookups that found the artifact on disk")
+STORE_MISSES = Counter("map_store_misses_total", "Map artifact lookups that found nothing")
+STORE_EVICTIONS = Counter("map_store_evictions_total", "Map artifacts evicted to stay under the quota")
+STORE_BYTES = Gauge("map_store_bytes", "Bytes of map artifacts on disk")
+STORE_ENTRIES = Gauge("map_store_entries", "Map artifacts on disk")
+
+INDEX_VERSION = 2
+INDEX_FLUSH_SECONDS = 60.0
+JOURNAL_MAX_LINES = 1000
+
+
+def write_atomic(path: Path, content: str | bytes) -> None:
+    """Write-then-rename, so a concurrent reader sees the old file or the new one, never half of one."""
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        if isinstance(content, str):
+            tmp.write_text(content, encoding="utf-8")
+        else:
+            tmp.write_bytes(content)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+@dataclass
+class _Entry:
+    size: int  # all variants together
+    accessed: float
+    group: str | None
+    encodings: tuple[str, ...]
+
+    @classmethod
+    def from_row(cls, row: list) -> "_Entry":
+        size, accessed, group, encodings = row
+        return cls(size, accessed, group, tuple(encodings))
+
+
+def _row(entry: _Entry) -> list:
+    """How an entry is written in the snapshot and the journal."""
+    return [entry.size, entry.accessed, entry.group, list(entry.encodings)]
+
+
+@dataclass(frozen=True)
+class Artifact:
+    path: Path
+    encodings: tuple[str, ...]
+
+    def select(self, accept_encoding: str | None) -> tuple[Path, str | None]:
+        """(file, Content-Encoding or None) to send for the request's Accept-Encoding."""
+        encoding = compression.negotiate(accept_encoding, self.encodings)
+        return self.path if encoding is None else _variant_path(self.path, encoding), encoding
+
+
+def _variant_path(path: Path, encoding: str) -> Path:
+    return path.with_name(path.name + compression.SUFFIXES[encoding])
+
+
+class MapStore:
+    """Quota-bounded, LRU-evicted, sharded store of map artifacts, keyed by string.
+
+    An entry can belong to a group (e.g. one user's pages); `put` with
+    `replace_group=True` drops the group's other entries in the same step.
+    """
+
+    def __init__(self, root: Path, quota_bytes: int, suffix: str = ".html"):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.suffix = suffix
+        self._index_path = root / "index.json"
+        self._journal_path = root / "journal.jsonl"
+        self._lock = threading.Lock()
+        # Serializes compactions, which write the snapshot outside self._lock.
+        self._compact_lock = threading.Lock()
+        self._compactor = BackgroundRefresh(lambda _: self._compact(), workers=1, name="map-store-compact")
+        # Least recently accessed first.
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._groups: dict[str, set[str]] = {}
+        self._bytes = 0
+        self._loaded = False
+        # Access times changed since the last snapshot.
+        self._dirty = False
+        self._flushed_at = 0.0
+        self._journal_lines = 0
+
+    def path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / digest[:2] / digest[2:4] / f"{digest}{self.suffix}"
+
+    def get(self, key: str) -> Artifact | None:
+        """The stored artifact, marking it recently used; None if it isn't stored."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.accessed = time.time()
+                self._entries.move_to_end(key)
+                self._dirty = True
+                self._compact_if_due()
+        path = self.path(key)
+        if entry is not None and not path.exists():
+            # Lost to a racing eviction of the key's previous copy, or removed
+            # behind our back: forget it, and it'll be rebuilt like any miss.
+            self.delete(key)
+            entry = None
+        if entry is None:
+            STORE_MISSES.inc()
+            return None
+        STORE_HITS.inc()
+        return Artifact(path, entry.encodings)
+
+    def group(self, group: str) -> list[str]:
+        """Keys in the group, most recently accessed last. Not an access."""
+        with self._lock:
+            self._load()
+            return sorted(self._groups.get(group, ()), key=lambda key: self._entries[key].accessed)
+
+    def put(
+        self,
+        key: str,
+        content: str | bytes,
+        group: str | None = None,
+        replace_group: bool = False,
+        variants: Mapping[str, bytes] | None = None,
+    ) -> Artifact:
+        """Store `content`, plus its `variants` (Content-Encoding -> encoded bytes) beside it."""
+        with self._lock:
+            # Before writing: loading without an index discards untracked files.
+            self._load()
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        variants = variants or {}
+        # The index only points at the artifact once every variant is on disk.
+        for encoding, encoded in variants.items():
+            write_atomic(_variant_path(path, encoding), encoded)
+        write_atomic(path, content)
+        size = path.stat().st_size + sum(len(encoded) for encoded in variants.values())
+        encodings = tuple(variants)
+        with self._lock:
+            self._remove(key)
+            doomed = [k for k in self._groups.get(group, ()) if k != key] if replace_group else []
+            for old in doomed:
+                self._remove(old)
+            entry = _Entry(size, time.time(), group, encodings)
+            self._add(key, entry)
+            evicted = []
+            while self._bytes > self.quota_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted.append(oldest)
+            self._journal([["put", key, *_row(entry)], *(["delete", old] for old in doomed + evicted)])
+        STORE_EVICTIONS.inc(len(evicted))
+        for old in doomed + evicted:
+            self._unlink(old)
+        return Artifact(path, encodings)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._load()
+            if self._remove(key) is None:
+                return
+            self._journal([["delete", key]])
+        self._unlink(key)
+
+    def clear(self) -> None:
+        """Drop every artifact and the index."""
+        with self._compact_lock, self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+                self._unlink(key)
+            self._index_path.unlink(missing_ok=True)
+            self._journal_path.unlink(missing_ok=True)
+            self._journal_lines = 0
+            self._loaded = True
+            self._dirty = False
+
+    def stats(self) -> tuple[int, int]:
+        """(entries, bytes) currently stored."""
+        with self._lock:
+            self._load()
+            return len(self._entries), self._bytes
+
+    def _unlink(self, key: str) -> None:
+        path = self.path(key)
+        path.unlink(missing_ok=True)
+        for encoding in compression.SUFFIXES:
+            _variant_path(path, encoding).unlink(missing_ok=True)
+
+    # -- index bookkeeping; callers hold self._lock --
+
+    def _add(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._bytes += entry.size
+        if entry.group is not None:
+            self._groups.setdefault(entry.group, set()).add(key)
+        self._update_gauges()
+
+    def _remove(self, key: str) -> _Entry | None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry.size
+        if entry.group is not None:
+            members = self._groups[entry.group]
+            members.discard(key)
+            if not members:
+                del self._groups[entry.group]
+        self._update_gauges()
+        return entry
+
+    def _update_gauges(self) -> None:
+        STORE_BYTES.set(self._bytes)
+        STORE_ENTRIES.set(len(self._entries))
+
+    def _journal(self, ops: list[list]) -> None:
+        """Append `ops` to the journal (caller holds self._lock, so lines land in the order applied)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._journal_path.open("a", encoding="utf-8") as journal:
+            journal.writelines(json.dumps(op) + "\n" for op in ops)
+        self._journal_lines += len(ops)
+        self._compact_if_due()
+
+    def _compact_if_due(self) -> None:
+        if self._journal_lines >= JOURNAL_MAX_LINES or (
+            (self._dirty or self._journal_lines) and time.monotonic() - self._flushed_at >= INDEX_FLUSH_SECONDS
+        ):
+            self._compactor.request("index")
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            index = json.loads(self._index_path.read_text(encoding="utf-8"))
+            if index.get("version") != INDEX_VERSION:
+                raise ValueError(f"index version {index.get('version')}")
+            rows = sorted(index["entries"].items(), key=lambda item: item[1][1])
+        except FileNotFoundError:
+            rows = None
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("Map store index at %s unreadable (%s), starting empty", self._index_path, e)
+            rows = None
+        if rows is None:
+            self._journal_path.unlink(missing_ok=True)
+            self._discard_untracked()
+            # The journal only means something on top of a snapshot.
+            self.root.mkdir(parents=True, exist_ok=True)
+            write_atomic(self._index_path, json.dumps({"version": INDEX_VERSION, "entries": {}}))
+            rows = []
+        for key, row in rows:
+            self._add(key, _Entry.from_row(row))
+        self._replay_journal()
+        self._flushed_at = time.monotonic()
+
+    def _replay_journal(self) -> None:
+        try:
+            lines = self._journal_path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return
+        for applied, line in enumerate(lines):
+            try:
+                op, key, *row = json.loads(line)
+            except ValueError:
+                # A line torn by a crash mid-append; it can only be the last.
+                # Cut it off so the next append starts on a line of its own.
+                lines = lines[:applied]
+                write_atomic(self._journal_path, "".join(line + "\n" for line in lines))
+                break
+            self._remove(key)
+            if op == "put":
+                self._add(key, _Entry.from_row(row))
+        self._journal_lines = len(lines)
+        # Replayed entries are ordered by when they were written, not last accessed.
+        for key in sorted(self._entries, key=lambda key: self._entries[key].accessed):
+            self._entries.move_to_end(key)
+        self._dirty = True
+
+    def _discard_untracked(self) -> None:
+        # Without their keys these can never be served again; don't let
+        # them hold quota forever.
+        stray = list(self.root.glob(f"*/*/*{self.suffix}*"))
+        for path in stray:
+            path.unlink(missing_ok=True)
+        if stray:
+            logger.warning("Removed %d map artifacts missing from the store index", len(stray))
+        self._dirty = True
+
+    def flush(self) -> None:
+        """Fold the journal and access times into a new snapshot now (at shutdown)."""
+        self._compact()
+
+    def _compact(self) -> None:
+        with self._compact_lock:
+            with self._lock:
+                if not (self._dirty or self._journal_lines):
+                    return
+                entries = {key: _row(e) for key, e in self._entries.items()}
+                folded = self._journal_lines
+                self._dirty = False
+                self._flushed_at = time.monotonic()
+            # The slow part, without blocking get() and put(): writes landing
+            # meanwhile are appended to the journal after the folded lines.
+            self.root.mkdir(parents=True, exist_ok=True)
+            write_atomic(self._index_path, json.dumps({"version": INDEX_VERSION, "entries": entries}))
+            with self._lock:
+                self._drop_journal_head(folded)
+
+    def _drop_journal_head(self, lines: int) -> None:
+        """Drop the first `lines` journal lines, now in the snapshot. Caller holds self._lock."""
+        if lines == self._journal_lines:
+            self._journal_path.unlink(missing_ok=True)
+        else:
+            rest = self._journal_path.read_text(encoding="utf-8").splitlines(keepends=True)[lines:]
+            write_atomic(self._journal_path, "".join(rest))
+        self._journal_lines -= lines
@@ -20,6 +20,18 @@ def _now():
     return datetime.now(timezone.utc)
 
 
+def course_display_name(club_name: str | None, course_name: str | None) -> str:
+    # Module-level so column-only queries (no Courses instance) label courses
+    # exactly like the ORM property does.
+    if club_name and course_name and club_name != course_name:
+        return f"{club_name} - {course_name}"
+    elif course_name:
+        return course_name
+    elif club_name:
+        return club_name
+    return ""
+
+
 class Courses(Base):
     __tablename__ = "courses"
 
@@ -36,15 +48,14 @@ class Courses(Base):
 
     user_courses = relationship("UserCourses", back_populates="course", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Viewport (bbox) filters on maps and tiles.
+        Index("ix_courses_lat_lon", "latitude", "longitude"),
+    )
+
     @property
     def display_name(self):
-        if self.club_name and self.course_name and self.club_name != self.course_name:
-            return f"{self.club_name} - {self.course_name}"
-        elif self.course_name:
-            return self.course_name
-        elif self.club_name:
-            return self.club_name
-        return ""
+        return course_display_name(self.club_name, self.course_name)
 
     def __repr__(self):
         return f"<course: {self.display_name}, {self.state}>"
@@ -94,6 +105,10 @@ class UserCourses(Base):
         # existing DBs keep the old constraint — the application-level check in
         # add_user_course enforces the rule either way).
         UniqueConstraint("user_id", "course_id", name="uq_user_course"),
+        # Map filters: by user (and year), and by year across users. Both
+        # carry course_id so the join to courses is answered from the index.
+        Index("ix_user_courses_user_year", "user_id", "year", "course_id"),
+        Index("ix_user_courses_year", "year", "user_id", "course_id"),
     )
 
 
@@ -164,3 +179,14 @@ class PasswordResetToken(Base):
     created_at = Column(DateTime(timezone=True), default=_now)
 
     __table_args__ = (Index("ix_prt_token_hash", "token_hash"),)
+
+
+class MapShares(Base):
+    """A public link to a user's map (see app/map_shares.py); revoking it keeps the row."""
+
+    __tablename__ = "map_shares"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), default=_now)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
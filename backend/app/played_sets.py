@@ -0,0 +1,40 @@
+"""Each user's played courses as a sorted array of course ids.
+
+Set operations between two users (see compare) are then NumPy merges of two
+small sorted arrays, microseconds each, rather than a self-join on
+user_courses. A user's array is cached against their data version, which
+every write to their user_courses (and every edit or deletion of a course
+they've played) bumps; the next read after one re-reads it from the
+(user_id, year, course_id) index without touching the table.
+"""
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache import VersionedCache, versions
+from app.models import UserCourses
+
+# user id -> sorted, unique course ids, valid for one version of that user's data.
+_played = VersionedCache(maxsize=4096)
+
+
+def played(db: Session, user_id: int) -> np.ndarray:
+    version = versions.user(user_id)
+    course_ids = _played.get(user_id, version)
+    if course_ids is VersionedCache.MISSING:
+        rows = db.scalars(select(UserCourses.course_id).where(UserCourses.user_id == user_id))
+        course_ids = np.unique(np.fromiter(rows, dtype=np.int64))
+        course_ids.flags.writeable = False
+        _played.put(user_id, version, course_ids)
+    return course_ids
+
+
+def compare(db: Session, user_a: int, user_b: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(played by both, only by user_a, only by user_b), each sorted."""
+    a, b = played(db, user_a), played(db, user_b)
+    return (
+        np.intersect1d(a, b, assume_unique=True),
+        np.setdiff1d(a, b, assume_unique=True),
+        np.setdiff1d(b, a, assume_unique=True),
+    )
@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.cache import BackgroundRefresh, VersionedCache, register, versions
+from app.database import SessionLocal
+from app.models import Courses, UserCourses, course_display_name
+from app.spatial import GridIndex, bbox_around, haversine_km
+
+logger = logging.getLogger(__name__)
+
+# Unplayed courses within this distance of any played course are candidates.
+NEARBY_KM = 100.0
+# Stored per user; the endpoint slices this down to the requested limit.
+MAX_RECOMMENDATIONS = 100
+# Play counts move with every user's writes, not just catalog edits, so the
+# snapshot is also reloaded in the background once it's this old. Cached
+# recommendations aren't dropped for that, so their popularity can lag until
+# the user's courses or the catalog next change.
+POPULARITY_TTL_SECONDS = 600
+
+
+class CourseCatalog:
+    """Immutable snapshot of every located course, indexed for proximity lookups."""
+
+    def __init__(self, rows: list[tuple]):
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        self.names = [r[1] for r in rows]
+        self.lat = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        self.lon = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+        self.popularity = np.fromiter((r[4] for r in rows), dtype=np.int64, count=len(rows))
+        self.position = {int(course_id): i for i, course_id in enumerate(self.ids)}
+        self.index = GridIndex(cell_deg=1.0)
+        for i in range(len(rows)):
+            self.index.insert_point(i, float(self.lat[i]), float(self.lon[i]))
+
+    @classmethod
+    def load(cls, db: Session) -> "CourseCatalog":
+        plays = (
+            db.query(UserCourses.course_id, func.count(UserCourses.id).label("plays"))
+            .group_by(UserCourses.course_id)
+            .subquery()
+        )
+        rows = (
+            db.query(
+                Courses.id,
+                Courses.club_name,
+                Courses.course_name,
+                Courses.latitude,
+                Courses.longitude,
+                func.coalesce(plays.c.plays, 0),
+            )
+            .outerjoin(plays, plays.c.course_id == Courses.id)
+            .filter(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+            .all()
+        )
+        return cls([(cid, course_display_name(club, name), lat, lon, n) for cid, club, name, lat, lon, n in rows])
+
+    def played_bitmap(self, course_ids) -> np.ndarray:
+        played = np.zeros(len(self.ids), dtype=bool)
+        positions = [self.position[cid] for cid in course_ids if cid in self.position]
+        played[positions] = True
+        return played
+
+
+class _CurrentCatalog:
+    """The CourseCatalog readers use, replaced whole by a background reload once
+    the catalog changes or popularity goes stale; readers keep the old one
+    meanwhile. Only the very first read, with nothing loaded, loads inline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        # (versions.catalog() it was loaded at, time.monotonic() it was loaded at, catalog)
+        self._current: tuple[int, float, CourseCatalog] | None = None
+        # Bumped by clear(), so a reload started before it doesn't store afterwards.
+        self._generation = 0
+        self._reloader = BackgroundRefresh(self._reload, workers=1, name="catalog-reload")
+        register(self)
+
+    def _load(self, db: Session) -> tuple[int, float, CourseCatalog]:
+        generation, version = self._generation, versions.catalog()
+        loaded = (version, time.monotonic(), CourseCatalog.load(db))
+        with self._lock:
+            if self._generation == generation and (self._current is None or version >= self._current[0]):
+                self._current = loaded
+        return loaded
+
+    def _reload(self, _key) -> None:
+        db = SessionLocal()
+        try:
+            self._load(db)
+        finally:
+            db.close()
+
+    def get(self, db: Session) -> tuple[int, CourseCatalog]:
+        """(catalog version it was loaded at, catalog)."""
+        current = self._current
+        if current is None:
+            with self._first_load:
+                current = self._current or self._load(db)
+        elif current[0] != versions.catalog() or time.monotonic() - current[1] >= POPULARITY_TTL_SECONDS:
+            self._reloader.request("catalog")
+        return current[0], current[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._current = None
+            self._generation += 1
+
+
+_catalog = _CurrentCatalog()
+# user id -> recommendations, valid for one version of the user's data and of the catalog they were computed from.
+_cache = VersionedCache(maxsize=1024)
+
+
+def compute_recommendations(catalog: CourseCatalog, played_ids: list[int]) -> list[dict]:
+    played = catalog.played_bitmap(played_ids)
+    played_positions = np.flatnonzero(played)
+    if not len(played_positions):
+        return []
+    best_km = np.full(len(catalog.ids), np.inf)
+    near = np.full(len(catalog.ids), -1, dtype=np.int64)
+    for p in played_positions:
+        lat, lon = float(catalog.lat[p]), float(catalog.lon[p])
+        candidates = np.fromiter(catalog.index.query_bbox(bbox_around(lat, lon, NEARBY_KM)), dtype=np.intp)
+        candidates = candidates[~played[candidates]]
+        if not len(candidates):
+            continue
+        d = haversine_km(lat, lon, catalog.lat[candidates], catalog.lon[candidates])
+        closer = d < best_km[candidates]
+        best_km[candidates[closer]] = d[closer]
+        near[candidates[closer]] = catalog.ids[p]
+
+    found = np.flatnonzero(best_km <= NEARBY_KM)
+    # Proximity dominates; popularity (log-damped so one famous course doesn't
+    # swamp everything) breaks ties between similarly close candidates.
+    score = (1.0 + np.log1p(catalog.popularity[found])) / (1.0 + best_km[found] / 25.0)
+    top = found[np.argsort(-score, kind="stable")[:MAX_RECOMMENDATIONS]]
+    return [
+        {
+            "id": int(catalog.ids[i]),
+            "display_name": catalog.names[i],
+            "latitude": float(catalog.lat[i]),
+            "longitude": float(catalog.lon[i]),
+            "distance_km": round(float(best_km[i]), 3),
+            "near_course_id": int(near[i]),
+            "popularity": int(catalog.popularity[i]),
+        }
+        for i in top
+    ]
+
+
+def _compute(db: Session, user_id: int, version: tuple[int, int], catalog: CourseCatalog) -> list[dict]:
+    played_ids = [cid for (cid,) in db.query(UserCourses.course_id).filter(UserCourses.user_id == user_id).all()]
+    recommendations = compute_recommendations(catalog, played_ids)
+    _cache.put(user_id, version, recommendations)
+    return recommendations
+
+
+def get_recommendations(db: Session, user_id: int) -> list[dict]:
+    """Cached lookup; only computes inline if no background refresh has run yet. Blocking: call it off the
+    event loop."""
+    catalog_version, catalog = _catalog.get(db)
+    version = (versions.user(user_id), catalog_version)
+    cached = _cache.get(user_id, version)
+    if cached is not VersionedCache.MISSING:
+        return cached
+    return _compute(db, user_id, version, catalog)
+
+
+def refresh_recommendations(user_id: int) -> None:
+    """Background task run after a user's course writes, so their next read is a cache hit."""
+    db = SessionLocal()
+    try:
+        get_recommendations(db, user_id)
+    except Exception:
+        logger.exception("Recommendation refresh failed for user %s", user_id)
+    finally:
+        db.close()
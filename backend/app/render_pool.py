@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RENDER_SECONDS = Histogram(
+    "map_render_seconds",
+    "Wall time of a map render, including time queued for a worker",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+RENDER_PENDING = Gauge("map_render_pending", "Map renders queued or running in the render pool")
+RENDER_FAILURES = Counter("map_render_failures_total", "Map renders that didn't produce a map", ["kind", "reason"])
+
+
+class RenderQueueFull(Exception):
+    """Too many renders already pending; the caller should back off."""
+
+
+class RenderTimeout(Exception):
+    """The render didn't finish in time. The worker keeps going — it can't be
+    interrupted — but the caller stops waiting for it."""
+
+
+class RenderPool:
+    """Bounded process pool for CPU-heavy map renders.
+
+    Rendering in a separate process keeps it off the event loop and out from
+    under the GIL, so a burst of map traffic can't stall auth or course
+    requests. Work is plain picklable data in, HTML string out. A render
+    still counts as pending until its worker actually finishes, including
+    after the caller timed out, so the queue limit bounds real work.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout_seconds: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # The app process is multi-threaded by the time the first render
+            # arrives, and forking a threaded process can deadlock the child.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+
+    def _finished(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            RENDER_PENDING.set(self._pending)
+
+    def render(self, kind: str, fn: Callable[..., str], *args) -> str:
+        """Run `fn(*args)` in a worker and wait for its result (blocks the calling thread)."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                RENDER_FAILURES.labels(kind, "queue_full").inc()
+                raise RenderQueueFull(f"{self._pending} map renders already pending")
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM kill, segfault) and took the pool with
+                # it; start a fresh one rather than failing every render from now on.
+                logger.error("Map render pool was broken; restarting it")
+                self._executor = None
+                future = self._get_executor().submit(fn, *args)
+            self._pending += 1
+            RENDER_PENDING.set(self._pending)
+        future.add_done_callback(self._finished)
+
+        start = time.perf_counter()
+        try:
+            result = future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            RENDER_FAILURES.labels(kind, "timeout").inc()
+            raise RenderTimeout(f"{kind} map render took longer than {self.timeout_seconds}s") from None
+        except Exception:
+            RENDER_FAILURES.labels(kind, "error").inc()
+            raise
+        RENDER_SECONDS.labels(kind).observe(time.perf_counter() - start)
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+render_pool = RenderPool(
+    workers=settings.MAP_RENDER_WORKERS,
+    max_pending=settings.MAP_RENDER_QUEUE_LIMIT,
+    timeout_seconds=settings.MAP_RENDER_TIMEOUT_SECONDS,
+)
@@ -4,9 +4,13 @@ from fastapi import APIRouter, HTTPException, Path
 from pydantic import BaseModel, ConfigDict, Field
 from starlette import status
 
+from app.cache import versions
 from app.dependencies import admin_dependency, db_dependency
+from app.geocoder import fill_missing_location
+from app.heatmap import heatmap
 from app.models import CourseRequests, Courses, UserCourses, Users
 from app.routers.garmin_courses import CourseBase
+from app.routers.user_courses import course_players, on_course_changed
 from app.security import NewPassword, hash_password
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -75,6 +79,7 @@ async def delete_course(user: admin_dependency, db: db_dependency, course_id: in
     course_model = db.query(Courses).filter(Courses.id == course_id).first()
     if course_model is None:
         raise HTTPException(status_code=404, detail="Course not found")
+    players = course_players(db, course_id)
     db.query(UserCourses).filter(UserCourses.course_id == course_id).delete(synchronize_session=False)
     db.query(CourseRequests).filter(
         (CourseRequests.course_id == course_id) | (CourseRequests.approved_course_id == course_id),
@@ -82,6 +87,9 @@ async def delete_course(user: admin_dependency, db: db_dependency, course_id: in
     ).delete(synchronize_session=False)
     db.delete(course_model)
     db.commit()
+    versions.bump_catalog()
+    on_course_changed(players)
+    heatmap.refresh_courses(db, [course_id])
 
 
 @router.post("/courses", status_code=status.HTTP_201_CREATED, response_model=CourseBase)
@@ -97,8 +105,10 @@ async def create_course(user: admin_dependency, db: db_dependency, course_data:
         longitude=course_data.longitude,
         created_at=datetime.now(timezone.utc),
     )
+    fill_missing_location(course)
     db.add(course)
     db.commit()
+    versions.bump_catalog()
     db.refresh(course)
     return course
 
@@ -115,7 +125,11 @@ async def update_course_info(
         raise HTTPException(status_code=404, detail="Course not found")
     for field, value in info.model_dump(exclude_unset=True).items():
         setattr(course, field, value)
+    # Names are on the played markers' labels.
+    players = course_players(db, course_id)
     db.commit()
+    versions.bump_catalog()
+    on_course_changed(players)
     db.refresh(course)
     return course
 
@@ -132,7 +146,11 @@ async def update_course_location(
         raise HTTPException(status_code=404, detail="Course not found")
     course.latitude = location.latitude
     course.longitude = location.longitude
+    players = course_players(db, course_id)
     db.commit()
+    versions.bump_catalog()
+    on_course_changed(players)
+    heatmap.refresh_courses(db, [course_id])
     db.refresh(course)
     return course
 
@@ -158,6 +176,7 @@ async def update_user_role(
         raise HTTPException(status_code=404, detail="User not found")
     target.role = role_update.role
     db.commit()
+    versions.bump_accounts()
     db.refresh(target)
     return target
 
@@ -192,5 +211,9 @@ async def update_user_active(
         raise HTTPException(status_code=404, detail="User not found")
     target.is_active = active_update.is_active
     db.commit()
+    versions.bump_accounts()
+    # Only active users' plays count towards the heatmap.
+    played = db.query(UserCourses.course_id).filter(UserCourses.user_id == user_id)
+    heatmap.refresh_courses(db, [course_id for (course_id,) in played])
     db.refresh(target)
     return target
@@ -9,6 +9,7 @@ from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 from starlette import status
 
+from app.cache import versions
 from app.config import settings
 from app.database import get_db
 from app.limiter import limiter
@@ -109,6 +110,7 @@ async def create_user(request: Request, db: db_dependency, create_user_request:
     )
     db.add(create_user_model)
     db.commit()
+    versions.bump_accounts()
 
 
 @router.post("/token", response_model=Token)
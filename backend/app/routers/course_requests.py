@@ -5,9 +5,13 @@ from pydantic import BaseModel, ConfigDict, Field, model_validator
 from sqlalchemy.exc import IntegrityError
 from starlette import status as http_status
 
+from app.cache import versions
 from app.dependencies import admin_dependency, db_dependency, user_dependency
+from app.geocoder import fill_missing_location
+from app.heatmap import heatmap
 from app.limiter import limiter
 from app.models import CourseRequests, Courses, UserCourses
+from app.routers.user_courses import course_players, on_course_changed
 
 router = APIRouter(prefix="/course-requests", tags=["course-requests"])
 
@@ -182,6 +186,7 @@ async def admin_approve(user: admin_dependency, db: db_dependency, request_id: i
     if req.status != "pending":
         raise HTTPException(status_code=409, detail="Request is no longer pending")
 
+    players: dict[int, set[int | None]] = {}
     if req.request_type == "new_course":
         course = Courses(
             club_name=req.club_name,
@@ -194,6 +199,7 @@ async def admin_approve(user: admin_dependency, db: db_dependency, request_id: i
             longitude=req.longitude,
             created_at=datetime.now(timezone.utc),
         )
+        fill_missing_location(course)
         db.add(course)
         db.flush()  # get course.id before committing
         user_course = UserCourses(
@@ -203,6 +209,8 @@ async def admin_approve(user: admin_dependency, db: db_dependency, request_id: i
         )
         db.add(user_course)
         req.approved_course_id = course.id
+        # The approval adds the course to the submitter's played list.
+        players = {req.submitted_by_user_id: {None}}
 
     elif req.request_type == "location_change":
         course = db.query(Courses).filter(Courses.id == req.course_id).first()
@@ -210,11 +218,15 @@ async def admin_approve(user: admin_dependency, db: db_dependency, request_id: i
             raise HTTPException(status_code=404, detail="Target course no longer exists")
         course.latitude = req.latitude
         course.longitude = req.longitude
+        players = course_players(db, course.id)
 
     req.status = "approved"
     req.reviewed_by_user_id = user["id"]
     req.reviewed_at = datetime.now(timezone.utc)
     db.commit()
+    versions.bump_catalog()
+    on_course_changed(players)
+    heatmap.refresh_courses(db, [course.id])
     db.refresh(req)
     return _to_out(req)
 
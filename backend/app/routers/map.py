@@ -1,132 +1,611 @@
-import html
+import functools
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Literal
 
-import folium
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi import Path as PathParam
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
 from starlette import status
 
+from app import (
+    clustering,
+    compression,
+    geojson,
+    heatmap,
+    map_assets,
+    map_render,
+    map_shares,
+    played_sets,
+    tiles,
+    user_maps,
+)
+from app.cache import SingleFlight, StaleWhileRevalidate, VersionedCache, content_etag, versions
+from app.compression import Precompressed
 from app.config import settings
+from app.database import SessionLocal
 from app.dependencies import db_dependency, user_dependency
 from app.limiter import limiter
-from app.models import Courses, UserCourses, Users
-from app.routers.user_courses import readall
-
-MAP_DIR = Path(settings.MAP_FILES_DIR)
+from app.map_filters import (
+    NO_ALL_USERS_FILTERS,
+    NO_FILTERS,
+    AllUsersFilters,
+    MapFilters,
+    all_users_filters_dependency,
+    bbox_clause,
+    map_filters_dependency,
+)
+from app.models import Courses, MapShares, UserCourses, Users, course_display_name
+from app.render_pool import RenderQueueFull, RenderTimeout, render_pool
+from app.spatial import BBox
 
 router = APIRouter(prefix="/map", tags=["map"])
 
-_USER_COLORS = [
-    "#e74c3c",
-    "#3498db",
-    "#2ecc71",
-    "#9b59b6",
-    "#f39c12",
-    "#1abc9c",
-    "#e67e22",
-    "#e91e8c",
-    "#00bcd4",
-    "#8d6e63",
-]
-
-
-async def generate_user_map(user: dict, db) -> Path:
-    user_courses = await readall(user, db)
-    MAP_DIR.mkdir(parents=True, exist_ok=True)
-    map_path = MAP_DIR / f"user_map_{user['id']}.html"
-
-    user_map = folium.Map(location=[40, -90], zoom_start=4, control_scale=True)
-    if user_courses:
-        fg = folium.FeatureGroup(name=user["username"])
-        for course in user_courses:
-            if course.latitude is None or course.longitude is None:
-                continue
-            # Popups render as raw HTML — escape user-supplied course names.
-            description = html.escape(course.display_name) + " " + str(course.id)
-            fg.add_child(
-                folium.CircleMarker(
-                    location=[course.latitude, course.longitude],
-                    popup=description,
-                    color="red",
-                    opacity=0.7,
-                    radius=7,
-                )
-            )
-        user_map.add_child(fg)
 
+def _as_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, RenderQueueFull):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Map rendering is busy, please try again shortly",
+            headers={"Retry-After": "5"},
+        )
+    if isinstance(e, RenderTimeout):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Map generation timed out")
+    return HTTPException(status_code=500, detail="Map generation failed")
+
+
+async def generate_user_map(user: dict, db, filters: MapFilters = NO_FILTERS, stale_ok: bool = False) -> str:
+    """Digest of the user's map page."""
     try:
-        user_map.save(str(map_path))
+        digest = await user_maps.page(db, user["id"], filters, stale_ok=stale_ok)
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Map generation failed") from e
+        raise _as_http_error(e) from e
+    if digest is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return digest
 
-    return map_path
 
-
-def generate_all_users_map(db) -> str:
+def _all_users_layers(db, filters: AllUsersFilters = NO_ALL_USERS_FILTERS) -> list[tuple[str, list[map_render.Marker]]]:
+    # Filters go into the join itself (with indexes to match, see
+    # app.models), so a filtered view only reads the rows it draws.
     rows = (
         db.query(Users.username, Courses, UserCourses.year)
         .join(UserCourses, UserCourses.user_id == Users.id)
         .join(Courses, Courses.id == UserCourses.course_id)
         .filter(Users.is_active.is_(True))
         .filter(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+        .filter(*filters.play_clauses(), *filters.course_clauses())
         .order_by(Users.id)
         .all()
     )
-    courses_by_user = {}
+    layers: dict[str, list[map_render.Marker]] = {}
     for username, course, year in rows:
-        courses_by_user.setdefault(username, []).append((course, year))
+        label = course.display_name + (f" ({year})" if year else "")
+        layers.setdefault(username, []).append((course.latitude, course.longitude, label))
+    return list(layers.items())
 
-    all_map = folium.Map(location=[40, -90], zoom_start=4, control_scale=True)
 
-    for i, (username, results) in enumerate(courses_by_user.items()):
-        color = _USER_COLORS[i % len(_USER_COLORS)]
-        dot = (
-            f'<span style="display:inline-block;width:10px;height:10px;border-radius:50%;'
-            f'background:{color};margin-right:6px;vertical-align:middle;"></span>'
-        )
-        # Layer-control names and popups render as raw HTML (the colored dot
-        # span relies on that) — escape the user-supplied parts.
-        fg = folium.FeatureGroup(name=dot + html.escape(username))
-        for course, year in results:
-            label = html.escape(course.display_name)
-            if year:
-                label += f" ({year})"
-            fg.add_child(
-                folium.CircleMarker(
-                    location=[course.latitude, course.longitude],
-                    popup=label,
-                    color=color,
-                    fill=True,
-                    fill_color=color,
-                    fill_opacity=0.7,
-                    opacity=0.9,
-                    radius=7,
-                )
-            )
-        all_map.add_child(fg)
-
-    folium.LayerControl(collapsed=False).add_to(all_map)
-    return all_map.get_root().render()
+def generate_all_users_map(db, filters: AllUsersFilters = NO_ALL_USERS_FILTERS) -> str:
+    layers = _all_users_layers(db, filters)
+    return render_pool.render("all", map_render.all_users_map, layers, settings.MAP_COMPACT_COORDINATES)
+
+
+def _build_with_session(generate) -> Precompressed:
+    # Runs on a cache-build thread, possibly after the triggering request
+    # has finished, so it can't borrow that request's session.
+    db = SessionLocal()
+    try:
+        content = generate(db)
+    finally:
+        db.close()
+    return Precompressed.of(content)
+
+
+# Zooms 0..this are embedded in the all-users map document; past it the
+# page fetches the clusters in view from /map/clusters/all.
+EMBEDDED_CLUSTER_ZOOM = 5
+
+
+@dataclass
+class AllUsersClusters:
+    build: str  # identifies the data the document and the indexes were cut from
+    layers: list[tuple[list[str], clustering.ClusterIndex]]  # (labels, index) per user, in document order
+    document: Precompressed
+
+    def level(self, zoom: int, bbox: BBox | None = None) -> list[dict]:
+        return [_cluster_level(index, labels, zoom, bbox) for labels, index in self.layers]
+
+
+def _cluster_level(index: clustering.ClusterIndex, labels: list[str], zoom: int, bbox: BBox | None) -> dict:
+    lat, lon, counts, first = index.clusters(zoom, bbox)
+    return map_render.cluster_level(
+        lat.tolist(),
+        lon.tolist(),
+        counts.tolist(),
+        [labels[i] for i in first.tolist()],
+        compact=settings.MAP_COMPACT_COORDINATES,
+    )
+
+
+def build_all_users_clusters() -> AllUsersClusters:
+    db = SessionLocal()
+    try:
+        users = _all_users_layers(db)
+    finally:
+        db.close()
+    layers = []
+    for _, markers in users:
+        lat, lon, labels = zip(*markers, strict=True)
+        layers.append((list(labels), clustering.ClusterIndex(lat, lon)))
+    build = hashlib.sha256(repr(users).encode()).hexdigest()[:16]
+    document = map_render.all_users_cluster_data(
+        build,
+        EMBEDDED_CLUSTER_ZOOM,
+        clustering.MAX_CLUSTER_ZOOM,
+        [
+            (username, [_cluster_level(index, labels, z, None) for z in range(EMBEDDED_CLUSTER_ZOOM + 1)])
+            for (username, _), (labels, index) in zip(users, layers, strict=True)
+        ],
+    )
+    return AllUsersClusters(build, layers, Precompressed.of(document))
+
+
+# Keyed on versions.data(): any user_courses, courses or users write makes
+# the cached render stale.
+_all_users_map = StaleWhileRevalidate(lambda: _build_with_session(generate_all_users_map), versions.data)
+# The clustered document and the indexes behind /map/clusters/all come from
+# one build, so a cluster reply always matches the document it's for.
+_all_users_clusters = StaleWhileRevalidate(lambda: build_all_users_clusters(), versions.data)
+# Filtered views of the all-users map, keyed on the normalized filters and
+# valid for one versions.data(). Not served stale: each is cheap next to
+# the full map, and there's no telling which will be asked for again.
+_filtered_all_users_maps = VersionedCache(maxsize=256)
+_filtered_all_users_renders = SingleFlight()
+
+
+def _build_filtered_all_users_map(filters: AllUsersFilters, version: int) -> Precompressed:
+    page = _build_with_session(lambda db: generate_all_users_map(db, filters))
+    _filtered_all_users_maps.put(filters, version, page)
+    return page
+
+
+async def all_users_map(filters: AllUsersFilters = NO_ALL_USERS_FILTERS) -> Precompressed:
+    version = versions.data()
+    if not filters:
+        _, page = await _all_users_map.get()
+        return page
+    page = _filtered_all_users_maps.get(filters, version)
+    if page is not VersionedCache.MISSING:
+        return page
+    return await _filtered_all_users_renders.run((filters, version), _build_filtered_all_users_map, filters, version)
+
+
+def _revalidated(
+    request: Request,
+    content: str | bytes,
+    etag: str,
+    media_type: str,
+    cache_control: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control, **(headers or {})}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _encoding_headers(encoding: str | None) -> dict[str, str]:
+    # Vary even on identity responses: a shared cache must not hand them to
+    # a client that would have got the compressed one, or the reverse.
+    return {**compression.VARY, **({"Content-Encoding": encoding} if encoding else {})}
+
+
+def _negotiated(request: Request, body: Precompressed, media_type: str, cache_control: str) -> Response:
+    """`body` in the best encoding the client accepts; the variants were compressed when it was built."""
+    content, etag, encoding = body.select(request.headers.get("accept-encoding"))
+    return _revalidated(request, content, etag, media_type, cache_control, _encoding_headers(encoding))
+
+
+_SHELL = Precompressed.of(map_render.SHELL)
 
 
 @router.get("/usermap")
 @limiter.limit("30/minute")
-async def get_usermap(request: Request, user: user_dependency, db: db_dependency):
-    map_path = MAP_DIR / f"user_map_{user['id']}.html"
-    if not map_path.exists():
-        map_path = await generate_user_map(user, db)
-    return FileResponse(str(map_path))
+async def get_usermap(request: Request, user: user_dependency, db: db_dependency, filters: map_filters_dependency):
+    # Right after a write this may still be the previous page, while the
+    # new one renders in the background.
+    digest = await generate_user_map(user, db, filters, stale_ok=True)
+    # The redirect is re-checked every time; where it points never changes.
+    url = request.app.url_path_for("get_user_map_page", digest=digest)
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/usermap/{digest}")
+@limiter.limit("30/minute")
+async def get_user_map_page(request: Request, user: user_dependency, digest: str = PathParam(pattern="^[0-9a-f]{32}$")):
+    page = await run_in_threadpool(user_maps.stored_page, user["id"], digest)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    path, encoding = page.select(request.headers.get("accept-encoding"))
+    headers = {"Cache-Control": "private, max-age=31536000, immutable", **_encoding_headers(encoding)}
+    return FileResponse(path, media_type="text/html", headers=headers)
 
 
 @router.get("/user_map_generate", status_code=status.HTTP_200_OK)
 @limiter.limit("30/minute")
 async def user_map_generate(request: Request, user: user_dependency, db: db_dependency):
+    # Waits for a page that's current, rather than serving the last good one.
     await generate_user_map(user, db)
     return {"message": "Map generated"}
 
 
+class MapShareOut(BaseModel):
+    id: int
+    url: str
+    created_at: datetime
+
+
+def _share_out(request: Request, share: MapShares) -> MapShareOut:
+    url = str(request.url_for("get_shared_map", share_token=map_shares.token(share.id)))
+    return MapShareOut(id=share.id, url=url, created_at=share.created_at)
+
+
+@router.post("/shares", status_code=status.HTTP_201_CREATED, response_model=MapShareOut)
+@limiter.limit("10/minute")
+async def create_map_share(request: Request, user: user_dependency, db: db_dependency):
+    share = MapShares(user_id=user["id"])
+    db.add(share)
+    db.commit()
+    db.refresh(share)
+    return _share_out(request, share)
+
+
+@router.get("/shares", response_model=list[MapShareOut])
+async def list_map_shares(request: Request, user: user_dependency, db: db_dependency):
+    shares = (
+        db.query(MapShares)
+        .filter(MapShares.user_id == user["id"], MapShares.revoked_at.is_(None))
+        .order_by(MapShares.id)
+        .all()
+    )
+    return [_share_out(request, share) for share in shares]
+
+
+@router.delete("/shares/{share_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_map_share(user: user_dependency, db: db_dependency, share_id: int):
+    share = (
+        db.query(MapShares)
+        .filter(MapShares.id == share_id, MapShares.user_id == user["id"], MapShares.revoked_at.is_(None))
+        .first()
+    )
+    if share is None:
+        raise HTTPException(status_code=404, detail="Share not found")
+    share.revoked_at = datetime.now(timezone.utc)
+    db.commit()
+
+
+# Shared maps are public and meant to be cached by nginx and browsers, so
+# these skip auth and the rate limiter (behind a cache, the limiter would
+# only see the misses). The redirect is re-checked every minute; pages are
+# immutable, but capped at an hour so a revoked link dies within that.
+SHARED_REDIRECT_MAX_AGE = 60
+SHARED_PAGE_MAX_AGE = 3600
+
+
+@functools.lru_cache(maxsize=256)
+def _shared_page_csp(path: Path) -> str:
+    # Opened as a page of its own, not inside the SPA that nonces the map's
+    # scripts (see app/main.py), so the inline script is allowed by hash;
+    # Leaflet comes from this server (see app.map_assets).
+    # Paths are content-addressed: the same path is always the same page.
+    script = map_render.script_hash(path.read_text(encoding="utf-8"))
+    return (
+        "default-src 'none'; "
+        f"script-src 'self' {script}; "
+        "style-src 'self' 'unsafe-inline'; "
+        "img-src 'self' data: https://tile.openstreetmap.org; "
+        "base-uri 'none'; "
+        "form-action 'none'; "
+        "frame-ancestors 'none'"
+    )
+
+
+def _active_share(db, share_token: str) -> MapShares:
+    share = map_shares.active_share(db, share_token)
+    if share is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    return share
+
+
+@router.get("/shared/{share_token}")
+async def get_shared_map(request: Request, db: db_dependency, share_token: str):
+    share = _active_share(db, share_token)
+    try:
+        digest = await user_maps.page(db, share.user_id)
+    except Exception as e:
+        raise _as_http_error(e) from e
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Map not found")
+    url = request.app.url_path_for("get_shared_map_page", share_token=share_token, digest=digest)
+    return RedirectResponse(
+        url,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={"Cache-Control": f"public, max-age={SHARED_REDIRECT_MAX_AGE}"},
+    )
+
+
+@router.get("/shared/{share_token}/{digest}")
+async def get_shared_map_page(
+    request: Request, db: db_dependency, share_token: str, digest: str = PathParam(pattern="^[0-9a-f]{32}$")
+):
+    share = _active_share(db, share_token)
+    page = await run_in_threadpool(user_maps.stored_page, share.user_id, digest)
+    if page is None:
+        # Superseded since the link was resolved: resolve it again.
+        url = request.app.url_path_for("get_shared_map", share_token=share_token)
+        return RedirectResponse(
+            url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={"Cache-Control": "no-cache"}
+        )
+    path, encoding = page.select(request.headers.get("accept-encoding"))
+    headers = {
+        "Cache-Control": f"public, max-age={SHARED_PAGE_MAX_AGE}, immutable",
+        "Content-Security-Policy": _shared_page_csp(page.path),
+        **_encoding_headers(encoding),
+    }
+    return FileResponse(path, media_type="text/html", headers=headers)
+
+
 @router.get("/allmap")
 @limiter.limit("30/minute")
-async def get_allmap(request: Request, user: user_dependency, db: db_dependency):
-    html = generate_all_users_map(db)
-    return HTMLResponse(content=html)
+async def get_allmap(request: Request, user: user_dependency, filters: all_users_filters_dependency):
+    try:
+        page = await all_users_map(filters)
+    except Exception as e:
+        raise _as_http_error(e) from e
+    # no-cache still lets the browser keep a copy, it just has to revalidate
+    # — which is a 304 until the data (or the stale copy being served) changes.
+    return _negotiated(request, page, "text/html", "private, no-cache")
+
+
+def _compare_inputs(db, user_a: int, user_b: int, usernames: dict[int, str]) -> tuple:
+    """compare_map()'s arguments: the two users' located courses, split by who played them."""
+    both, only_a, only_b = played_sets.compare(db, user_a, user_b)
+    courses = (
+        db.query(Courses)
+        .filter(
+            Courses.id.in_(select(UserCourses.course_id).where(UserCourses.user_id.in_((user_a, user_b)))),
+            Courses.latitude.isnot(None),
+            Courses.longitude.isnot(None),
+        )
+        .order_by(Courses.id)
+        .all()
+    )
+    by_id = {course.id: (course.latitude, course.longitude, course.display_name) for course in courses}
+    markers = [[by_id[i] for i in ids.tolist() if i in by_id] for ids in (both, only_a, only_b)]
+    return usernames[user_a], usernames[user_b], *markers
+
+
+def _build_compare_map(user_a: int, user_b: int, usernames: dict[int, str], version: tuple) -> Precompressed:
+    page = _build_with_session(
+        lambda db: render_pool.render(
+            "compare",
+            map_render.compare_map,
+            *_compare_inputs(db, user_a, user_b, usernames),
+            settings.MAP_COMPACT_COORDINATES,
+        )
+    )
+    _compare_maps.put((user_a, user_b, *usernames.values()), version, page)
+    return page
+
+
+# Keyed on the two users (in order: A and B get different colors) and their
+# usernames, valid for one version of each user's data.
+_compare_maps = VersionedCache(maxsize=256)
+_compare_renders = SingleFlight()
+
+
+@router.get("/compare")
+@limiter.limit("30/minute")
+async def get_compare_map(
+    request: Request,
+    user: user_dependency,
+    db: db_dependency,
+    user_a: int = Query(ge=1),
+    user_b: int = Query(ge=1),
+):
+    if user_a == user_b:
+        raise HTTPException(status_code=422, detail="user_a and user_b must be different users")
+    # Only active users, as on the all-users map.
+    rows = db.query(Users.id, Users.username).filter(Users.id.in_((user_a, user_b)), Users.is_active.is_(True))
+    found = dict(rows.all())
+    if len(found) != 2:
+        raise HTTPException(status_code=404, detail="User not found")
+    usernames = {user_a: found[user_a], user_b: found[user_b]}
+    key = (user_a, user_b, *usernames.values())
+    version = (versions.user(user_a), versions.user(user_b))
+    page = _compare_maps.get(key, version)
+    if page is VersionedCache.MISSING:
+        try:
+            page = await _compare_renders.run((key, version), _build_compare_map, user_a, user_b, usernames, version)
+        except Exception as e:
+            raise _as_http_error(e) from e
+    return _negotiated(request, page, "text/html", "private, no-cache")
+
+
+@router.get("/shell")
+async def get_map_shell(request: Request):
+    # The same bytes for every user and every map (no data in it), so it can
+    # sit in the browser cache; the ETag covers a deploy changing the template.
+    return _negotiated(request, _SHELL, "text/html", "public, max-age=86400")
+
+
+# hashed name -> (content, media type), compressed once at import.
+_ASSETS = {
+    hashed: (Precompressed.of((map_assets.ASSET_DIR / name).read_bytes()), map_assets.MEDIA_TYPES[Path(name).suffix])
+    for name, hashed in map_assets.HASHED_NAMES.items()
+}
+
+
+@router.get("/assets/{name}")
+async def get_map_asset(request: Request, name: str):
+    # Public and unlimited like any static file: maps (shared ones included)
+    # load these before anyone is known, and the name pins the content.
+    if name not in _ASSETS:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    asset, media_type = _ASSETS[name]
+    return _negotiated(request, asset, media_type, "public, max-age=31536000, immutable")
+
+
+@router.get("/data/user")
+@limiter.limit("30/minute")
+async def get_user_map_data(
+    request: Request, user: user_dependency, db: db_dependency, filters: map_filters_dependency
+):
+    try:
+        entry = await user_maps.data(db, user["id"], filters)
+    except Exception as e:
+        raise _as_http_error(e) from e
+    if entry is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return _negotiated(request, entry, "application/json", "private, no-cache")
+
+
+@router.get("/data/all")
+@limiter.limit("30/minute")
+async def get_all_users_map_data(request: Request, user: user_dependency):
+    try:
+        _, clusters = await _all_users_clusters.get()
+    except Exception as e:
+        raise _as_http_error(e) from e
+    return _negotiated(request, clusters.document, "application/json", "private, no-cache")
+
+
+@router.get("/clusters/all")
+@limiter.limit("600/minute")
+async def get_all_users_clusters(
+    request: Request,
+    user: user_dependency,
+    z: int = Query(ge=0, le=clustering.MAX_CLUSTER_ZOOM),
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+):
+    box = geojson.parse_bbox(bbox)
+    try:
+        _, clusters = await _all_users_clusters.get()
+    except Exception as e:
+        raise _as_http_error(e) from e
+    content = map_render.cluster_update(clusters.build, z, clusters.level(z, box))
+    return _revalidated(request, content, content_etag(content), "application/json", "private, no-cache")
+
+
+def _played_features(db, query, with_user: bool):
+    """Column-only rows, fetched in batches and turned into features as the response is written."""
+    for row in db.execute(query.execution_options(yield_per=geojson.CHUNK_FEATURES)):
+        properties = {
+            "course_id": row.id,
+            "name": course_display_name(row.club_name, row.course_name),
+            "year": row.year,
+        }
+        if with_user:
+            properties["user"] = row.username
+        yield geojson.point_feature(row.latitude, row.longitude, properties)
+
+
+def _played_query(bbox: BBox | None, year: int | None):
+    query = (
+        select(
+            Courses.id,
+            Courses.club_name,
+            Courses.course_name,
+            Courses.latitude,
+            Courses.longitude,
+            UserCourses.year,
+        )
+        .join(UserCourses, UserCourses.course_id == Courses.id)
+        .where(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+    )
+    if bbox is not None:
+        query = query.where(bbox_clause(bbox))
+    if year is not None:
+        query = query.where(UserCourses.year == year)
+    return query
+
+
+# Names in these are plain text, not HTML: unlike the map documents, it's
+# up to the consumer to escape them for whatever it renders into.
+@router.get("/geojson/user")
+@limiter.limit("30/minute")
+async def get_user_geojson(
+    request: Request,
+    user: user_dependency,
+    db: db_dependency,
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    year: int | None = Query(None, ge=1900),
+):
+    query = _played_query(geojson.parse_bbox(bbox), year).where(UserCourses.user_id == user["id"])
+    query = query.order_by(UserCourses.id)
+    return StreamingResponse(
+        geojson.stream_feature_collection(_played_features(db, query, with_user=False)), media_type=geojson.MEDIA_TYPE
+    )
+
+
+@router.get("/geojson/all")
+@limiter.limit("30/minute")
+async def get_all_users_geojson(
+    request: Request,
+    user: user_dependency,
+    db: db_dependency,
+    bbox: str | None = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    year: int | None = Query(None, ge=1900),
+    user_id: list[int] | None = Query(None),
+):
+    query = (
+        _played_query(geojson.parse_bbox(bbox), year)
+        .add_columns(Users.username)
+        .join(Users, Users.id == UserCourses.user_id)
+        .where(Users.is_active.is_(True))
+    )
+    if user_id:
+        query = query.where(UserCourses.user_id.in_(user_id))
+    query = query.order_by(UserCourses.user_id, UserCourses.id)
+    return StreamingResponse(
+        geojson.stream_feature_collection(_played_features(db, query, with_user=True)), media_type=geojson.MEDIA_TYPE
+    )
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+@limiter.limit("600/minute")
+async def get_tile(
+    request: Request,
+    user: user_dependency,
+    db: db_dependency,
+    layer: Literal["courses", "played", "all"],
+    z: int = PathParam(ge=0, le=tiles.MAX_ZOOM),
+    x: int = PathParam(ge=0),
+    y: int = PathParam(ge=0),
+):
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    # "played" is the requesting user's own courses; the other two are the same for everyone.
+    tile = await run_in_threadpool(tiles.get_tile, db, layer, user["id"], z, x, y)
+    return _revalidated(request, tile, content_etag(tile), "application/vnd.mapbox-vector-tile", "private, no-cache")
+
+
+@router.get("/heatmap/{z}/{x}/{y}")
+@limiter.limit("600/minute")
+async def get_heatmap_tile(
+    request: Request,
+    user: user_dependency,
+    z: int = PathParam(ge=0, le=heatmap.MAX_HEAT_ZOOM),
+    x: int = PathParam(ge=0),
+    y: int = PathParam(ge=0),
+):
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    # Off the event loop: the first call builds the grid.
+    content = await run_in_threadpool(heatmap.tile_payload, z, x, y)
+    return _revalidated(request, content, content_etag(content), "application/json", "private, no-cache")
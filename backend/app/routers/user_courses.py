@@ -1,21 +1,53 @@
 from datetime import datetime, timezone
-from pathlib import Path as FilePath
 
-from fastapi import APIRouter, HTTPException, Path, Request
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 from sqlalchemy.exc import IntegrityError
 from starlette import status
 
-from app.config import settings
+from app import user_maps
+from app.cache import VersionedCache, versions
 from app.dependencies import db_dependency, user_dependency
+from app.heatmap import heatmap
 from app.limiter import limiter
-from app.models import Courses, UserCourses
+from app.models import Courses, UserCourses, course_display_name
+from app.recommendations import get_recommendations, refresh_recommendations
+from app.travel_stats import geo_stats
+from app.trips import find_trips
 
-_MAP_DIR = FilePath(settings.MAP_FILES_DIR)
+# Keyed on (user_id, home point), valid for one version of that user's data.
+_geo_stats_cache = VersionedCache(maxsize=512)
+# Keyed on (user_id, year), valid for one version of that user's year.
+_trips_cache = VersionedCache(maxsize=2048)
 
 
-def _invalidate_user_map(user_id: int) -> None:
-    (_MAP_DIR / f"user_map_{user_id}.html").unlink(missing_ok=True)
+def _on_user_courses_changed(user_id: int, years: list[int | None], background_tasks: BackgroundTasks) -> None:
+    versions.bump_user(user_id, years)
+    background_tasks.add_task(refresh_recommendations, user_id)
+    user_maps.refresher.request(user_id)
+
+
+def course_players(db, course_id: int) -> dict[int, set[int | None]]:
+    """user id -> the years they played course_id, for everyone who has it on their list.
+
+    One lookup on user_courses' course_id index. Run it in the transaction
+    that edits or deletes the course (before deleting its user_courses rows),
+    then hand the result to on_course_changed once that commits.
+    """
+    players: dict[int, set[int | None]] = {}
+    for user_id, year in db.query(UserCourses.user_id, UserCourses.year).filter(UserCourses.course_id == course_id):
+        players.setdefault(user_id, set()).add(year)
+    return players
+
+
+def on_course_changed(players: dict[int, set[int | None]]) -> None:
+    """Invalidate what's derived from each affected user's courses after a course row changed."""
+    for user_id, years in players.items():
+        versions.bump_user(user_id, years)
+    # No recommendation refresh: those cache against the catalog version
+    # too, which the course write bumps, and a popular course could mean
+    # queueing a recompute for thousands of users.
 
 
 router = APIRouter(prefix="/user_courses", tags=["user_courses"])
@@ -67,6 +99,67 @@ class CourseResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class LatLon(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class BoundingBox(BaseModel):
+    min_latitude: float
+    min_longitude: float
+    max_latitude: float
+    max_longitude: float
+
+
+class CoursePoint(LatLon):
+    id: int
+    display_name: str
+
+
+class FarthestPair(BaseModel):
+    a: CoursePoint
+    b: CoursePoint
+    distance_km: float
+
+
+class HomeDistances(LatLon):
+    nearest: CoursePoint
+    nearest_km: float
+    farthest: CoursePoint
+    farthest_km: float
+    mean_km: float
+
+
+class YearSpread(BaseModel):
+    year: int
+    courses: int
+    centroid: LatLon
+    mean_km_from_centroid: float
+    max_km_from_centroid: float
+
+
+class GeoStatsResponse(BaseModel):
+    total_courses: int
+    centroid: LatLon | None
+    bounding_box: BoundingBox | None
+    farthest_pair: FarthestPair | None
+    home: HomeDistances | None
+    years: list[YearSpread]
+
+
+class Trip(BaseModel):
+    year: int
+    courses: list[CoursePoint]
+    centroid: LatLon
+    radius_km: float
+
+
+class Recommendation(CoursePoint):
+    distance_km: float
+    near_course_id: int
+    popularity: int
+
+
 class YearUpdateRequest(BaseModel):
     year: int = Field(...)
 
@@ -103,23 +196,86 @@ async def readall_ids_w_year(user: user_dependency, db: db_dependency):
 
 @router.get("/readall", status_code=status.HTTP_200_OK, response_model=list[CourseResponse])
 async def readall(user: user_dependency, db: db_dependency):
-    course_ids = db.query(UserCourses.course_id).filter(UserCourses.user_id == user.get("id")).distinct().all()
-    course_ids = [course_id for (course_id,) in course_ids]
-    return (
-        db.query(Courses)
-        .filter(
-            Courses.id.in_(course_ids),
-            Courses.latitude.isnot(None),
-            Courses.longitude.isnot(None),
+    return user_maps.played_courses(db, user.get("id"))
+
+
+@router.get("/stats/geo", status_code=status.HTTP_200_OK, response_model=GeoStatsResponse)
+async def read_geo_stats(
+    user: user_dependency,
+    db: db_dependency,
+    home_lat: float | None = Query(None, ge=-90.0, le=90.0),
+    home_lon: float | None = Query(None, ge=-180.0, le=180.0),
+):
+    if (home_lat is None) != (home_lon is None):
+        raise HTTPException(status_code=422, detail="home_lat and home_lon must be given together")
+    home = (home_lat, home_lon) if home_lat is not None else None
+    user_id = user.get("id")
+    key, version = (user_id, home), versions.user(user_id)
+    stats = _geo_stats_cache.get(key, version)
+    if stats is VersionedCache.MISSING:
+        rows = (
+            db.query(
+                Courses.id,
+                Courses.club_name,
+                Courses.course_name,
+                Courses.latitude,
+                Courses.longitude,
+                UserCourses.year,
+            )
+            .join(UserCourses, Courses.id == UserCourses.course_id)
+            .filter(UserCourses.user_id == user_id)
+            .filter(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+            .all()
         )
-        .all()
-    )
+        stats = geo_stats(
+            [(cid, course_display_name(club, name), lat, lon, year) for cid, club, name, lat, lon, year in rows], home
+        )
+        _geo_stats_cache.put(key, version, stats)
+    return stats
+
+
+@router.get("/trips", status_code=status.HTTP_200_OK, response_model=list[Trip])
+async def read_trips(user: user_dependency, db: db_dependency, year: int | None = Query(None, ge=1900)):
+    """Clusters of courses played close together within the same year."""
+    user_id = user.get("id")
+    years_q = db.query(UserCourses.year).filter(UserCourses.user_id == user_id, UserCourses.year.isnot(None))
+    if year is not None:
+        years_q = years_q.filter(UserCourses.year == year)
+    trips = []
+    for (y,) in years_q.distinct().order_by(UserCourses.year).all():
+        version = versions.user_year(user_id, y)
+        year_trips = _trips_cache.get((user_id, y), version)
+        if year_trips is VersionedCache.MISSING:
+            rows = (
+                db.query(Courses.id, Courses.club_name, Courses.course_name, Courses.latitude, Courses.longitude)
+                .join(UserCourses, Courses.id == UserCourses.course_id)
+                .filter(UserCourses.user_id == user_id, UserCourses.year == y)
+                .filter(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+                .all()
+            )
+            year_trips = find_trips(
+                y, [(cid, course_display_name(club, name), lat, lon) for cid, club, name, lat, lon in rows]
+            )
+            _trips_cache.put((user_id, y), version, year_trips)
+        trips.extend(year_trips)
+    return trips
+
+
+@router.get("/recommendations", status_code=status.HTTP_200_OK, response_model=list[Recommendation])
+async def read_recommendations(user: user_dependency, db: db_dependency, limit: int = Query(20, ge=1, le=100)):
+    """Unplayed courses near the user's played ones, ranked by proximity then popularity."""
+    # Off the event loop: a cold start loads the whole catalog.
+    return (await run_in_threadpool(get_recommendations, db, user.get("id")))[:limit]
 
 
 @router.post("/add_course", status_code=status.HTTP_201_CREATED)
 @limiter.limit("10/minute")
 async def add_user_course(
-    request: Request, user: user_dependency, db: db_dependency, user_course_request: UserCourseRequest
+    request: Request,
+    user: user_dependency,
+    db: db_dependency,
+    user_course_request: UserCourseRequest,
+    background_tasks: BackgroundTasks,
 ):
     course = db.query(Courses).filter(Courses.id == user_course_request.garmin_id).first()
     if course is None:
@@ -145,7 +301,8 @@ async def add_user_course(
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=409, detail="Course already added") from None
-    _invalidate_user_map(user.get("id"))
+    _on_user_courses_changed(user.get("id"), [user_course_request.year], background_tasks)
+    heatmap.refresh_courses(db, [course.id])
 
 
 @router.patch("/{user_course_id}/year", status_code=status.HTTP_200_OK)
@@ -153,23 +310,29 @@ async def update_user_course_year(
     user: user_dependency,
     db: db_dependency,
     year_update: YearUpdateRequest,
+    background_tasks: BackgroundTasks,
     user_course_id: int = Path(ge=1),
 ):
     uc = db.query(UserCourses).filter(UserCourses.id == user_course_id, UserCourses.user_id == user.get("id")).first()
     if uc is None:
         raise HTTPException(status_code=404, detail="Not found")
+    old_year = uc.year
     uc.year = year_update.year
     db.commit()
-    _invalidate_user_map(user.get("id"))
+    _on_user_courses_changed(user.get("id"), [old_year, year_update.year], background_tasks)
 
 
 @router.delete("/delete/{course_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user_course(user: user_dependency, db: db_dependency, course_id: int = Path(ge=1)):
+async def delete_user_course(
+    user: user_dependency, db: db_dependency, background_tasks: BackgroundTasks, course_id: int = Path(ge=1)
+):
     user_course_model = (
         db.query(UserCourses).filter(UserCourses.course_id == course_id, UserCourses.user_id == user.get("id")).first()
     )
     if user_course_model is None:
         raise HTTPException(status_code=404, detail="Course_id not found")
+    year = user_course_model.year
     db.delete(user_course_model)
     db.commit()
-    _invalidate_user_map(user.get("id"))
+    _on_user_courses_changed(user.get("id"), [year], background_tasks)
+    heatmap.refresh_courses(db, [course_id])
@@ -0,0 +1,124 @@
+import math
+from collections import defaultdict
+from collections.abc import Hashable, Iterable
+
+import numpy as np
+
+# (min_lat, min_lon, max_lat, max_lon) — latitude first, like everywhere else
+# in this codebase (Courses columns, folium locations, request bodies).
+BBox = tuple[float, float, float, float]
+
+
+class GridIndex:
+    """Uniform lat/lon cell hash over bounding boxes.
+
+    Each item is bucketed under every cell its bbox touches, so a lookup only
+    has to look at the items sharing a cell with the query instead of
+    scanning everything. Callers do their own exact test (point-in-polygon,
+    distance, ...) on the candidates it returns.
+    """
+
+    def __init__(self, cell_deg: float):
+        self.cell_deg = cell_deg
+        self._cells: dict[tuple[int, int], list[Hashable]] = defaultdict(list)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _cell_range(self, bbox: BBox) -> Iterable[tuple[int, int]]:
+        lo_row, lo_col = self._cell(bbox[0], bbox[1])
+        hi_row, hi_col = self._cell(bbox[2], bbox[3])
+        for row in range(lo_row, hi_row + 1):
+            for col in range(lo_col, hi_col + 1):
+                yield row, col
+
+    def insert(self, item: Hashable, bbox: BBox) -> None:
+        for cell in self._cell_range(bbox):
+            self._cells[cell].append(item)
+
+    def insert_point(self, item: Hashable, lat: float, lon: float) -> None:
+        self._cells[self._cell(lat, lon)].append(item)
+
+    def query_point(self, lat: float, lon: float) -> list[Hashable]:
+        return self._cells.get(self._cell(lat, lon), [])
+
+    def query_bbox(self, bbox: BBox) -> set[Hashable]:
+        found = set()
+        for cell in self._cell_range(bbox):
+            found.update(self._cells.get(cell, ()))
+        return found
+
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> BBox:
+    """Smallest lat/lon box containing a circle of `radius_km` (ignores the antimeridian)."""
+    dlat = radius_km / 111.32
+    dlon = radius_km / (111.32 * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; all arguments in degrees and broadcastable."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def mean_center(lat: np.ndarray, lon: np.ndarray) -> tuple[float, float]:
+    """Geographic centroid: mean of the points as 3D unit vectors, projected back."""
+    la, lo = np.radians(lat), np.radians(lon)
+    x, y, z = (np.cos(la) * np.cos(lo)).mean(), (np.cos(la) * np.sin(lo)).mean(), np.sin(la).mean()
+    return float(np.degrees(np.arctan2(z, np.hypot(x, y)))), float(np.degrees(np.arctan2(y, x)))
+
+
+def convex_hull_indices(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Indices of the planar (lon, lat) convex hull vertices.
+
+    Points strictly inside the quadrilateral of the four axis extremes can't
+    be on the hull (Akl–Toussaint), so that vectorized pass discards almost
+    everything before the monotone-chain loop runs over the survivors.
+    """
+    n = len(lat)
+    if n <= 3:
+        return np.arange(n)
+    x, y = lon, lat
+    quad = [int(np.argmin(x)), int(np.argmin(y)), int(np.argmax(x)), int(np.argmax(y))]
+    keep = np.zeros(n, dtype=bool)
+    for a, b in zip(quad, quad[1:] + quad[:1], strict=True):
+        # Counter-clockwise quad: a point left of every edge is inside it.
+        keep |= (x[b] - x[a]) * (y - y[a]) - (y[b] - y[a]) * (x - x[a]) <= 0
+    keep[quad] = True
+    candidates = np.flatnonzero(keep)
+    candidates = candidates[np.lexsort((y[candidates], x[candidates]))]
+
+    def cross(o, a, b):
+        return (x[a] - x[o]) * (y[b] - y[o]) - (y[a] - y[o]) * (x[b] - x[o])
+
+    lower, upper = [], []
+    for i in candidates:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], i) <= 0:
+            lower.pop()
+        lower.append(i)
+    for i in candidates[::-1]:
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], i) <= 0:
+            upper.pop()
+        upper.append(i)
+    hull = np.array(lower[:-1] + upper[:-1], dtype=np.intp)
+    return hull if len(hull) else candidates[:1]
+
+
+def farthest_pair(lat: np.ndarray, lon: np.ndarray) -> tuple[int, int, float]:
+    """The two points farthest apart, as (index, index, km).
+
+    The farthest pair always lies on the convex hull, so only hull vertices
+    are compared — an all-pairs distance matrix over a few dozen vertices
+    instead of over every point. The hull is taken in lon/lat, a close
+    stand-in for the spherical hull at the regional spreads we see, but
+    wrong for point sets straddling the antimeridian.
+    """
+    hull = convex_hull_indices(lat, lon)
+    d = haversine_km(lat[hull][:, None], lon[hull][:, None], lat[hull][None, :], lon[hull][None, :])
+    i, j = np.unravel_index(int(np.argmax(d)), d.shape)
+    return int(hull[i]), int(hull[j]), float(d[i, j])
@@ -0,0 +1,332 @@
+"""Mapbox Vector Tiles for the course catalog and played-course layers.
+
+Each layer's points are projected to Web Mercator once per data version and
+sorted by Morton (Z-order) code, so the points inside any tile at zoom
+<= INDEX_ZOOM form one contiguous run of that array: a tile query is a
+couple of binary searches instead of a scan. Tiles are encoded straight to
+protobuf (the MVT 2.1 schema is small enough that a library would be most
+of the code), cached in memory per layer version, and — for the catalog,
+which is the same for everyone and the slowest to render at low zooms —
+optionally pre-seeded to disk:
+
+    uv run python -m app.tiles --max-zoom 6
+"""
+
+import argparse
+import hashlib
+import math
+import shutil
+import threading
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache import VersionedCache, versions
+from app.config import settings
+from app.models import Courses, UserCourses, Users, course_display_name
+
+EXTENT = 4096
+# Points this many tile pixels outside the tile are still included, so
+# symbols centred just over an edge aren't clipped in half.
+BUFFER = 64
+# Morton codes are taken at this zoom; any tile at or above it is one
+# contiguous range of the sorted index.
+INDEX_ZOOM = 16
+MAX_ZOOM = 22
+MAX_LAT = 85.0511287798
+TILE_DIR = Path(settings.MAP_FILES_DIR) / "tiles"
+
+
+def mercator(lat: np.ndarray, lon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Normalized Web Mercator: (0, 0) is the top-left corner of the world, (1, 1) the bottom-right."""
+    lat = np.radians(np.clip(lat, -MAX_LAT, MAX_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return x, y
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    v = v.astype(np.uint64) & np.uint64(0xFFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+    return (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+
+
+def morton(tx: np.ndarray, ty: np.ndarray) -> np.ndarray:
+    return _spread_bits(tx) | (_spread_bits(ty) << np.uint64(1))
+
+
+@dataclass
+class LayerIndex:
+    """One layer's points, sorted by Morton code at INDEX_ZOOM."""
+
+    name: str
+    x: np.ndarray
+    y: np.ndarray
+    codes: np.ndarray
+    ids: np.ndarray
+    properties: list[dict]
+    fingerprint: str
+
+    @classmethod
+    def build(cls, name: str, rows: list[tuple]) -> "LayerIndex":
+        """rows: (feature id, latitude, longitude, properties)."""
+        lat = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        lon = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        x, y = mercator(lat, lon)
+        side = 1 << INDEX_ZOOM
+        codes = morton(
+            np.clip((x * side).astype(np.int64), 0, side - 1), np.clip((y * side).astype(np.int64), 0, side - 1)
+        )
+        order = np.argsort(codes, kind="stable")
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))[order]
+        properties = [rows[i][3] for i in order]
+        digest = hashlib.sha256()
+        for array in (ids, lat[order], lon[order]):
+            digest.update(array.tobytes())
+        digest.update(repr(properties).encode())
+        return cls(name, x[order], y[order], codes[order], ids, properties, digest.hexdigest()[:16])
+
+    def _tile_range(self, z: int, tx: int, ty: int) -> tuple[int, int]:
+        if z > INDEX_ZOOM:
+            tx, ty, z = tx >> (z - INDEX_ZOOM), ty >> (z - INDEX_ZOOM), INDEX_ZOOM
+        shift = np.uint64(2 * (INDEX_ZOOM - z))
+        prefix = morton(np.array([tx]), np.array([ty]))[0]
+        lo, hi = prefix << shift, (prefix + np.uint64(1)) << shift
+        return int(np.searchsorted(self.codes, lo)), int(np.searchsorted(self.codes, hi))
+
+    def query(self, z: int, tx: int, ty: int, buffer: float = BUFFER / EXTENT) -> np.ndarray:
+        """Positions of the points inside tile (z, tx, ty) or within `buffer` tile-widths of it."""
+        n = 1 << z
+        ranges = [
+            self._tile_range(z, nx, ny)
+            for nx in (tx - 1, tx, tx + 1)
+            for ny in (ty - 1, ty, ty + 1)
+            if 0 <= nx < n and 0 <= ny < n
+        ]
+        found = np.concatenate([np.arange(lo, hi) for lo, hi in ranges]) if ranges else np.empty(0, np.intp)
+        px, py = self.x[found] * n - tx, self.y[found] * n - ty
+        inside = (px >= -buffer) & (px <= 1 + buffer) & (py >= -buffer) & (py <= 1 + buffer)
+        # Past INDEX_ZOOM neighbouring tiles share a range, hence unique().
+        return np.unique(found[inside])
+
+
+# --- Protobuf encoding (vector_tile.proto, MVT 2.1) ---
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _value(v) -> bytes:
+    if isinstance(v, bool):
+        return _uint_field(7, int(v))
+    if isinstance(v, int) and v >= 0:
+        return _uint_field(5, v)
+    if isinstance(v, int):
+        return _uint_field(6, _zigzag(v))
+    return _field(1, str(v).encode())
+
+
+def encode_tile(index: LayerIndex, z: int, tx: int, ty: int) -> bytes:
+    """One-layer MVT for the tile. Points landing on the same tile pixel keep only the first."""
+    found = index.query(z, tx, ty)
+    if not len(found):
+        return b""
+    n = 1 << z
+    px = np.rint((index.x[found] * n - tx) * EXTENT).astype(np.int64)
+    py = np.rint((index.y[found] * n - ty) * EXTENT).astype(np.int64)
+    _, first = np.unique(px * (4 * EXTENT) + py, return_index=True)
+
+    keys: dict[str, int] = {}
+    values: dict[object, int] = {}
+    features = []
+    for i in np.sort(first):
+        tags = []
+        for key, value in index.properties[found[i]].items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        geometry = b"".join(_varint(v) for v in (9, _zigzag(int(px[i])), _zigzag(int(py[i]))))
+        features.append(
+            _field(
+                2,
+                _uint_field(1, int(index.ids[found[i]]))
+                + _field(2, b"".join(_varint(t) for t in tags))
+                + _uint_field(3, 1)
+                + _field(4, geometry),
+            )
+        )
+    layer = (
+        _uint_field(15, 2)
+        + _field(1, index.name.encode())
+        + b"".join(features)
+        + b"".join(_field(3, k.encode()) for k in keys)
+        + b"".join(_field(4, _value(v)) for _, v in values)
+        + _uint_field(5, EXTENT)
+    )
+    return _field(3, layer)
+
+
+# --- Layer sources ---
+
+
+_COURSE_COLUMNS = (Courses.id, Courses.club_name, Courses.course_name, Courses.latitude, Courses.longitude)
+
+
+def _rows(db: Session, query, extra_keys: tuple[str, ...] = ()) -> list[tuple]:
+    """(feature id, lat, lon, properties) from rows of (id, club, course, lat, lon, *extra_keys)."""
+    rows = []
+    for feature_id, club, course, lat, lon, *extra in db.execute(query):
+        properties = {"name": course_display_name(club, course), **dict(zip(extra_keys, extra, strict=True))}
+        rows.append((feature_id, lat, lon, properties))
+    return rows
+
+
+def _located(query):
+    return query.where(Courses.latitude.isnot(None), Courses.longitude.isnot(None))
+
+
+def load_courses(db: Session) -> LayerIndex:
+    return LayerIndex.build("courses", _rows(db, _located(select(*_COURSE_COLUMNS)).order_by(Courses.id)))
+
+
+def load_played(db: Session, user_id: int) -> LayerIndex:
+    query = (
+        select(*_COURSE_COLUMNS)
+        .join(UserCourses, UserCourses.course_id == Courses.id)
+        .where(UserCourses.user_id == user_id)
+        .distinct()
+    )
+    return LayerIndex.build("played", _rows(db, _located(query).order_by(Courses.id)))
+
+
+def load_all_played(db: Session) -> LayerIndex:
+    # One feature per play, so the feature id is the user_courses row's.
+    query = (
+        select(
+            UserCourses.id,
+            Courses.club_name,
+            Courses.course_name,
+            Courses.latitude,
+            Courses.longitude,
+            Courses.id,
+            Users.username,
+            UserCourses.year,
+        )
+        .join(UserCourses, UserCourses.course_id == Courses.id)
+        .join(Users, Users.id == UserCourses.user_id)
+        .where(Users.is_active.is_(True))
+    )
+    return LayerIndex.build("all", _rows(db, _located(query).order_by(UserCourses.id), ("course_id", "user", "year")))
+
+
+def _source(layer: str, user_id: int) -> tuple[tuple, Hashable, Callable[[Session], LayerIndex]]:
+    """(index cache key, its current version, loader) for a layer as seen by `user_id`."""
+    if layer == "courses":
+        return ("courses",), versions.catalog(), load_courses
+    if layer == "played":
+        return ("played", user_id), (versions.user(user_id), versions.catalog()), lambda db: load_played(db, user_id)
+    return ("all",), versions.data(), load_all_played
+
+
+_indexes = VersionedCache(maxsize=64)
+_index_lock = threading.Lock()
+_tiles = VersionedCache(maxsize=4096)
+
+
+def get_index(db: Session, layer: str, user_id: int) -> tuple[LayerIndex, Hashable]:
+    key, version, load = _source(layer, user_id)
+    index = _indexes.get(key, version)
+    if index is VersionedCache.MISSING:
+        with _index_lock:
+            index = _indexes.get(key, version)
+            if index is VersionedCache.MISSING:
+                index = load(db)
+                _indexes.put(key, version, index)
+    return index, version
+
+
+def seeded_path(index: LayerIndex, z: int, x: int, y: int) -> Path:
+    return TILE_DIR / index.name / index.fingerprint / str(z) / str(x) / f"{y}.pbf"
+
+
+def get_tile(db: Session, layer: str, user_id: int, z: int, x: int, y: int) -> bytes:
+    """Blocking: builds the layer index and encodes on a miss. Call from a worker thread."""
+    index, version = get_index(db, layer, user_id)
+    key = (layer, user_id if layer == "played" else None, z, x, y)
+    tile = _tiles.get(key, version)
+    if tile is VersionedCache.MISSING:
+        seeded = seeded_path(index, z, x, y)
+        # Seeded files are named by the layer's content fingerprint, so a
+        # stale seed can't be served even across restarts or out-of-band edits.
+        tile = seeded.read_bytes() if layer == "courses" and seeded.exists() else encode_tile(index, z, x, y)
+        _tiles.put(key, version, tile)
+    return tile
+
+
+def seed(index: LayerIndex, max_zoom: int, out=print) -> int:
+    """Write every non-empty tile up to `max_zoom`, replacing seeds of older fingerprints."""
+    layer_dir = TILE_DIR / index.name
+    if layer_dir.exists():
+        for old in layer_dir.iterdir():
+            if old.name != index.fingerprint:
+                shutil.rmtree(old)
+    written = 0
+    for z in range(max_zoom + 1):
+        n = 1 << z
+        # Only tiles that contain a point can be non-empty.
+        tx_all = np.clip(np.floor(index.x * n).astype(np.int64), 0, n - 1)
+        ty_all = np.clip(np.floor(index.y * n).astype(np.int64), 0, n - 1)
+        occupied = set(zip(tx_all.tolist(), ty_all.tolist(), strict=True))
+        for tx, ty in sorted(occupied):
+            tile = encode_tile(index, z, tx, ty)
+            path = seeded_path(index, z, tx, ty)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(tile)
+            written += 1
+        out(f"zoom {z}: {len(occupied)} tiles")
+    return written
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-zoom", type=int, default=6, help="seed zoom levels 0..N of the catalog layer")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        index = load_courses(db)
+    finally:
+        db.close()
+    total = seed(index, args.max_zoom)
+    print(f"Seeded {total} tiles for catalog {index.fingerprint} under {TILE_DIR / index.name}")
+
+
+if __name__ == "__main__":
+    main()
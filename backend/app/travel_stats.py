@@ -0,0 +1,79 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from app.spatial import farthest_pair, haversine_km, mean_center
+
+
+def _point(ids, names, lat, lon, i: int) -> dict:
+    return {"id": int(ids[i]), "display_name": names[i], "latitude": float(lat[i]), "longitude": float(lon[i])}
+
+
+def geo_stats(rows: Sequence[tuple], home: tuple[float, float] | None = None) -> dict:
+    """Travel statistics over (course_id, display_name, latitude, longitude, year) rows.
+
+    Coordinates go into NumPy arrays once; every distance below is a
+    vectorized haversine over those arrays rather than a per-course loop.
+    """
+    stats = {
+        "total_courses": len(rows),
+        "centroid": None,
+        "bounding_box": None,
+        "farthest_pair": None,
+        "home": None,
+        "years": [],
+    }
+    if not rows:
+        return stats
+
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    names = [r[1] for r in rows]
+    lat = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    lon = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+    years = np.fromiter((r[4] if r[4] is not None else -1 for r in rows), dtype=np.int64, count=len(rows))
+
+    c_lat, c_lon = mean_center(lat, lon)
+    stats["centroid"] = {"latitude": c_lat, "longitude": c_lon}
+    stats["bounding_box"] = {
+        "min_latitude": float(lat.min()),
+        "min_longitude": float(lon.min()),
+        "max_latitude": float(lat.max()),
+        "max_longitude": float(lon.max()),
+    }
+    if len(rows) > 1:
+        i, j, km = farthest_pair(lat, lon)
+        stats["farthest_pair"] = {"a": _point(ids, names, lat, lon, i), "b": _point(ids, names, lat, lon, j)}
+        stats["farthest_pair"]["distance_km"] = km
+
+    if home is not None:
+        d = haversine_km(home[0], home[1], lat, lon)
+        near, far = int(np.argmin(d)), int(np.argmax(d))
+        stats["home"] = {
+            "latitude": home[0],
+            "longitude": home[1],
+            "nearest": _point(ids, names, lat, lon, near),
+            "nearest_km": float(d[near]),
+            "farthest": _point(ids, names, lat, lon, far),
+            "farthest_km": float(d[far]),
+            "mean_km": float(d.mean()),
+        }
+
+    # Per-year spread: group with one argsort, then each year's centroid and
+    # distances are computed over a contiguous slice of the sorted arrays.
+    dated = np.flatnonzero(years >= 0)
+    order = dated[np.argsort(years[dated], kind="stable")]
+    year_values, starts, counts = np.unique(years[order], return_index=True, return_counts=True)
+    for year, start, count in zip(year_values, starts, counts, strict=True):
+        idx = order[start : start + count]
+        y_lat, y_lon = mean_center(lat[idx], lon[idx])
+        d = haversine_km(y_lat, y_lon, lat[idx], lon[idx])
+        stats["years"].append(
+            {
+                "year": int(year),
+                "courses": int(count),
+                "centroid": {"latitude": y_lat, "longitude": y_lon},
+                "mean_km_from_centroid": float(d.mean()),
+                "max_km_from_centroid": float(d.max()),
+            }
+        )
+    return stats
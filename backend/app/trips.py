@@ -0,0 +1,79 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from app.spatial import GridIndex, bbox_around, haversine_km, mean_center
+
+# Courses within this distance of each other chain into the same trip…
+TRIP_RADIUS_KM = 50.0
+# …and a trip needs at least this many courses; anything sparser is a one-off.
+MIN_TRIP_COURSES = 2
+
+
+def cluster_points(
+    lat: np.ndarray, lon: np.ndarray, eps_km: float = TRIP_RADIUS_KM, min_samples: int = MIN_TRIP_COURSES
+) -> np.ndarray:
+    """DBSCAN over lat/lon with a cell-hash neighbour lookup. Returns one label per point, -1 for noise.
+
+    Points are bucketed in a GridIndex whose cells are about eps wide, so
+    each neighbourhood query only measures distances to points in the few
+    surrounding cells instead of to every point.
+    """
+    n = len(lat)
+    index = GridIndex(cell_deg=eps_km / 111.32)
+    for i in range(n):
+        index.insert_point(i, float(lat[i]), float(lon[i]))
+
+    neighbours = []
+    for i in range(n):
+        candidates = np.fromiter(index.query_bbox(bbox_around(float(lat[i]), float(lon[i]), eps_km)), dtype=np.intp)
+        d = haversine_km(lat[i], lon[i], lat[candidates], lon[candidates])
+        neighbours.append(candidates[d <= eps_km])
+
+    labels = np.full(n, -1, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    cluster = 0
+    for i in range(n):
+        if visited[i]:
+            continue
+        visited[i] = True
+        if len(neighbours[i]) < min_samples:
+            continue
+        labels[i] = cluster
+        frontier = list(neighbours[i])
+        while frontier:
+            j = frontier.pop()
+            if labels[j] == -1:
+                labels[j] = cluster
+            if visited[j]:
+                continue
+            visited[j] = True
+            if len(neighbours[j]) >= min_samples:
+                frontier.extend(neighbours[j])
+        cluster += 1
+    return labels
+
+
+def find_trips(year: int, rows: Sequence[tuple]) -> list[dict]:
+    """Trips within one year's (course_id, display_name, latitude, longitude) rows."""
+    if not rows:
+        return []
+    lat = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    lon = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+    labels = cluster_points(lat, lon)
+    trips = []
+    for label in range(labels.max() + 1):
+        idx = np.flatnonzero(labels == label)
+        c_lat, c_lon = mean_center(lat[idx], lon[idx])
+        trips.append(
+            {
+                "year": year,
+                "courses": [
+                    {"id": rows[i][0], "display_name": rows[i][1], "latitude": rows[i][2], "longitude": rows[i][3]}
+                    for i in idx
+                ],
+                "centroid": {"latitude": c_lat, "longitude": c_lon},
+                "radius_km": float(haversine_km(c_lat, c_lon, lat[idx], lon[idx]).max()),
+            }
+        )
+    return trips
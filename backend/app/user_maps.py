@@ -0,0 +1,231 @@
+"""A user's own map: the self-contained page (/map/usermap) and the data
+document the map shell draws (/map/data/user).
+
+Pages are stored (in the quota-bounded app.map_store) under a hash of
+everything they're rendered from, so a page is never rendered twice for the
+same inputs and its URL can be cached forever. After a user's courses
+change, `refresher` rebuilds both in the background — one rebuild per user
+however many writes land meanwhile — and requests keep getting the last
+good copy until it's done. Both are compressed as they're built (see
+app.compression), so serving them is only ever a choice of variant.
+
+Either can be narrowed by app.map_filters. Each filter combination is
+cached on its own, for as long as the user's data doesn't change; filtered
+views aren't prerendered, so the first request after a write renders one.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+
+from app import compression, map_render
+from app.cache import BackgroundRefresh, SingleFlight, VersionedCache, versions
+from app.compression import Precompressed
+from app.config import settings
+from app.database import SessionLocal
+from app.map_filters import NO_FILTERS, MapFilters
+from app.map_store import Artifact, MapStore
+from app.models import Courses, UserCourses, Users
+from app.render_pool import render_pool
+
+logger = logging.getLogger(__name__)
+
+MAP_DIR = Path(settings.MAP_FILES_DIR)
+
+
+def played_courses(db, user_id: int, filters: MapFilters = NO_FILTERS) -> list[Courses]:
+    """The user's courses that have a location and match `filters` — what their map shows."""
+    plays = select(UserCourses.course_id).where(UserCourses.user_id == user_id, *filters.play_clauses())
+    return (
+        db.query(Courses)
+        .filter(
+            Courses.id.in_(plays),
+            Courses.latitude.isnot(None),
+            Courses.longitude.isnot(None),
+            *filters.course_clauses(),
+        )
+        .all()
+    )
+
+
+def _inputs(db, user_id: int, filters: MapFilters) -> tuple[str, list[map_render.Marker]] | None:
+    """(username, markers) the user's map is drawn from; None if there's no such user."""
+    username = db.query(Users.username).filter(Users.id == user_id).scalar()
+    if username is None:
+        return None
+    courses = played_courses(db, user_id, filters)
+    return username, [(c.latitude, c.longitude, f"{c.display_name} {c.id}") for c in courses]
+
+
+store = MapStore(MAP_DIR / "pages", quota_bytes=settings.MAP_STORE_QUOTA_MB * 1024 * 1024)
+
+
+def _page_key(user_id: int, digest: str) -> str:
+    return f"user/{user_id}/{digest}"
+
+
+def _page_group(user_id: int, filters: MapFilters) -> str:
+    # One group per filter combination, so rendering one view doesn't drop
+    # the pages of the others.
+    return f"user/{user_id}?{filters.query_string()}" if filters else f"user/{user_id}"
+
+
+def stored_page(user_id: int, digest: str) -> Artifact | None:
+    return store.get(_page_key(user_id, digest))
+
+
+# Part of every digest, so a deploy that changes the page template (which
+# SHELL shares) doesn't keep serving pages rendered from the old one.
+_TEMPLATE_DIGEST = hashlib.sha256(map_render.SHELL.encode()).hexdigest()
+
+
+def _page_digest(filters: MapFilters, username: str, markers: list[map_render.Marker]) -> str:
+    """Hash of everything the page is rendered from, and of the view it's for: equal digests mean
+    byte-identical pages. Two views that draw the same markers still get their own page (and store key),
+    so neither can evict the other's when it re-renders."""
+    payload = json.dumps(
+        [_TEMPLATE_DIGEST, settings.MAP_COMPACT_COORDINATES, filters.query_string(), username, markers],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _build_page(user_id: int, filters: MapFilters, username: str, markers: list[map_render.Marker], digest: str) -> str:
+    if stored_page(user_id, digest) is None:
+        content = render_pool.render("user", map_render.user_map, username, markers, settings.MAP_COMPACT_COORDINATES)
+        # /usermap points at this one from now on; the view's older pages
+        # live on only in browser caches, which don't need our copy.
+        store.put(
+            _page_key(user_id, digest),
+            content,
+            group=_page_group(user_id, filters),
+            replace_group=True,
+            variants=compression.compress(content),
+        )
+    return digest
+
+
+def _build_data(
+    user_id: int, filters: MapFilters, username: str, markers: list[map_render.Marker], version: int
+) -> Precompressed:
+    content = render_pool.render(
+        "user_data", map_render.user_map_data, username, markers, settings.MAP_COMPACT_COORDINATES
+    )
+    entry = Precompressed.of(content)
+    _data.put((user_id, filters), version, entry)
+    return entry
+
+
+# Keyed on ("page", user id, digest) or ("data", user id, filters, version):
+# callers for the same render share it, request-time and background alike.
+_renders = SingleFlight()
+# (user id, filters) -> digest of that view's current page, valid for one
+# version of the user's data.
+_digests = VersionedCache(maxsize=1024)
+# (user id, filters) -> data document, valid for one version of the user's data.
+_data = VersionedCache(maxsize=1024)
+
+
+def _current_page(user_id: int, filters: MapFilters, version: int) -> str | None:
+    digest = _digests.get((user_id, filters), version)
+    if digest is VersionedCache.MISSING or stored_page(user_id, digest) is None:
+        return None
+    return digest
+
+
+def _latest_page(user_id: int) -> str | None:
+    # _build_page leaves at most one page per view behind.
+    keys = store.group(_page_group(user_id, NO_FILTERS))
+    return keys[-1].rsplit("/", 1)[1] if keys else None
+
+
+async def page(db, user_id: int, filters: MapFilters = NO_FILTERS, stale_ok: bool = True) -> str | None:
+    """Digest of the user's map page (see stored_page); rendered inline only if there's none to serve,
+    or `stale_ok` is off. Only the unfiltered page is ever served stale."""
+    version = versions.user(user_id)
+    # The store touches the disk: keep it off the event loop.
+    digest = await run_in_threadpool(_current_page, user_id, filters, version)
+    if digest is not None:
+        return digest
+    if stale_ok and not filters and (digest := await run_in_threadpool(_latest_page, user_id)) is not None:
+        refresher.request(user_id)
+        return digest
+    if (inputs := _inputs(db, user_id, filters)) is None:
+        return None
+    username, markers = inputs
+    digest = _page_digest(filters, username, markers)
+    _digests.put((user_id, filters), version, digest)
+    return await _renders.run(("page", user_id, digest), _build_page, user_id, filters, username, markers, digest)
+
+
+async def data(db, user_id: int, filters: MapFilters = NO_FILTERS) -> Precompressed | None:
+    """The user's map data document; the unfiltered one is stale while a rebuild runs, inline only on a
+    cold start."""
+    version = versions.user(user_id)
+    entry = _data.get((user_id, filters), version)
+    if entry is not VersionedCache.MISSING:
+        return entry
+    if not filters and (entry := _data.latest((user_id, filters))) is not VersionedCache.MISSING:
+        refresher.request(user_id)
+        return entry
+    if (inputs := _inputs(db, user_id, filters)) is None:
+        return None
+    username, markers = inputs
+    return await _renders.run(
+        ("data", user_id, filters, version), _build_data, user_id, filters, username, markers, version
+    )
+
+
+def prerender(user_id: int) -> None:
+    """Bring the user's unfiltered page and data document up to date with their courses."""
+    version = versions.user(user_id)
+    db = SessionLocal()
+    try:
+        inputs = _inputs(db, user_id, NO_FILTERS)
+    finally:
+        db.close()
+    if inputs is None:
+        return
+    username, markers = inputs
+    digest = _page_digest(NO_FILTERS, username, markers)
+    _digests.put((user_id, NO_FILTERS), version, digest)
+    _renders.submit(("page", user_id, digest), _build_page, user_id, NO_FILTERS, username, markers, digest).result()
+    _renders.submit(
+        ("data", user_id, NO_FILTERS, version), _build_data, user_id, NO_FILTERS, username, markers, version
+    ).result()
+
+
+# No more threads than render workers: a prerender spends its time waiting
+# on the render pool, and this way background work can never fill the pool's
+# queue ahead of requests.
+refresher = BackgroundRefresh(prerender, workers=settings.MAP_RENDER_WORKERS, name="map-prerender")
+
+
+def warm_up(users: int) -> None:
+    """Queue prerenders for the `users` users whose courses changed most recently."""
+    db = SessionLocal()
+    try:
+        recent = (
+            db.query(UserCourses.user_id)
+            .join(Users, Users.id == UserCourses.user_id)
+            .filter(Users.is_active.is_(True))
+            .group_by(UserCourses.user_id)
+            .order_by(func.max(UserCourses.updated_at).desc())
+            .limit(users)
+            .all()
+        )
+    finally:
+        db.close()
+    for (user_id,) in recent:
+        refresher.request(user_id)
+    logger.info("Warming maps for %d recently active users", len(recent))
+
+
+def remove_legacy_files() -> None:
+    """Delete user map pages from the layout before the store (user_map_<id>.html)."""
+    for path in MAP_DIR.glob("user_map_*.html"):
+        path.unlink(missing_ok=True)
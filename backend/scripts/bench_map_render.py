@@ -0,0 +1,100 @@
+"""
+Benchmarks app/map_render.py's all-users map against the folium renderer it
+replaced, on synthetic markers spread over the continental US, and the page
+with and without compact (polyline-encoded) coordinates, as sent: raw,
+gzip and brotli.
+
+folium is no longer an app dependency, so pull it in for the run:
+    uv run --with folium python scripts/bench_map_render.py --markers 50000
+"""
+
+import argparse
+import html
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import compression, map_render  # noqa: E402
+
+
+def folium_all_users_map(layers):
+    """The pre-template renderer, kept here verbatim as the baseline."""
+    import folium
+
+    all_map = folium.Map(location=[40, -90], zoom_start=4, control_scale=True)
+    for i, (username, markers) in enumerate(layers):
+        color = map_render.USER_COLORS[i % len(map_render.USER_COLORS)]
+        dot = (
+            f'<span style="display:inline-block;width:10px;height:10px;border-radius:50%;'
+            f'background:{color};margin-right:6px;vertical-align:middle;"></span>'
+        )
+        fg = folium.FeatureGroup(name=dot + html.escape(username))
+        for lat, lon, label in markers:
+            fg.add_child(
+                folium.CircleMarker(
+                    location=[lat, lon],
+                    popup=html.escape(label),
+                    color=color,
+                    fill=True,
+                    fill_color=color,
+                    fill_opacity=0.7,
+                    opacity=0.9,
+                    radius=7,
+                )
+            )
+        all_map.add_child(fg)
+    folium.LayerControl(collapsed=False).add_to(all_map)
+    return all_map.get_root().render()
+
+
+def synthetic_layers(markers: int, users: int, seed: int = 0):
+    rng = random.Random(seed)
+    layers = [(f"user{u}", []) for u in range(users)]
+    for i in range(markers):
+        label = f"Synthetic Golf Club - Course {i} ({rng.randint(1995, 2026)})"
+        layers[i % users][1].append((rng.uniform(25, 49), rng.uniform(-124, -67), label))
+    return layers
+
+
+def timed(fn, layers, repeat):
+    best, out = float("inf"), ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(layers)
+        best = min(best, time.perf_counter() - start)
+    return best, len(out.encode())
+
+
+def sizes(page: str) -> str:
+    encoded = compression.compress(page)
+    return "  ".join(f"{name} {len(body) / 1e6:6.2f} MB" for name, body in [("raw", page.encode()), *encoded.items()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--markers", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    layers = synthetic_layers(args.markers, args.users)
+    new_s, new_bytes = timed(map_render.all_users_map, layers, args.repeat)
+    print(f"template: {new_s * 1000:9.1f} ms  {new_bytes / 1e6:7.2f} MB")
+    compact_s, _ = timed(lambda layers: map_render.all_users_map(layers, compact=True), layers, args.repeat)
+    print(f"compact:  {compact_s * 1000:9.1f} ms")
+    print(f"  plain coordinates:   {sizes(map_render.all_users_map(layers))}")
+    print(f"  compact coordinates: {sizes(map_render.all_users_map(layers, compact=True))}")
+    try:
+        old_s, old_bytes = timed(folium_all_users_map, layers, 1)
+    except ImportError:
+        print("folium:   not installed (see module docstring)")
+        return
+    print(f"folium:   {old_s * 1000:9.1f} ms  {old_bytes / 1e6:7.2f} MB")
+    print(f"speedup {old_s / new_s:.1f}x, {old_bytes / new_bytes:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Builds app/data/boundaries.json.gz, the bundled polygon set used by the
+offline reverse geocoder (app/geocoder.py).
+
+Sources (both public domain):
+  - Natural Earth 1:110m admin-0 countries, as shipped in the geopandas 0.x
+    wheel (geopandas/datasets/naturalearth_lowres/naturalearth_lowres.shp)
+  - US state boundaries from bokeh_sampledata
+    (bokeh_sampledata/_data/US_Regions_State_Boundaries.csv.gz)
+
+Country alpha-2 codes come from frontend/src/utils/geoLookup.js's
+ALPHA2_TO_ALPHA3 table so the backend and frontend agree on codes.
+
+Usage (needs `pip install pyshp`, which is not an app dependency):
+    python scripts/build_boundaries.py naturalearth_lowres.shp US_Regions_State_Boundaries.csv.gz
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import re
+import sys
+import xml.etree.ElementTree as et
+from pathlib import Path
+
+import shapefile
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_OUT = BACKEND_DIR / "app" / "data" / "boundaries.json.gz"
+GEO_LOOKUP_JS = BACKEND_DIR.parent / "frontend" / "src" / "utils" / "geoLookup.js"
+
+# naturalearth_lowres leaves iso_a3 as -99 for a few disputed/dependent
+# territories; geopandas' own creation script patches these the same way.
+ISO_A3_FIXES = {"France": "FRA", "Norway": "NOR", "Kosovo": "XKX", "N. Cyprus": "CYP", "Somaliland": "SOM"}
+
+# ~100 m precision is plenty for deciding which country/state a golf course is in.
+DECIMALS = 3
+
+
+def alpha3_to_alpha2(js_path: Path) -> dict[str, str]:
+    pairs = re.findall(r"'([a-z]{2})':\s*'([A-Z]{3})'", js_path.read_text(encoding="utf-8"))
+    return {a3: a2.upper() for a2, a3 in pairs}
+
+
+def flatten(points) -> list[float]:
+    flat = []
+    for lon, lat in points:
+        flat.append(round(lon, DECIMALS))
+        flat.append(round(lat, DECIMALS))
+    return flat
+
+
+def read_countries(shp_path: Path, alpha2: dict[str, str]) -> list[dict]:
+    countries = []
+    for shape_rec in shapefile.Reader(str(shp_path)).iterShapeRecords():
+        name = shape_rec.record["name"]
+        code = ISO_A3_FIXES.get(name, shape_rec.record["iso_a3"])
+        if code == "-99":
+            continue
+        shape = shape_rec.shape
+        bounds = list(shape.parts) + [len(shape.points)]
+        rings = [flatten(shape.points[start:end]) for start, end in zip(bounds, bounds[1:], strict=False)]
+        countries.append({"code": code, "alpha2": alpha2.get(code), "name": name, "rings": rings})
+    return countries
+
+
+def read_us_states(csv_gz_path: Path) -> list[dict]:
+    csv.field_size_limit(sys.maxsize)
+    regions = []
+    with gzip.open(csv_gz_path, "rt", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            root = et.fromstring(row["geometry"])
+            rings = []
+            for coords in root.iter("coordinates"):
+                points = [tuple(map(float, triple.split(",")[:2])) for triple in coords.text.split()]
+                rings.append(flatten(points))
+            regions.append({"country": "USA", "code": row["id"], "name": row["name"], "rings": rings})
+    return regions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("countries_shp", type=Path)
+    parser.add_argument("us_states_csv_gz", type=Path)
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    data = {
+        "countries": read_countries(args.countries_shp, alpha3_to_alpha2(GEO_LOOKUP_JS)),
+        "regions": read_us_states(args.us_states_csv_gz),
+    }
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    # mtime=0 keeps the output byte-identical across rebuilds of the same inputs.
+    args.out.write_bytes(gzip.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), mtime=0))
+    print(f"Wrote {len(data['countries'])} countries and {len(data['regions'])} regions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
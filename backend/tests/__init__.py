@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Let the suite run without requiring the environment to be configured.
 # Set before any app module is imported (Settings reads it at import time).
@@ -6,3 +7,7 @@ import os
 os.environ.setdefault("SECRET_KEY_AUTH", "test-secret-key-0123456789abcdef")
 # Never report test runs to Sentry, even if the shell has a DSN configured.
 os.environ["SENTRY_DSN"] = ""
+# Map pages and tiles go to a throwaway directory (removed in conftest), never
+# into ./static/user_maps: that's a developer's real store, and the map tests
+# clear it.
+os.environ["MAP_FILES_DIR"] = tempfile.mkdtemp(prefix="golfmapper-maps-")
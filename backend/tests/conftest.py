@@ -1,9 +1,14 @@
+import shutil
+import time
 from datetime import datetime
 
 import bcrypt
 import pytest
 from sqlalchemy import text
 
+from app import user_maps
+from app.cache import clear_caches
+from app.config import settings
 from app.limiter import limiter
 from app.models import Courses, UserCourses, Users
 
@@ -20,6 +25,33 @@ def _reset_rate_limiter():
     yield
 
 
+@pytest.fixture(autouse=True)
+def _reset_caches():
+    # Fixtures write straight to the DB, bypassing the write paths that bump
+    # data versions, so a cache entry from an earlier test could otherwise
+    # still look current against different rows.
+    clear_caches()
+    yield
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _map_files_dir():
+    yield
+    shutil.rmtree(settings.MAP_FILES_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def _finish_prerenders():
+    # Course writes queue background map prerenders (user_maps.refresher);
+    # let them land before the next test clears the store they write to.
+    yield
+    for _ in range(100):
+        if not user_maps.refresher.pending():
+            return
+        time.sleep(0.05)
+    raise AssertionError("background map prerender didn't finish")
+
+
 @pytest.fixture
 def test_user_courses():
     garmin_course = Courses(
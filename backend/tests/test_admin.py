@@ -2,6 +2,7 @@ import pytest
 from fastapi import status
 from sqlalchemy import text
 
+from app.cache import versions
 from app.dependencies import get_current_user, get_db
 from app.models import Users
 
@@ -37,6 +38,30 @@ def test_admin_delete_course(test_user_courses):
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
 
+@pytest.mark.parametrize(
+    ("method", "url", "body"),
+    [
+        ("delete", "/api/v1/admin/courses/200", None),
+        ("put", "/api/v1/admin/courses/200/location", {"latitude": 31.0, "longitude": -88.0}),
+        ("put", "/api/v1/admin/courses/200/info", {"club_name": "Renamed"}),
+    ],
+)
+def test_admin_course_change_invalidates_players_data(test_user_courses, method, url, body):
+    before = versions.user(1), versions.user_year(1, 2021), versions.user_year(1, 2020)
+    response = client.request(method, url, json=body)
+    assert response.status_code in (status.HTTP_200_OK, status.HTTP_204_NO_CONTENT)
+    assert versions.user(1) > before[0]
+    assert versions.user_year(1, 2021) != before[1]
+    # Years the user didn't play the course in stay cached.
+    assert versions.user_year(1, 2020) == before[2]
+
+
+def test_admin_course_change_leaves_other_users_alone(test_user_courses):
+    before = versions.user(2)
+    client.put("/api/v1/admin/courses/200/location", json={"latitude": 31.0, "longitude": -88.0})
+    assert versions.user(2) == before
+
+
 def test_admin_delete_course_not_found():
     response = client.delete("/api/v1/admin/courses/99999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -149,3 +174,17 @@ def test_admin_cannot_demote_self():
     response = client.patch("/api/v1/admin/users/1/role", json={"role": "user"})
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.json() == {"detail": "You cannot remove your own admin role"}
+
+
+def test_admin_create_course_fills_missing_location():
+    response = client.post(
+        "/api/v1/admin/courses",
+        json={"course_name": "Pinned Only", "latitude": 30.740501, "longitude": -88.20578},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    data = response.json()
+    assert data["country"] == "USA"
+    assert data["state"] == "AL"
+    with engine.connect() as con:
+        con.execute(text("DELETE FROM courses;"))
+        con.commit()
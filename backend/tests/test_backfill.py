@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from sqlalchemy import text
+
+from app.backfill import read_checkpoint, run_backfill
+from app.geocoder import GeoResult
+from app.models import Courses
+
+from .utils import TestingSessionLocal, engine
+
+
+class FakeGeocoder:
+    def __init__(self):
+        self.calls = 0
+
+    def reverse(self, latitude, longitude):
+        self.calls += 1
+        return GeoResult(country="USA", country_name="United States of America", state="AL", city="Mobile")
+
+
+@pytest.fixture
+def sparse_courses():
+    db = TestingSessionLocal()
+    db.add_all(
+        [
+            Courses(id=401, course_name="No Location", latitude=30.7, longitude=-88.2),
+            Courses(id=402, course_name="Has State", state="Alabama", city="", latitude=30.7, longitude=-88.2),
+            Courses(id=403, course_name="Complete", city="X", state="Y", country="Z", latitude=30.7, longitude=-88.2),
+            Courses(id=404, course_name="No Pin", latitude=None, longitude=None),
+        ]
+    )
+    db.commit()
+    yield
+    with engine.connect() as con:
+        con.execute(text("DELETE FROM courses;"))
+        con.commit()
+
+
+def test_backfill_fills_only_blank_fields(sparse_courses, tmp_path):
+    totals = run_backfill(TestingSessionLocal, FakeGeocoder(), checkpoint=tmp_path / "cp.json", chunk_size=1)
+    assert totals == {"scanned": 2, "updated": 2}
+    db = TestingSessionLocal()
+    first, second, complete = (db.get(Courses, i) for i in (401, 402, 403))
+    assert (first.city, first.state, first.country) == ("Mobile", "AL", "USA")
+    assert (second.city, second.state, second.country) == ("Mobile", "Alabama", "USA")
+    assert (complete.city, complete.state, complete.country) == ("X", "Y", "Z")
+    assert read_checkpoint(tmp_path / "cp.json") == 402
+
+
+def test_backfill_resumes_after_checkpoint(sparse_courses, tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    checkpoint.write_text('{"last_id": 401}')
+    geocoder = FakeGeocoder()
+    run_backfill(TestingSessionLocal, geocoder, checkpoint=checkpoint)
+    assert geocoder.calls == 1
+    assert TestingSessionLocal().get(Courses, 401).country is None
+
+
+def test_backfill_dry_run_prints_diff_and_writes_nothing(sparse_courses, tmp_path):
+    out = io.StringIO()
+    totals = run_backfill(TestingSessionLocal, FakeGeocoder(), checkpoint=tmp_path / "cp.json", dry_run=True, out=out)
+    assert totals["updated"] == 2
+    assert "course 401: city: None -> 'Mobile'" in out.getvalue()
+    assert TestingSessionLocal().get(Courses, 401).country is None
+    assert not (tmp_path / "cp.json").exists()
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.cache import BackgroundRefresh, SingleFlight, StaleWhileRevalidate
+
+
+def test_single_flight_collapses_concurrent_calls():
+    release = threading.Event()
+    calls = []
+
+    def build():
+        calls.append(1)
+        release.wait(5)
+        return "built"
+
+    flight = SingleFlight()
+    futures = [flight.submit("key", build) for _ in range(5)]
+    release.set()
+    assert [f.result(5) for f in futures] == ["built"] * 5
+    assert len(calls) == 1
+    # Once finished the key is free again.
+    assert flight.submit("key", build).result(5) == "built"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate_serves_old_value_during_rebuild():
+    release = threading.Event()
+    builds = []
+    version = [1]
+
+    def build():
+        builds.append(1)
+        if len(builds) > 1:
+            release.wait(5)
+        return len(builds)
+
+    cache = StaleWhileRevalidate(build, lambda: version[0])
+    assert await cache.get() == (1, 1)
+    assert await cache.get() == (1, 1)
+
+    # The version moved on: the stale value comes back without waiting, and
+    # only one rebuild starts however many requests see it.
+    version[0] = 2
+    assert await cache.get() == (1, 1)
+    assert await cache.get() == (1, 1)
+    release.set()
+    for _ in range(50):
+        if (await cache.get())[0] == 2:
+            break
+        await asyncio.sleep(0.05)
+    assert await cache.get() == (2, 2)
+    assert len(builds) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate_runs_one_build_and_catches_up():
+    started, release = threading.Event(), threading.Event()
+    version = [1]
+    running, overlapped, built_at = [0], [False], []
+
+    def build():
+        running[0] += 1
+        overlapped[0] |= running[0] > 1
+        built_at.append(version[0])
+        if len(built_at) == 2:
+            started.set()
+            release.wait(5)
+        running[0] -= 1
+        return version[0]
+
+    cache = StaleWhileRevalidate(build, lambda: version[0])
+    assert await cache.get() == (1, 1)
+    version[0] = 2
+    assert await cache.get() == (1, 1)
+    assert started.wait(5)
+    # Writes during the rebuild join it rather than starting builds of their own...
+    for v in (3, 4, 5):
+        version[0] = v
+        assert await cache.get() == (1, 1)
+    release.set()
+    for _ in range(100):
+        if (await cache.get())[0] == 5:
+            break
+        await asyncio.sleep(0.02)
+    # ...and it goes round once more for them once it's done.
+    assert await cache.get() == (5, 5)
+    assert built_at == [1, 2, 5]
+    assert not overlapped[0]
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate_does_not_store_after_clear():
+    started, release = threading.Event(), threading.Event()
+
+    def build():
+        started.set()
+        release.wait(5)
+        return "old"
+
+    cache = StaleWhileRevalidate(build, lambda: 1)
+    future = asyncio.ensure_future(cache.get())
+    assert await asyncio.to_thread(started.wait, 5)
+    cache.clear()
+    release.set()
+    await future
+    assert cache._entry is None
+
+
+def test_background_refresh_runs_once_more_for_changes_during_a_run():
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def refresh(key):
+        runs.append(key)
+        started.set()
+        release.wait(5)
+
+    refresher = BackgroundRefresh(refresh, workers=2, name="test-refresh")
+    refresher.request("a")
+    assert started.wait(5)
+    # Arrives mid-run: one more run, however many ask.
+    for _ in range(5):
+        refresher.request("a")
+    release.set()
+    for _ in range(100):
+        if not refresher.pending():
+            break
+        time.sleep(0.01)
+    assert runs == ["a", "a"]
+    assert refresher.pending() == 0
@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.clustering import MAX_CLUSTER_ZOOM, ClusterIndex
+
+
+def _points(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(25, 49, n), rng.uniform(-124, -67, n)
+
+
+def test_every_zoom_accounts_for_every_point():
+    lat, lon = _points()
+    index = ClusterIndex(lat, lon)
+    sizes = []
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        _, _, counts, first = index.clusters(zoom)
+        assert counts.sum() == len(lat)
+        assert (first >= 0).all() and (first < len(lat)).all()
+        sizes.append(len(counts))
+    # Zooming in only ever splits clusters.
+    assert sizes == sorted(sizes)
+    assert sizes[0] < 10 and sizes[-1] == len(lat)
+
+
+def test_deepest_zoom_is_the_points_themselves():
+    lat, lon = _points(100)
+    c_lat, c_lon, counts, first = ClusterIndex(lat, lon).clusters(MAX_CLUSTER_ZOOM + 3)
+    assert (counts == 1).all()
+    np.testing.assert_allclose(c_lat, lat[first], atol=1e-9)
+    np.testing.assert_allclose(c_lon, lon[first], atol=1e-9)
+
+
+def test_coincident_points_stay_one_cluster():
+    _, _, counts, first = ClusterIndex([40.0, 40.0, 10.0], [-90.0, -90.0, 10.0]).clusters(MAX_CLUSTER_ZOOM)
+    assert sorted(counts.tolist()) == [1, 2]
+    assert first[counts == 2].tolist() == [0]
+
+
+def test_bbox_keeps_clusters_centred_inside():
+    lat, lon = _points()
+    index = ClusterIndex(lat, lon)
+    bbox = (30.0, -100.0, 35.0, -90.0)
+    c_lat, c_lon, counts, _ = index.clusters(12, bbox)
+    assert len(counts) and (c_lat >= 30).all() and (c_lat <= 35).all()
+    assert (c_lon >= -100).all() and (c_lon <= -90).all()
+    inside = (lat >= 30) & (lat <= 35) & (lon >= -100) & (lon <= -90)
+    # Cells are ~600m at zoom 12, so only points at the very edge can land elsewhere.
+    assert abs(counts.sum() - inside.sum()) <= 5
+
+
+def test_bbox_across_the_antimeridian():
+    index = ClusterIndex([-17.7, -17.7, 10.0], [178.0, -178.0, 0.0])
+    _, c_lon, counts, _ = index.clusters(8, (-20.0, 170.0, -10.0, -170.0))
+    assert counts.sum() == 2
+    assert sorted(np.round(c_lon).tolist()) == [-178.0, 178.0]
+
+
+def test_empty_index():
+    _, _, counts, _ = ClusterIndex([], []).clusters(3, (0.0, 0.0, 1.0, 1.0))
+    assert len(counts) == 0
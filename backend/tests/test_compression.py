@@ -0,0 +1,47 @@
+import gzip
+
+import brotli
+import pytest
+
+from app.compression import Precompressed, negotiate, variant_etag
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.1, gzip", "gzip"),
+        ("GZIP;Q=0.8", "gzip"),
+        ("gzip;q=oops, br", "br"),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    assert negotiate(accept_encoding, ("gzip", "br")) == expected
+
+
+def test_negotiate_only_picks_available_encodings():
+    assert negotiate("br", ("gzip",)) is None
+    assert negotiate("br, gzip;q=0.5", ("gzip",)) == "gzip"
+
+
+def test_variant_etags_are_distinct():
+    assert variant_etag('"abc"', None) == '"abc"'
+    assert variant_etag('"abc"', "gzip") == '"abc-gzip"'
+
+
+def test_precompressed_round_trips():
+    body = Precompressed.of("<p>" * 1000)
+    assert gzip.decompress(body.variants["gzip"]) == body.content
+    assert len(body.variants["gzip"]) < len(body.content) // 10
+    assert brotli.decompress(body.variants["br"]) == body.content
+
+    content, etag, encoding = body.select("gzip")
+    assert (content, etag, encoding) == (body.variants["gzip"], variant_etag(body.etag, "gzip"), "gzip")
+    assert body.select(None) == (body.content, body.etag, None)
@@ -3,6 +3,7 @@ import pytest
 from fastapi import status
 from sqlalchemy import text
 
+from app.cache import versions
 from app.dependencies import get_current_user, get_db
 from app.models import Courses, UserCourses, Users
 
@@ -275,6 +276,20 @@ def test_admin_approve_location_change_updates_course(admin_user, existing_cours
     db.close()
 
 
+def test_admin_approve_location_change_invalidates_players(admin_user, existing_course):
+    db = TestingSessionLocal()
+    db.add(UserCourses(course_id=300, user_id=1, year=2022))
+    db.commit()
+    db.close()
+    req_id = client.post(
+        "/api/v1/course-requests/location-change", json={"course_id": 300, "latitude": 31.5, "longitude": -96.5}
+    ).json()["id"]
+    before = versions.user_year(1, 2022)
+
+    assert client.post(f"/api/v1/course-requests/admin/{req_id}/approve").status_code == status.HTTP_200_OK
+    assert versions.user_year(1, 2022) != before
+
+
 def test_admin_approve_already_actioned_returns_409(admin_user, existing_course):
     submit = client.post(
         "/api/v1/course-requests/location-change",
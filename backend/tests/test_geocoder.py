@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.geocoder import GeoResult, fill_missing_location, get_geocoder
+
+
+@pytest.mark.parametrize(
+    ("lat", "lon", "country", "state"),
+    [
+        (30.740501, -88.20578, "USA", "AL"),  # Magnolia Grove, Mobile
+        (36.5686, -121.9496, "USA", "CA"),  # Pebble Beach — on the coast
+        (21.3, -157.8, "USA", "HI"),
+        (56.3433, -2.8027, "GBR", None),  # St Andrews — no admin-1 data bundled
+    ],
+)
+def test_reverse_resolves_country_and_state(lat, lon, country, state):
+    match = get_geocoder().reverse(lat, lon)
+    assert match is not None
+    assert match.country == country
+    assert match.state == state
+
+
+def test_reverse_open_ocean_returns_none():
+    assert get_geocoder().reverse(0.0, -30.0) is None
+
+
+def test_aliases_cover_every_code_and_name():
+    geocoder = get_geocoder()
+    assert {"usa", "us", "united states of america"} <= geocoder.aliases("US")
+    assert geocoder.aliases("Alabama") == {"al", "alabama"}
+    # A code two places share covers both: "AL" is Albania's alpha-2 too.
+    assert geocoder.aliases("al") == {"al", "alabama", "alb", "albania"}
+    assert geocoder.aliases("Scotland") == {"scotland"}
+
+
+def test_fill_missing_location_never_overwrites():
+    course = SimpleNamespace(latitude=30.74, longitude=-88.2, state="Alabama", country=None)
+    fill_missing_location(course)
+    assert course.country == "USA"
+    assert course.state == "Alabama"
+
+
+def test_fill_missing_location_swallows_geocoder_errors():
+    class Broken:
+        def reverse(self, latitude, longitude) -> GeoResult | None:
+            raise RuntimeError("boom")
+
+    course = SimpleNamespace(latitude=30.74, longitude=-88.2, state=None, country=None)
+    fill_missing_location(course, geocoder=Broken())
+    assert course.country is None
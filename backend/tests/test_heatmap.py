@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from fastapi import status
+
+from app.dependencies import get_current_user, get_db
+from app.heatmap import GRID, MAX_HEAT_ZOOM, DensityGrid
+
+from .utils import app, client, override_get_current_user, override_get_db
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def plays():
+    rng = np.random.default_rng(7)
+    n = 500
+    return np.arange(n), rng.uniform(-70, 70, n), rng.uniform(-180, 180, n), rng.integers(1, 6, n)
+
+
+def _cells(grid: DensityGrid, z: int) -> dict:
+    return {tile: grid.tile(z, *tile)[0] for tile in grid._levels[z]}
+
+
+def test_every_level_counts_every_play(plays):
+    grid = DensityGrid.from_plays(*plays)
+    for z in range(MAX_HEAT_ZOOM + 1):
+        assert sum(sum(cells[1::2]) for cells in _cells(grid, z).values()) == plays[3].sum()
+        assert all(0 <= index < GRID * GRID for cells in _cells(grid, z).values() for index in cells[::2])
+
+
+def test_incremental_updates_match_a_rebuild(plays):
+    course_ids, lat, lon, counts = plays
+    grid = DensityGrid()
+    for args in zip(course_ids.tolist(), lat.tolist(), lon.tolist(), counts.tolist(), strict=True):
+        grid.set_course(*args)
+    assert grid._levels == DensityGrid.from_plays(*plays)._levels
+
+    # Move half the courses, drop a quarter, and bump the rest.
+    lat, lon, counts = lat.copy(), lon.copy(), counts.copy()
+    lat[::2], lon[::2] = -lat[::2], lon[::2] / 2
+    counts[1::4] = 0
+    counts[3::4] += 1
+    for args in zip(course_ids.tolist(), lat.tolist(), lon.tolist(), counts.tolist(), strict=True):
+        grid.set_course(*args)
+    kept = counts > 0
+    rebuilt = DensityGrid.from_plays(course_ids[kept], lat[kept], lon[kept], counts[kept])
+    assert grid._levels == rebuilt._levels
+    assert grid.tile(0, 0, 0)[1] == rebuilt.tile(0, 0, 0)[1]
+
+
+def _heat(z: int, x: int, y: int) -> dict:
+    response = client.get(f"/api/v1/map/heatmap/{z}/{x}/{y}")
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_heatmap_follows_writes(test_user, test_user_courses):
+    tile = _heat(0, 0, 0)
+    assert (tile["size"], tile["peak"], tile["cells"][1::2]) == (GRID, 1, [1])
+    # Mobile, AL is in the south-west quarter at zoom 1.
+    assert _heat(1, 0, 0)["cells"][1::2] == [1]
+    assert _heat(1, 1, 1)["cells"] == []
+
+    moved = client.put("/api/v1/admin/courses/200/location", json={"latitude": -33.9, "longitude": 151.2})
+    assert moved.status_code == status.HTTP_200_OK
+    assert _heat(1, 0, 0)["cells"] == []
+    assert _heat(1, 1, 1)["cells"][1::2] == [1]
+
+    assert client.delete("/api/v1/user_courses/delete/200").status_code == status.HTTP_204_NO_CONTENT
+    assert _heat(0, 0, 0) == {"z": 0, "x": 0, "y": 0, "size": GRID, "peak": 0, "cells": []}
+
+    assert client.get("/api/v1/map/heatmap/1/2/0").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(f"/api/v1/map/heatmap/{MAX_HEAT_ZOOM + 1}/0/0").status_code == 422
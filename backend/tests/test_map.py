@@ -1,22 +1,37 @@
+import asyncio
+import json
+import re
+import threading
+import time
+
 import pytest
-from sqlalchemy import text
+from fastapi import status
+from sqlalchemy import event, text
 
+from app import geojson, map_assets, map_render
+from app.cache import versions
+from app.config import settings
+from app.dependencies import get_current_user, get_db
 from app.models import Courses, UserCourses, Users
-from app.routers.map import generate_all_users_map, generate_user_map
+from app.routers.map import EMBEDDED_CLUSTER_ZOOM, generate_all_users_map, generate_user_map
+from app.user_maps import refresher, store, stored_page
+
+from .utils import TestingSessionLocal, app, client, engine, override_get_current_user, override_get_db
 
-from .utils import TestingSessionLocal, engine
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
 
 XSS_NAME = '<script>alert("xss")</script>'
 XSS_USERNAME = "<img src=x onerror=alert(1)>"
 
 # frontend/src/utils/cspNonce.js only CSP-nonces the first N "<script" tags
-# in the map HTML it receives, on the assumption that folium's own
-# boilerplate (CDN links + init script) always renders exactly N tags,
+# in the map HTML it receives, on the assumption that app/map_render.py's
+# template (Leaflet + init script) always renders exactly N tags,
 # independent of marker/layer count — so anything smuggled in beyond that
-# via a future escaping bug is left un-nonced and CSP blocks it. If folium
-# ever changes what it emits, this must be updated in lockstep with the
-# frontend constant, not just bumped to make the test pass.
-TRUSTED_MAP_SCRIPT_COUNT = 6
+# via a future escaping bug is left un-nonced and CSP blocks it. If the
+# template ever changes what it emits, this must be updated in lockstep with
+# the frontend constant, not just bumped to make the test pass.
+TRUSTED_MAP_SCRIPT_COUNT = 2
 
 
 @pytest.fixture
@@ -57,7 +72,7 @@ def test_all_users_map_escapes_user_content(xss_user_course):
     # Raw payloads must not survive into the rendered map document.
     assert XSS_NAME not in html_out
     assert XSS_USERNAME not in html_out
-    # Layer names are JSON-embedded by folium ("<" becomes backslash-u003c)
+    # Layer names are JSON-embedded in the init script ("<" becomes backslash-u003c)
     # but Leaflet innerHTML's the decoded string, so the payload must be
     # HTML-escaped, not merely JSON-escaped.
     assert "\\u003cimg" not in html_out
@@ -66,16 +81,19 @@ def test_all_users_map_escapes_user_content(xss_user_course):
     assert "\\u0026lt;img" in html_out or "&lt;img" in html_out
 
 
+@pytest.fixture
+def user_map_store():
+    store.clear()
+    yield store
+    store.clear()
+
+
 @pytest.mark.asyncio
-async def test_user_map_escapes_course_names(xss_user_course):
+async def test_user_map_escapes_course_names(xss_user_course, user_map_store):
     user = {"id": 1, "username": "safe_name"}
-    map_path = await generate_user_map(user, TestingSessionLocal())
-    try:
-        html_out = map_path.read_text(encoding="utf-8")
-        assert XSS_NAME not in html_out
-        assert "&lt;script&gt;" in html_out
-    finally:
-        map_path.unlink(missing_ok=True)
+    html_out = stored_page(1, await generate_user_map(user, TestingSessionLocal())).path.read_text(encoding="utf-8")
+    assert XSS_NAME not in html_out
+    assert "&lt;script&gt;" in html_out
 
 
 def test_all_users_map_script_tag_count_matches_frontend_trust_boundary(xss_user_course):
@@ -84,11 +102,497 @@ def test_all_users_map_script_tag_count_matches_frontend_trust_boundary(xss_user
 
 
 @pytest.mark.asyncio
-async def test_user_map_script_tag_count_matches_frontend_trust_boundary(xss_user_course):
+async def test_user_map_script_tag_count_matches_frontend_trust_boundary(xss_user_course, user_map_store):
     user = {"id": 1, "username": "safe_name"}
-    map_path = await generate_user_map(user, TestingSessionLocal())
+    html_out = stored_page(1, await generate_user_map(user, TestingSessionLocal())).path.read_text(encoding="utf-8")
+    assert html_out.count("<script") == TRUSTED_MAP_SCRIPT_COUNT
+
+
+def test_allmap_is_cached_until_data_changes(xss_user_course, monkeypatch):
+    from app.routers import map as map_router
+
+    renders = []
+    real_render = map_router.generate_all_users_map
+
+    def counting_render(db):
+        renders.append(1)
+        return real_render(db)
+
+    monkeypatch.setattr(map_router, "generate_all_users_map", counting_render)
+
+    first = client.get("/api/v1/map/allmap")
+    assert first.status_code == status.HTTP_200_OK
+    etag = first.headers["etag"]
+    assert client.get("/api/v1/map/allmap").text == first.text
+    assert len(renders) == 1
+
+    revalidated = client.get("/api/v1/map/allmap", headers={"If-None-Match": etag})
+    assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+    assert len(renders) == 1
+
+    versions.bump_catalog()
+    # The first request after a write still gets the previous render while
+    # the rebuild runs in the background.
+    assert client.get("/api/v1/map/allmap").headers["etag"] == etag
+    for _ in range(100):
+        built_at, _ = asyncio.run(map_router._all_users_map.get())
+        if built_at == versions.data():
+            break
+        time.sleep(0.05)
+    assert len(renders) == 2
+    # Same rows, so the rebuilt page hashes to the same ETag.
+    assert client.get("/api/v1/map/allmap", headers={"If-None-Match": etag}).status_code == 304
+    assert len(renders) == 2
+
+
+@pytest.fixture
+def second_user_course(xss_user_course):
+    db = TestingSessionLocal()
+    db.add(
+        Users(
+            id=2,
+            email="second@mail.com",
+            username="second",
+            first_name="s",
+            last_name="u",
+            hashed_password="not-used",
+            is_active=True,
+            role="user",
+        )
+    )
+    db.add(Courses(id=301, club_name="Far Away Links", country="Scotland", latitude=56.3, longitude=-2.8))
+    db.add(UserCourses(id=2, course_id=301, user_id=2, year=2019))
+    db.commit()
+    db.close()
+
+
+def test_allmap_filters(second_user_course, monkeypatch):
+    from app.routers import map as map_router
+
+    rendered = []
+    real_layers = map_router._all_users_layers
+
+    def counting_layers(db, *args):
+        layers = real_layers(db, *args)
+        rendered.append(sorted(username for username, _ in layers))
+        return layers
+
+    monkeypatch.setattr(map_router, "_all_users_layers", counting_layers)
+
+    def allmap(query):
+        response = client.get(f"/api/v1/map/allmap?{query}")
+        assert response.status_code == status.HTTP_200_OK
+        return response
+
+    assert "Far Away Links" in allmap("").text
+    assert rendered.pop() == [XSS_USERNAME, "second"]
+    only_second = allmap("user_id=2")
+    assert "Far Away Links" in only_second.text and "&lt;script&gt;" not in only_second.text
+    assert rendered.pop() == ["second"]
+    allmap("year_to=2020")
+    assert rendered.pop() == ["second"]
+    allmap("bbox=-89,30,-88,31")
+    assert rendered.pop() == [XSS_USERNAME]
+    allmap("region=scotland&user_id=1")
+    assert rendered.pop() == []
+
+    # The same filters in another order (or with repeats) are the same view.
+    both = allmap("user_id=2&user_id=1")
+    assert allmap("user_id=1&user_id=2&user_id=2").headers["etag"] == both.headers["etag"]
+    assert len(rendered) == 1
+    allmap("user_id=2")
+    assert len(rendered) == 1
+    versions.bump_user(2)
+    allmap("user_id=2")
+    assert len(rendered) == 2
+
+    assert client.get("/api/v1/map/allmap?user_id=x").status_code == 422
+    too_many = "&".join(f"user_id={i}" for i in range(100))
+    assert client.get(f"/api/v1/map/allmap?{too_many}").status_code == 422
+
+
+def test_allmap_filters_use_indexes(second_user_course):
+    from app.map_filters import AllUsersFilters
+    from app.routers.map import _all_users_layers
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
     try:
-        html_out = map_path.read_text(encoding="utf-8")
-        assert html_out.count("<script") == TRUSTED_MAP_SCRIPT_COUNT
+        _all_users_layers(TestingSessionLocal(), AllUsersFilters(user_ids=(2,), year_from=2019))
     finally:
-        map_path.unlink(missing_ok=True)
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    with engine.connect() as con:
+        plan = " ".join(str(row) for row in con.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "ix_user_courses_user_year" in plan
+
+
+@pytest.mark.asyncio
+async def test_concurrent_user_map_requests_share_one_render(xss_user_course, user_map_store, monkeypatch):
+    from app.routers import map as map_router
+
+    renders = []
+    real_render = map_router.render_pool.render
+
+    def slow_render(kind, fn, *args):
+        renders.append(kind)
+        time.sleep(0.2)
+        return real_render(kind, fn, *args)
+
+    monkeypatch.setattr(map_router.render_pool, "render", slow_render)
+    user = {"id": 1, "username": "safe_name"}
+    results = await asyncio.gather(*(generate_user_map(user, TestingSessionLocal()) for _ in range(4)))
+    assert len(renders) == 1
+    assert len(set(results)) == 1
+    assert user_map_store.group("user/1") == [f"user/1/{results[0]}"]
+    # No temp files left next to the map.
+    assert not list(user_map_store.root.rglob("*.tmp"))
+
+
+def test_usermap_redirects_to_immutable_page(xss_user_course, user_map_store, monkeypatch):
+    from app.routers import map as map_router
+
+    renders = []
+    real_render = map_router.render_pool.render
+
+    def counting_render(kind, fn, *args):
+        renders.append(kind)
+        return real_render(kind, fn, *args)
+
+    monkeypatch.setattr(map_router.render_pool, "render", counting_render)
+
+    redirect = client.get("/api/v1/map/usermap", follow_redirects=False)
+    assert redirect.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert redirect.headers["cache-control"] == "no-cache"
+    location = redirect.headers["location"]
+    assert re.fullmatch(r"/api/v1/map/usermap/[0-9a-f]{32}", location)
+
+    page = client.get(location)
+    assert page.status_code == status.HTTP_200_OK
+    assert "immutable" in page.headers["cache-control"]
+    assert "&lt;script&gt;" in page.text
+
+    # A write that doesn't change what's drawn re-hashes to the same page,
+    # which is already on disk.
+    versions.bump_user(1)
+    assert client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"] == location
+    _wait_for_refreshes()
+    assert client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"] == location
+    assert renders.count("user") == 1
+
+    db = TestingSessionLocal()
+    db.add(Courses(id=301, club_name="Second Club", latitude=31.0, longitude=-87.0))
+    db.add(UserCourses(id=2, course_id=301, user_id=1, year=2024))
+    db.commit()
+    db.close()
+    versions.bump_user(1)
+    # The last good page until the background render lands.
+    assert client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"] == location
+    _wait_for_refreshes()
+    moved = client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"]
+    assert moved != location
+    assert client.get(moved).status_code == status.HTTP_200_OK
+    # Superseded pages are dropped from disk.
+    assert client.get(location).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip", "gzip, br"])
+def test_maps_are_served_precompressed(xss_user_course, user_map_store, monkeypatch, accept_encoding):
+    from app import compression
+
+    calls = []
+    real_compress = compression.compress
+    monkeypatch.setattr(compression, "compress", lambda content: calls.append(1) or real_compress(content))
+    expected = compression.negotiate(accept_encoding, real_compress("").keys())
+    headers = {"Accept-Encoding": accept_encoding}
+
+    location = client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"]
+    identity = client.get(location, headers={"Accept-Encoding": "identity"})
+    for url in (location, "/api/v1/map/allmap", "/api/v1/map/data/user"):
+        response = client.get(url, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.headers.get("content-encoding") == expected
+    assert client.get(location, headers=headers).text == identity.text
+
+    # Compressed when each artifact was built, not per response.
+    built = len(calls)
+    for url in (location, "/api/v1/map/allmap", "/api/v1/map/data/user"):
+        client.get(url, headers=headers)
+    assert len(calls) == built
+
+    # Each encoding is a separate representation with its own validator.
+    allmap = client.get("/api/v1/map/allmap", headers=headers)
+    other = "identity" if expected else "gzip"
+    assert (
+        client.get("/api/v1/map/allmap", headers={"Accept-Encoding": other}).headers["etag"] != allmap.headers["etag"]
+    )
+    revalidated = client.get("/api/v1/map/allmap", headers={**headers, "If-None-Match": allmap.headers["etag"]})
+    assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+    assert "Accept-Encoding" in revalidated.headers["vary"]
+
+
+def test_course_write_prerenders_user_map(xss_user_course, user_map_store):
+    first = client.get("/api/v1/map/data/user")
+    db = TestingSessionLocal()
+    db.add(Courses(id=301, club_name="Second Club", latitude=31.0, longitude=-87.0))
+    db.commit()
+    db.close()
+
+    response = client.post("/api/v1/user_courses/add_course", json={"garmin_id": 301, "year": 2024})
+    assert response.status_code == status.HTTP_201_CREATED
+    _wait_for_refreshes()
+    # Both artifacts were rebuilt off the request path: the data document is
+    # current on the first read, and so is the page.
+    (layer,) = client.get("/api/v1/map/data/user").json()["layers"]
+    assert len(layer["points"]) == 4
+    assert first.headers["etag"] != client.get("/api/v1/map/data/user").headers["etag"]
+    (key,) = user_map_store.group("user/1")
+    page = user_map_store.path(key)
+    assert "Second Club" in page.read_text(encoding="utf-8")
+
+
+def test_user_map_filters(xss_user_course, user_map_store, monkeypatch):
+    from app.routers import map as map_router
+
+    renders = []
+    real_render = map_router.render_pool.render
+
+    def counting_render(kind, fn, *args):
+        renders.append(kind)
+        return real_render(kind, fn, *args)
+
+    monkeypatch.setattr(map_router.render_pool, "render", counting_render)
+    db = TestingSessionLocal()
+    db.add(
+        Courses(
+            id=301, club_name="St Andrews", state="Scotland", country="United Kingdom", latitude=56.3, longitude=-2.8
+        )
+    )
+    db.add(UserCourses(id=2, course_id=301, user_id=1, year=2023))
+    db.commit()
+    db.close()
+
+    def labels(query):
+        response = client.get(f"/api/v1/map/data/user?{query}")
+        assert response.status_code == status.HTTP_200_OK
+        return [label.rsplit(" ", 1)[1] for layer in response.json()["layers"] for label in layer["labels"]]
+
+    assert sorted(labels("")) == ["300", "301"]
+    assert labels("year_from=2024") == ["300"]
+    assert labels("year_from=2023&year_to=2023") == ["301"]
+    assert labels("region=%20SCOTLAND") == ["301"]
+    assert labels("region=united%20kingdom&year_to=2023") == ["301"]
+    # Codes and names are interchangeable, whichever form the course stores.
+    assert labels("region=Alabama") == ["300"]
+    assert labels("region=united%20states%20of%20america") == ["300"]
+    assert labels("region=GBR") == ["301"]
+    assert labels("bbox=-89,30,-88,31") == ["300"]
+    assert labels("bbox=-10,50,0,60&year_from=2024") == []
+
+    # Each combination is cached: switching back and forth doesn't render.
+    rendered = len(renders)
+    for query in ("year_from=2024", "year_from=2023&year_to=2023", "region=scotland", "year_from=2024"):
+        labels(query)
+    assert len(renders) == rendered
+    versions.bump_user(1)
+    assert labels("year_from=2024") == ["300"]
+    assert len(renders) == rendered + 1
+
+    # Filtered pages live beside the unfiltered one rather than replacing it.
+    everything = client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"]
+    recent = client.get("/api/v1/map/usermap?year_from=2024", follow_redirects=False).headers["location"]
+    assert recent != everything
+    assert client.get(everything).status_code == status.HTTP_200_OK
+    assert "St Andrews" not in client.get(recent).text
+
+    assert client.get("/api/v1/map/usermap?year_from=2024&year_to=2023").status_code == 422
+    assert client.get("/api/v1/map/data/user?bbox=1,2").status_code == 422
+
+
+def test_filtered_view_drawing_the_same_markers_keeps_its_own_page(xss_user_course, user_map_store):
+    # Every course matches year_from=1900, so both views draw the same markers;
+    # render the filtered one first.
+    filtered = client.get("/api/v1/map/usermap?year_from=1900", follow_redirects=False).headers["location"]
+    everything = client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"]
+    assert filtered != everything
+    assert store.group("user/1") == [f"user/1/{everything.rsplit('/', 1)[1]}"]
+
+    # Re-rendering the filtered view replaces only its own page...
+    versions.bump_user(1)
+    refreshed = client.get("/api/v1/map/usermap?year_from=1900", follow_redirects=False).headers["location"]
+    assert client.get(everything).status_code == status.HTTP_200_OK
+    assert client.get(refreshed).status_code == status.HTTP_200_OK
+    # ...and the unfiltered one is still there to serve stale during its rebuild.
+    assert client.get("/api/v1/map/usermap", follow_redirects=False).headers["location"] == everything
+
+
+def test_user_map_data_is_served_stale_during_rebuild(xss_user_course, user_map_store, monkeypatch):
+    from app.routers import map as map_router
+
+    first = client.get("/api/v1/map/data/user")
+    release = threading.Event()
+    real_render = map_router.render_pool.render
+
+    def blocked_render(kind, fn, *args):
+        release.wait(5)
+        return real_render(kind, fn, *args)
+
+    monkeypatch.setattr(map_router.render_pool, "render", blocked_render)
+    versions.bump_user(1)
+    try:
+        assert client.get("/api/v1/map/data/user").headers["etag"] == first.headers["etag"]
+        assert refresher.pending() == 1
+    finally:
+        release.set()
+        _wait_for_refreshes()
+
+
+def _wait_for_refreshes():
+    for _ in range(100):
+        if not refresher.pending():
+            return
+        time.sleep(0.05)
+    raise AssertionError("background map refresh didn't finish")
+
+
+def test_user_map_page_rejects_bad_digests():
+    assert client.get("/api/v1/map/usermap/../../etc").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/usermap/" + "0" * 32).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/usermap/not-a-digest").status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_map_shell_is_static_and_cacheable():
+    response = client.get("/api/v1/map/shell")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.text.count("<script") == TRUSTED_MAP_SCRIPT_COUNT
+    assert "public" in response.headers["cache-control"]
+    again = client.get("/api/v1/map/shell", headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_map_assets_are_self_hosted():
+    shell = client.get("/api/v1/map/shell").text
+    assert "https://cdn" not in shell
+    for name, media_type in (("leaflet.js", "text/javascript"), ("leaflet.css", "text/css")):
+        url = map_assets.url(name)
+        assert url in shell
+        response = client.get(url, headers={"Accept-Encoding": "br"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith(media_type)
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.content == (map_assets.ASSET_DIR / name).read_bytes()
+    assert client.get("/api/v1/map/assets/leaflet.js").status_code == status.HTTP_404_NOT_FOUND
+    assert "cdn.jsdelivr.net" not in client.get("/healthy").headers["content-security-policy"]
+
+
+def test_user_map_data_escapes_and_caches(xss_user_course):
+    response = client.get("/api/v1/map/data/user")
+    assert response.status_code == status.HTTP_200_OK
+    (layer,) = response.json()["layers"]
+    assert layer["points"] == [30.740501, -88.20578]
+    assert layer["labels"] == ["&lt;script&gt;alert(&quot;xss&quot;)&lt;/script&gt; 300"]
+    assert XSS_NAME not in response.text
+
+    again = client.get("/api/v1/map/data/user", headers={"If-None-Match": response.headers["etag"]})
+    assert again.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def _decode_points(encoded: str) -> list[float]:
+    """The map page's points() decoder, in Python."""
+    out, last, value, shift = [], [0, 0], 0, 0
+    for char in encoded:
+        chunk = ord(char) - 63
+        value |= (chunk & 0x1F) << shift
+        shift += 5
+        if chunk < 0x20:
+            k = len(out) & 1
+            last[k] += ~(value >> 1) if value & 1 else value >> 1
+            out.append(last[k] / map_render.COORDINATE_SCALE)
+            value = shift = 0
+    return out
+
+
+def test_encode_points_is_polyline_encoding():
+    # Google's reference example, at 1e5; the same digits at 1e6 encode identically.
+    reference = [38.5, -120.2, 40.7, -120.95, 43.252, -126.453]
+    assert map_render.encode_points([v / 10 for v in reference]) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    points = [30.740501, -88.20578, 30.740502, -88.20577, -89.999999, 179.999999, 0.0, 0.0]
+    assert _decode_points(map_render.encode_points(points)) == points
+
+
+def test_compact_coordinates(xss_user_course, monkeypatch):
+    monkeypatch.setattr(settings, "MAP_COMPACT_COORDINATES", True)
+    (layer,) = client.get("/api/v1/map/data/user").json()["layers"]
+    assert _decode_points(layer["points"]) == [30.740501, -88.20578]
+    (layer,) = client.get("/api/v1/map/clusters/all?z=9&bbox=-89,30,-88,31").json()["layers"]
+    assert _decode_points(layer["points"]) == [30.740501, -88.20578]
+    (level, *_) = client.get("/api/v1/map/data/all").json()["layers"][0]["levels"]
+    assert _decode_points(level["points"]) == [30.740501, -88.20578]
+    page = generate_all_users_map(TestingSessionLocal())
+    assert json.dumps(map_render.encode_points([30.740501, -88.20578])) in page
+    assert page.count("<script") == TRUSTED_MAP_SCRIPT_COUNT
+
+
+def test_all_users_map_data_escapes_layer_names(xss_user_course):
+    response = client.get("/api/v1/map/data/all")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["layerControl"] is True
+    assert data["clusters"]["embedded"] == EMBEDDED_CLUSTER_ZOOM
+    (layer,) = data["layers"]
+    assert layer["name"].endswith("&lt;img src=x onerror=alert(1)&gt;")
+    assert len(layer["levels"]) == EMBEDDED_CLUSTER_ZOOM + 1
+    for level in layer["levels"]:
+        assert level["counts"] == [1]
+        assert level["labels"] == ["&lt;script&gt;alert(&quot;xss&quot;)&lt;/script&gt; (2024)"]
+
+
+def test_all_users_clusters_in_view(xss_user_course):
+    build = client.get("/api/v1/map/data/all").json()["clusters"]["build"]
+    response = client.get("/api/v1/map/clusters/all?z=9&bbox=-89,30,-88,31")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert (data["type"], data["build"], data["zoom"]) == ("clusters", build, 9)
+    (layer,) = data["layers"]
+    assert layer["points"] == [30.740501, -88.20578]
+    assert layer["counts"] == [1]
+
+    (layer,) = client.get("/api/v1/map/clusters/all?z=9&bbox=-10,50,0,60").json()["layers"]
+    assert layer["counts"] == []
+    assert client.get("/api/v1/map/clusters/all?z=30").status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_user_geojson_filters(xss_user_course):
+    response = client.get("/api/v1/map/geojson/user")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/geo+json"
+    (feature,) = response.json()["features"]
+    assert feature["geometry"] == {"type": "Point", "coordinates": [-88.20578, 30.740501]}
+    # Plain text: GeoJSON consumers escape for themselves.
+    assert feature["properties"] == {"course_id": 300, "name": XSS_NAME, "year": 2024}
+
+    assert client.get("/api/v1/map/geojson/user?year=2023").json()["features"] == []
+    assert len(client.get("/api/v1/map/geojson/user?bbox=-89,30,-88,31").json()["features"]) == 1
+    assert client.get("/api/v1/map/geojson/user?bbox=-10,50,0,60").json()["features"] == []
+    assert client.get("/api/v1/map/geojson/user?bbox=1,2,3").status_code == 422
+
+
+def test_all_users_geojson_filters_by_user(xss_user_course):
+    (feature,) = client.get("/api/v1/map/geojson/all?user_id=1").json()["features"]
+    assert feature["properties"]["user"] == XSS_USERNAME
+    assert client.get("/api/v1/map/geojson/all?user_id=2").json()["features"] == []
+
+
+def test_stream_feature_collection_is_valid_json_across_chunks():
+    features = (geojson.point_feature(i / 1000, 0.0, {"i": i}) for i in range(geojson.CHUNK_FEATURES * 2 + 3))
+    chunks = list(geojson.stream_feature_collection(features))
+    assert len(chunks) == 5
+    collection = json.loads("".join(chunks))
+    assert [f["properties"]["i"] for f in collection["features"]] == list(range(geojson.CHUNK_FEATURES * 2 + 3))
+    assert json.loads("".join(geojson.stream_feature_collection([]))) == {"type": "FeatureCollection", "features": []}
@@ -0,0 +1,93 @@
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from app import map_shares
+from app.dependencies import get_current_user, get_db
+from app.models import Users
+from app.user_maps import store
+
+from .utils import TestingSessionLocal, app, client, engine, override_get_current_user, override_get_db
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.fixture
+def shares(test_user, test_user_courses):
+    store.clear()
+    yield
+    store.clear()
+    with engine.connect() as con:
+        con.execute(text("DELETE FROM map_shares;"))
+        con.commit()
+
+
+def _path(url: str) -> str:
+    return url.removeprefix("http://testserver")
+
+
+def test_tokens_are_signed():
+    token = map_shares.token(42)
+    assert map_shares.share_id(token) == 42
+    assert map_shares.share_id(token.replace("42.", "43.")) is None
+    assert map_shares.share_id("42." + "A" * len(token.split(".")[1])) is None
+    for bad in ("42", "42.", "", "٤٢." + token.split(".")[1], "42.é"):
+        assert map_shares.share_id(bad) is None
+
+
+def test_shared_map_is_public_and_cacheable(shares, monkeypatch):
+    created = client.post("/api/v1/map/shares")
+    assert created.status_code == status.HTTP_201_CREATED
+    # No session from here on: shared links must not depend on get_current_user.
+    monkeypatch.delitem(app.dependency_overrides, get_current_user)
+    assert client.post("/api/v1/map/shares").status_code == status.HTTP_401_UNAUTHORIZED
+
+    redirect = client.get(_path(created.json()["url"]), follow_redirects=False)
+    assert redirect.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert redirect.headers["cache-control"] == "public, max-age=60"
+
+    page = client.get(redirect.headers["location"], headers={"Accept-Encoding": "br"})
+    assert page.status_code == status.HTTP_200_OK
+    assert page.headers["cache-control"] == "public, max-age=3600, immutable"
+    assert page.headers["content-encoding"] == "br"
+    assert "Accept-Encoding" in page.headers["vary"]
+    assert "RTJ Golf Trail at Magnolia Grove" in page.text
+    csp = page.headers["content-security-policy"]
+    assert "'sha256-" in csp and "'unsafe-inline'" not in csp.split("script-src")[1].split(";")[0]
+
+    # Once the page is superseded the old URL sends viewers back to the link.
+    store.clear()
+    stale = client.get(redirect.headers["location"], follow_redirects=False)
+    assert stale.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert stale.headers["location"] == _path(created.json()["url"])
+
+
+def test_revoked_and_forged_links_are_not_found(shares):
+    share = client.post("/api/v1/map/shares").json()
+    assert [s["id"] for s in client.get("/api/v1/map/shares").json()] == [share["id"]]
+    location = client.get(_path(share["url"]), follow_redirects=False).headers["location"]
+
+    forged = _path(share["url"])[:-1] + ("A" if not share["url"].endswith("A") else "B")
+    assert client.get(forged).status_code == status.HTTP_404_NOT_FOUND
+
+    assert client.delete(f"/api/v1/map/shares/{share['id']}").status_code == status.HTTP_204_NO_CONTENT
+    assert client.delete(f"/api/v1/map/shares/{share['id']}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/shares").json() == []
+    assert client.get(_path(share["url"])).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(location).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_links_stop_working_for_inactive_users(shares):
+    share = client.post("/api/v1/map/shares").json()
+    db = TestingSessionLocal()
+    db.query(Users).filter(Users.id == 1).update({"is_active": False})
+    db.commit()
+    assert client.get(_path(share["url"])).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_only_the_owner_can_revoke(shares, monkeypatch):
+    share = client.post("/api/v1/map/shares").json()
+    monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: {"username": "other", "id": 2})
+    assert client.delete(f"/api/v1/map/shares/{share['id']}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/shares").json() == []
@@ -0,0 +1,142 @@
+import json
+import time
+
+from app import map_store
+from app.map_store import STORE_EVICTIONS, STORE_HITS, STORE_MISSES, MapStore
+
+
+def _counter(metric) -> float:
+    return metric._value.get()
+
+
+def test_paths_are_sharded_by_key_hash(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    path = store.put("user/1/abc", "<html>").path
+    assert path.relative_to(tmp_path).parts[:2] == (path.name[:2], path.name[2:4])
+    assert path.read_text(encoding="utf-8") == "<html>"
+    assert store.get("user/1/abc").path == path
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    hits, misses = _counter(STORE_HITS), _counter(STORE_MISSES)
+    store.put("a", "x")
+    assert store.get("a") is not None
+    assert store.get("b") is None
+    assert (_counter(STORE_HITS) - hits, _counter(STORE_MISSES) - misses) == (1, 1)
+
+
+def test_quota_evicts_least_recently_accessed(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=30)
+    evictions = _counter(STORE_EVICTIONS)
+    for key in "abc":
+        store.put(key, "x" * 10)
+    store.get("a")  # now b is the least recently used
+    store.put("d", "x" * 10)
+    assert store.get("b") is None
+    assert not store.path("b").exists()
+    assert all(store.get(key) is not None for key in "acd")
+    assert store.stats() == (3, 30)
+    assert _counter(STORE_EVICTIONS) - evictions == 1
+
+
+def test_oversized_artifact_is_still_kept(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=5)
+    store.put("small", "x")
+    store.put("big", "x" * 50)
+    assert store.get("big") is not None
+    assert store.get("small") is None
+
+
+def test_replace_group_drops_siblings(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    old = store.put("user/1/old", "old", group="user/1").path
+    store.put("user/2/x", "x", group="user/2")
+    store.put("user/1/new", "new", group="user/1", replace_group=True)
+    assert store.group("user/1") == ["user/1/new"]
+    assert store.group("user/2") == ["user/2/x"]
+    assert not old.exists()
+
+
+def test_index_survives_restart(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    store.put("a", "aaa", group="g")
+    store.put("b", "bb")
+    store.delete("b")
+    store.put("b", "bb")
+    store.flush()
+    index = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert set(index["entries"]) == {"a", "b"}
+    assert not (tmp_path / "journal.jsonl").exists()
+
+    reopened = MapStore(tmp_path, quota_bytes=1_000)
+    assert reopened.stats() == (2, 5)
+    assert reopened.group("g") == ["a"]
+    assert reopened.get("a").path.read_text(encoding="utf-8") == "aaa"
+
+
+def test_writes_append_to_the_journal_until_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_store, "JOURNAL_MAX_LINES", 4)
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    store.put("a", "aaa")
+    snapshot = (tmp_path / "index.json").stat().st_mtime_ns
+    store.put("b", "bb")
+    store.delete("a")
+    assert (tmp_path / "index.json").stat().st_mtime_ns == snapshot
+    assert len((tmp_path / "journal.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+
+    # Without a compaction, the journal alone brings a restart up to date.
+    assert MapStore(tmp_path, quota_bytes=1_000).stats() == (1, 2)
+
+    store.put("c", "c")
+    # Compaction happens on the store's background thread.
+    for _ in range(100):
+        if not store._compactor.pending():
+            break
+        time.sleep(0.01)
+    index = json.loads((tmp_path / "index.json").read_text(encoding="utf-8"))
+    assert set(index["entries"]) == {"b", "c"}
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_torn_journal_line_is_dropped(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    store.put("a", "aaa")
+    with (tmp_path / "journal.jsonl").open("a", encoding="utf-8") as journal:
+        journal.write('["put", "b", 2')
+
+    reopened = MapStore(tmp_path, quota_bytes=1_000)
+    assert reopened.stats() == (1, 3)
+    reopened.put("c", "c")
+    assert MapStore(tmp_path, quota_bytes=1_000).stats() == (2, 4)
+
+
+def test_lost_index_discards_untracked_files(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    path = store.put("a", "aaa").path
+    (tmp_path / "index.json").write_text("not json", encoding="utf-8")
+
+    reopened = MapStore(tmp_path, quota_bytes=1_000)
+    assert reopened.get("a") is None
+    assert not path.exists()
+    assert reopened.stats() == (0, 0)
+
+
+def test_file_removed_behind_the_store_is_a_miss(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    store.put("a", "aaa").path.unlink()
+    assert store.get("a") is None
+    assert store.stats() == (0, 0)
+
+
+def test_variants_are_stored_beside_the_artifact(tmp_path):
+    store = MapStore(tmp_path, quota_bytes=1_000)
+    artifact = store.put("a", "aaaa", variants={"gzip": b"gz", "br": b"b"})
+    assert store.stats() == (1, 7)
+    path, encoding = store.get("a").select("gzip, br")
+    assert (path.name, encoding) == (artifact.path.name + ".br", "br")
+    assert path.read_bytes() == b"b"
+    assert store.get("a").select("identity") == (artifact.path, None)
+
+    store.delete("a")
+    assert not list(tmp_path.glob("*/*/*"))
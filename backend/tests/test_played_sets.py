@@ -0,0 +1,97 @@
+import pytest
+from fastapi import status
+from sqlalchemy import text
+
+from app import played_sets
+from app.dependencies import get_current_user, get_db
+from app.models import Courses, UserCourses, Users
+from app.routers import map as map_router
+
+from .utils import TestingSessionLocal, app, client, engine, override_get_current_user, override_get_db
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def _user(user_id: int, username: str, active: bool = True) -> Users:
+    return Users(
+        id=user_id,
+        email=f"{username}@mail.com",
+        username=username,
+        first_name="x",
+        last_name="y",
+        hashed_password="not-used",
+        is_active=active,
+        role="user",
+    )
+
+
+def _course(course_id: int, name: str, located: bool = True) -> Courses:
+    lat, lon = (30.0 + course_id / 100, -88.0) if located else (None, None)
+    return Courses(id=course_id, club_name=name, course_name=None, country="USA", latitude=lat, longitude=lon)
+
+
+@pytest.fixture
+def two_players():
+    db = TestingSessionLocal()
+    db.add_all([_user(1, "alice"), _user(2, "bob"), _user(3, "carol", active=False)])
+    db.add_all(
+        [_course(300, "Shared"), _course(301, "Alice's"), _course(302, "Bob's"), _course(303, "Unmapped", False)]
+    )
+    db.add_all(
+        [
+            UserCourses(id=1, user_id=1, course_id=300, year=2020),
+            UserCourses(id=2, user_id=1, course_id=301, year=2021),
+            UserCourses(id=3, user_id=1, course_id=303, year=2021),
+            UserCourses(id=4, user_id=2, course_id=300, year=2019),
+            UserCourses(id=5, user_id=2, course_id=302, year=2022),
+        ]
+    )
+    db.commit()
+    yield db
+    db.close()
+    with engine.connect() as con:
+        con.execute(text("DELETE FROM user_courses;"))
+        con.execute(text("DELETE FROM courses;"))
+        con.execute(text("DELETE FROM users;"))
+        con.commit()
+
+
+def test_compare(two_players):
+    both, only_a, only_b = played_sets.compare(two_players, 1, 2)
+    assert (both.tolist(), only_a.tolist(), only_b.tolist()) == ([300], [301, 303], [302])
+    assert played_sets.compare(two_players, 1, 99)[1].tolist() == [300, 301, 303]
+
+
+def test_compare_map(two_players, monkeypatch):
+    renders = []
+    render = map_router.render_pool.render
+    monkeypatch.setattr(
+        map_router.render_pool, "render", lambda kind, *args: renders.append(kind) or render(kind, *args)
+    )
+
+    response = client.get("/api/v1/map/compare?user_a=1&user_b=2")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/html")
+    # Unlocated courses are played, but not drawn or counted.
+    for name in ("Both (1)", "Only alice (1)", "Only bob (1)"):
+        assert name in response.text
+    assert "Unmapped" not in response.text
+
+    # Cached until either user's courses change.
+    assert client.get("/api/v1/map/compare?user_a=1&user_b=2").text == response.text
+    assert renders.count("compare") == 1
+    assert client.delete("/api/v1/user_courses/delete/301").status_code == status.HTTP_204_NO_CONTENT
+    assert "Only alice (0)" in client.get("/api/v1/map/compare?user_a=1&user_b=2").text
+    assert renders.count("compare") == 2
+
+    # A and B get different colors, so the other order is its own map.
+    swapped = client.get("/api/v1/map/compare?user_a=2&user_b=1").text
+    assert swapped.index("Only bob") < swapped.index("Only alice")
+
+
+def test_compare_map_rejects_bad_pairs(two_players):
+    assert client.get("/api/v1/map/compare?user_a=1&user_b=1").status_code == 422
+    assert client.get("/api/v1/map/compare?user_a=1").status_code == 422
+    assert client.get("/api/v1/map/compare?user_a=1&user_b=3").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/compare?user_a=1&user_b=99").status_code == status.HTTP_404_NOT_FOUND
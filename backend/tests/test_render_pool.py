@@ -0,0 +1,41 @@
+import threading
+import time
+
+import pytest
+
+from app import map_render
+from app.render_pool import RenderPool, RenderQueueFull, RenderTimeout
+
+
+@pytest.fixture
+def pool():
+    pool = RenderPool(workers=1, max_pending=1, timeout_seconds=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_render_runs_in_worker_process(pool):
+    html_out = pool.render("user", map_render.user_map, "someone", [(30.74, -88.2, "Magnolia Grove 200")])
+    assert "Magnolia Grove 200" in html_out
+
+
+def test_render_rejects_when_queue_is_full(pool):
+    busy = threading.Thread(target=pool.render, args=("test", time.sleep, 1))
+    busy.start()
+    try:
+        time.sleep(0.1)
+        with pytest.raises(RenderQueueFull):
+            pool.render("test", time.sleep, 0)
+    finally:
+        busy.join()
+    # Capacity comes back once the worker finishes.
+    assert pool.render("test", time.sleep, 0) is None
+
+
+def test_render_times_out(pool):
+    pool.timeout_seconds = 0.2
+    with pytest.raises(RenderTimeout):
+        pool.render("test", time.sleep, 2)
+    # The abandoned render still holds its slot until the worker is done.
+    with pytest.raises(RenderQueueFull):
+        pool.render("test", time.sleep, 0)
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+from fastapi import status
+
+from app import tiles
+from app.dependencies import get_current_user, get_db
+
+from .utils import TestingSessionLocal, app, client, override_get_current_user, override_get_db
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        result |= (b & 0x7F) << shift
+        pos += 1
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf: bytes) -> list[tuple[int, int | bytes]]:
+    out, pos = [], 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        if key & 7 == 0:
+            value, pos = _read_varint(buf, pos)
+        else:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos : pos + length], pos + length
+        out.append((key >> 3, value))
+    return out
+
+
+def _packed(buf: bytes) -> list[int]:
+    values, pos = [], 0
+    while pos < len(buf):
+        value, pos = _read_varint(buf, pos)
+        values.append(value)
+    return values
+
+
+def _decode(tile: bytes) -> dict:
+    ((number, layer),) = _fields(tile)
+    assert number == 3
+    fields = _fields(layer)
+    keys = [v.decode() for n, v in fields if n == 3]
+    values = []
+    for n, v in fields:
+        if n == 4:
+            ((kind, raw),) = _fields(v)
+            values.append(raw.decode() if kind == 1 else raw)
+    features = []
+    for n, v in fields:
+        if n == 2:
+            f = dict(_fields(v))
+            tags = _packed(f[2])
+            props = {keys[k]: values[t] for k, t in zip(tags[::2], tags[1::2], strict=True)}
+            features.append({"id": f[1], "props": props})
+    return {"name": next(v.decode() for n, v in fields if n == 1), "version": dict(fields)[15], "features": features}
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(-60, 70, 2000), rng.uniform(-180, 180, 2000)
+    rows = [(i, float(lat[i]), float(lon[i]), {"name": f"course {i}", "year": 2000 + i % 20}) for i in range(2000)]
+    return tiles.LayerIndex.build("courses", rows)
+
+
+@pytest.mark.parametrize("z", [0, 3, 9, 17])
+def test_index_query_matches_brute_force(index, z):
+    n = 1 << z
+    b = tiles.BUFFER / tiles.EXTENT
+    for tx, ty in {(int(x * n), int(y * n)) for x, y in zip(index.x[:25], index.y[:25], strict=True)}:
+        px, py = index.x * n - tx, index.y * n - ty
+        expected = np.flatnonzero((px >= -b) & (px <= 1 + b) & (py >= -b) & (py <= 1 + b))
+        assert index.query(z, tx, ty).tolist() == expected.tolist()
+
+
+def test_encode_tile_round_trips(index):
+    tile = tiles.encode_tile(index, 0, 0, 0)
+    decoded = _decode(tile)
+    assert decoded["name"] == "courses"
+    assert decoded["version"] == 2
+    assert len(decoded["features"]) == 2000
+    first = next(f for f in decoded["features"] if f["id"] == 7)
+    assert first["props"] == {"name": "course 7", "year": 2007}
+    assert tiles.encode_tile(index, 10, 0, 0) == b""
+
+
+def test_tile_endpoints(test_user, test_user_courses):
+    response = client.get("/api/v1/map/tiles/courses/0/0/0.pbf")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    (feature,) = _decode(response.content)["features"]
+    assert feature["id"] == 200
+
+    (played,) = _decode(client.get("/api/v1/map/tiles/played/0/0/0.pbf").content)["features"]
+    assert played["props"]["name"] == "RTJ Golf Trail at Magnolia Grove - Falls"
+    (play,) = _decode(client.get("/api/v1/map/tiles/all/0/0/0.pbf").content)["features"]
+    assert play["props"]["course_id"] == 200
+
+    assert client.get("/api/v1/map/tiles/courses/1/1/0.pbf").content == b""
+    assert client.get("/api/v1/map/tiles/courses/1/2/0.pbf").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/api/v1/map/tiles/nope/0/0/0.pbf").status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_seeded_tiles_are_served_and_replaced(test_user_courses, tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, "TILE_DIR", tmp_path)
+    index = tiles.load_courses(TestingSessionLocal())
+    stale = tmp_path / "courses" / "oldfingerprint"
+    stale.mkdir(parents=True)
+    written = tiles.seed(index, max_zoom=2, out=lambda _: None)
+    assert written == 3
+    assert not stale.exists()
+
+    seeded = tiles.seeded_path(index, 0, 0, 0)
+    seeded.write_bytes(b"seeded")
+    assert tiles.get_tile(TestingSessionLocal(), "courses", 1, 0, 0, 0) == b"seeded"
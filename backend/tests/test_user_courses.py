@@ -1,7 +1,12 @@
+import threading
+import time
+
 import pytest
 from fastapi import status
 from sqlalchemy import text
 
+from app import recommendations
+from app.cache import versions
 from app.dependencies import get_current_user, get_db
 from app.models import Courses, UserCourses
 
@@ -107,3 +112,160 @@ def test_readall_ids_w_year_datetime_created_at(test_user_courses_with_datetime)
     assert len(data) == 1
     assert data[0]["created_at"] is not None
     assert data[0]["year"] == 2024
+
+
+@pytest.fixture
+def two_played_courses(test_user_courses):
+    db = TestingSessionLocal()
+    db.add(Courses(id=301, club_name="Pebble Beach", course_name=None, latitude=36.5686, longitude=-121.9496))
+    db.add(UserCourses(id=4, course_id=301, user_id=1, year=2023))
+    db.commit()
+    yield
+
+
+def test_geo_stats(two_played_courses):
+    response = client.get("/api/v1/user_courses/stats/geo", params={"home_lat": 30.74, "home_lon": -88.2})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["total_courses"] == 2
+    assert data["bounding_box"]["min_longitude"] == pytest.approx(-121.9496)
+    pair = data["farthest_pair"]
+    assert {pair["a"]["id"], pair["b"]["id"]} == {200, 301}
+    assert pair["distance_km"] == pytest.approx(3173, rel=0.01)
+    assert data["home"]["nearest"]["id"] == 200
+    assert data["home"]["farthest"]["display_name"] == "Pebble Beach"
+    assert [y["year"] for y in data["years"]] == [2021, 2023]
+
+
+def test_geo_stats_requires_both_home_coordinates(test_user_courses):
+    response = client.get("/api/v1/user_courses/stats/geo", params={"home_lat": 30.0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_geo_stats_cache_refreshes_after_write(test_user_courses):
+    assert client.get("/api/v1/user_courses/stats/geo").json()["total_courses"] == 1
+    db = TestingSessionLocal()
+    db.add(Courses(id=302, course_name="Second", latitude=31.0, longitude=-89.0))
+    db.commit()
+    response = client.post("/api/v1/user_courses/add_course", json={"garmin_id": 302, "year": 2024})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert client.get("/api/v1/user_courses/stats/geo").json()["total_courses"] == 2
+
+
+@pytest.fixture
+def trip_courses(test_user_courses):
+    # Course 200 (Mobile, 2021) plus a second Mobile-area course the same
+    # year and a lone Pebble Beach round in 2023.
+    db = TestingSessionLocal()
+    db.add_all(
+        [
+            Courses(id=310, course_name="Azalea City", latitude=30.69, longitude=-88.13),
+            Courses(id=311, course_name="Pebble Beach", latitude=36.5686, longitude=-121.9496),
+            UserCourses(id=10, course_id=310, user_id=1, year=2021),
+            UserCourses(id=11, course_id=311, user_id=1, year=2023),
+        ]
+    )
+    db.commit()
+    yield
+
+
+def test_trips_groups_nearby_courses_in_same_year(trip_courses):
+    response = client.get("/api/v1/user_courses/trips")
+    assert response.status_code == status.HTTP_200_OK
+    trips = response.json()
+    assert len(trips) == 1
+    assert trips[0]["year"] == 2021
+    assert sorted(c["id"] for c in trips[0]["courses"]) == [200, 310]
+
+
+def test_trips_recomputes_only_changed_year(trip_courses, monkeypatch):
+    from app.routers import user_courses
+
+    computed = []
+    real_find_trips = user_courses.find_trips
+    monkeypatch.setattr(user_courses, "find_trips", lambda y, rows: computed.append(y) or real_find_trips(y, rows))
+    client.get("/api/v1/user_courses/trips")
+    computed.clear()
+    response = client.patch("/api/v1/user_courses/11/year", json={"year": 2021})
+    assert response.status_code == status.HTTP_200_OK
+    trips = client.get("/api/v1/user_courses/trips").json()
+    assert computed == [2021]
+    assert [len(t["courses"]) for t in trips] == [2]
+
+
+@pytest.fixture
+def catalog_courses(test_user_courses):
+    # Two unplayed courses near the played Mobile course (one more popular),
+    # and one far away.
+    db = TestingSessionLocal()
+    db.add_all(
+        [
+            Courses(id=320, course_name="Nearby Quiet", latitude=30.70, longitude=-88.15),
+            Courses(id=321, course_name="Nearby Busy", latitude=30.80, longitude=-88.25),
+            Courses(id=322, course_name="Far Away", latitude=47.6, longitude=-122.3),
+            UserCourses(id=20, course_id=321, user_id=2, year=2022),
+            UserCourses(id=21, course_id=321, user_id=3, year=2022),
+        ]
+    )
+    db.commit()
+    yield
+
+
+def test_recommendations_rank_unplayed_nearby_courses(catalog_courses):
+    response = client.get("/api/v1/user_courses/recommendations")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [r["id"] for r in data] == [321, 320]
+    assert data[0]["popularity"] == 2
+    assert data[0]["near_course_id"] == 200
+
+
+def test_recommendations_exclude_newly_played_course(catalog_courses):
+    client.get("/api/v1/user_courses/recommendations")
+    response = client.post("/api/v1/user_courses/add_course", json={"garmin_id": 321, "year": 2024})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [r["id"] for r in client.get("/api/v1/user_courses/recommendations").json()] == [320]
+
+
+def test_recommendations_reload_the_catalog_in_the_background(catalog_courses, monkeypatch):
+    assert [r["id"] for r in client.get("/api/v1/user_courses/recommendations").json()] == [321, 320]
+    loads, release = [], threading.Event()
+    real_load = recommendations.CourseCatalog.load
+
+    def slow_load(db):
+        loads.append(1)
+        release.wait(5)
+        return real_load(db)
+
+    monkeypatch.setattr(recommendations.CourseCatalog, "load", slow_load)
+    db = TestingSessionLocal()
+    db.add(Courses(id=323, course_name="Nearby New", latitude=30.75, longitude=-88.2))
+    db.commit()
+    versions.bump_catalog()
+
+    # Readers keep the old catalog while the new one loads.
+    assert [r["id"] for r in client.get("/api/v1/user_courses/recommendations").json()] == [321, 320]
+    release.set()
+    for _ in range(100):
+        ids = [r["id"] for r in client.get("/api/v1/user_courses/recommendations").json()]
+        if 323 in ids:
+            break
+        time.sleep(0.05)
+    assert 323 in ids
+    assert len(loads) == 1
+
+    # Popularity going stale reloads the catalog, but doesn't drop cached results.
+    monkeypatch.setattr(recommendations, "POPULARITY_TTL_SECONDS", 0)
+    computes = []
+    real_compute = recommendations.compute_recommendations
+    monkeypatch.setattr(
+        recommendations, "compute_recommendations", lambda *args: computes.append(1) or real_compute(*args)
+    )
+    client.get("/api/v1/user_courses/recommendations")
+    for _ in range(100):
+        if len(loads) == 2 and not recommendations._catalog._reloader.pending():
+            break
+        time.sleep(0.05)
+    assert len(loads) == 2
+    client.get("/api/v1/user_courses/recommendations")
+    assert computes == []
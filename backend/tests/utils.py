@@ -3,7 +3,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from app.database import Base
+from app.database import Base, SessionLocal
 from app.main import app
 
 SQLALCHEMY_DATABASE_URL = "sqlite://"
@@ -14,6 +14,9 @@ engine = create_engine(
 )
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Background jobs open their own sessions from app.database.SessionLocal
+# rather than going through get_db, so point that at the test DB too.
+SessionLocal.configure(bind=engine)
 Base.metadata.create_all(bind=engine)
 
 
@@ -1,13 +1,15 @@
 import React, { useEffect, useRef, useState, useCallback } from 'react';
 import api from '../services/api';
 import { useAuth } from './AuthProvider';
-import { nonceScriptTags } from '../utils/cspNonce';
+import { loadMapShell } from '../utils/mapUtils';
+import MapFrame from './MapFrame';
 
 function AllUsersMap() {
     const activeCallRef = useRef(null);
     const { token } = useAuth();
     const [status, setStatus] = useState('loading');
-    const [mapHtml, setMapHtml] = useState('');
+    const [shell, setShell] = useState('');
+    const [mapData, setMapData] = useState(null);
 
     const loadMap = useCallback(async () => {
         const callId = {};
@@ -16,9 +18,10 @@ function AllUsersMap() {
 
         setStatus('loading');
         try {
-            const response = await api.get('/map/allmap?rand=' + new Date());
+            const [shellHtml, response] = await Promise.all([loadMapShell(), api.get('/map/data/all')]);
             if (!isCurrent()) return;
-            setMapHtml(nonceScriptTags(response.data));
+            setShell(shellHtml);
+            setMapData(response.data);
             setStatus('loaded');
         } catch {
             if (isCurrent()) setStatus('error');
@@ -27,6 +30,24 @@ function AllUsersMap() {
 
     useEffect(() => { loadMap(); }, [token, loadMap]);
 
+    // The map embeds clusters for the first few zooms only; zoomed in further
+    // it asks for the clusters in view, and if those come from newer data
+    // than it was drawn with, it asks for the whole map again.
+    const handleFrameMessage = useCallback(async (message, reply) => {
+        if (message?.type === 'view') {
+            try {
+                const response = await api.get('/map/clusters/all', {
+                    params: { z: message.zoom, bbox: message.bbox },
+                });
+                reply(response.data);
+            } catch {
+                // Keep showing what's drawn; the next pan or zoom asks again.
+            }
+        } else if (message?.type === 'stale') {
+            loadMap();
+        }
+    }, [loadMap]);
+
     return (
         <div className="map-wrapper">
             <div className="map-overlay-bar">
@@ -39,14 +60,12 @@ function AllUsersMap() {
             {status === 'loading' && <p className="map-status">Loading map…</p>}
             {status === 'error' && <p className="map-status">Failed to load map. Please try again later.</p>}
 
-            <iframe
+            <MapFrame
                 title="All Users Golf Map"
-                className="map-iframe"
-                srcDoc={mapHtml}
-                // No allow-same-origin: keeps the folium document in an opaque
-                // origin so injected content can't reach localStorage/the token.
-                sandbox="allow-scripts"
-                style={{ display: status === 'loaded' ? 'block' : 'none' }}
+                shell={shell}
+                data={mapData}
+                visible={status === 'loaded'}
+                onMessage={handleFrameMessage}
             />
         </div>
     );
@@ -1,18 +1,25 @@
 import React, { useEffect, useRef, useState, useCallback } from 'react';
 import api from '../services/api';
 import { useAuth } from './AuthProvider';
-import { nonceScriptTags } from '../utils/cspNonce';
+import { loadMapShell } from '../utils/mapUtils';
+import MapFrame from './MapFrame';
 
 function Map() {
     const activeCallRef = useRef(null);
     const { token } = useAuth();
     const [status, setStatus] = useState('loading');
-    const [mapHtml, setMapHtml] = useState('');
+    const [shell, setShell] = useState('');
+    const [mapData, setMapData] = useState(null);
+    const [years, setYears] = useState([]);
+    // '' is every year; the server caches each year's map separately.
+    const [year, setYear] = useState('');
 
-    const renderMap = useCallback(async (callId, forceGenerate = false) => {
+    const loadMap = useCallback(async () => {
+        const callId = {};
+        activeCallRef.current = callId;
         const isCurrent = () => activeCallRef.current === callId;
 
-        setStatus(forceGenerate ? 'generating' : 'loading');
+        setStatus('loading');
         try {
             const coursesRes = await api.get('/user_courses/readall_ids_w_year');
             if (!isCurrent()) return;
@@ -20,50 +27,27 @@ function Map() {
                 setStatus('empty');
                 return;
             }
+            const played = new Set(coursesRes.data.map(c => c.year).filter(Boolean));
+            setYears([...played].sort((a, b) => b - a));
         } catch {
             if (isCurrent()) setStatus('error');
             return;
         }
 
         try {
-            if (forceGenerate) {
-                await api.get('/map/user_map_generate');
-                if (!isCurrent()) return;
-            }
-
-            let response;
-            try {
-                response = await api.get('/map/usermap?rand=' + new Date());
-            } catch (error) {
-                if (!isCurrent()) return;
-                if (error.response?.status === 404) {
-                    setStatus('generating');
-                    await api.get('/map/user_map_generate');
-                    if (!isCurrent()) return;
-                    response = await api.get('/map/usermap');
-                } else {
-                    throw error;
-                }
-            }
+            const params = year ? { year_from: year, year_to: year } : {};
+            const [shellHtml, response] = await Promise.all([
+                loadMapShell(),
+                api.get('/map/data/user', { params }),
+            ]);
             if (!isCurrent()) return;
-            setMapHtml(nonceScriptTags(response.data));
+            setShell(shellHtml);
+            setMapData(response.data);
             setStatus('loaded');
         } catch {
             if (isCurrent()) setStatus('error');
         }
-    }, []);
-
-    const loadMap = useCallback(() => {
-        const callId = {};
-        activeCallRef.current = callId;
-        renderMap(callId, false);
-    }, [renderMap]);
-
-    const regenerateMap = useCallback(() => {
-        const callId = {};
-        activeCallRef.current = callId;
-        renderMap(callId, true);
-    }, [renderMap]);
+    }, [year]);
 
     useEffect(() => { loadMap(); }, [token, loadMap]);
 
@@ -71,13 +55,26 @@ function Map() {
         <div className="map-wrapper">
             <div className="map-overlay-bar">
                 <div className="map-title-chip">🗺 Your Golf Map</div>
-                <button className="btn-ghost" onClick={regenerateMap}>
-                    ⟳ Regenerate Map
+                {years.length > 1 && (
+                    <select
+                        value={year}
+                        onChange={e => setYear(e.target.value)}
+                        className="filter-input"
+                        style={{ width: 'auto' }}
+                        aria-label="Year played"
+                    >
+                        <option value="">All years</option>
+                        {years.map(y => (
+                            <option key={y} value={y}>{y}</option>
+                        ))}
+                    </select>
+                )}
+                <button className="btn-ghost" onClick={loadMap}>
+                    ⟳ Refresh Map
                 </button>
             </div>
 
             {status === 'loading' && <p className="map-status">Loading map…</p>}
-            {status === 'generating' && <p className="map-status">Generating your map, this may take a moment…</p>}
             {status === 'empty' && (
                 <p className="map-status">
                     You haven't added any courses yet.{' '}
@@ -86,15 +83,7 @@ function Map() {
             )}
             {status === 'error' && <p className="map-status">Failed to load map. Please try again later.</p>}
 
-            <iframe
-                title="Golf Course Map"
-                className="map-iframe"
-                srcDoc={mapHtml}
-                // No allow-same-origin: keeps the folium document in an opaque
-                // origin so injected content can't reach localStorage/the token.
-                sandbox="allow-scripts"
-                style={{ display: status === 'loaded' ? 'block' : 'none' }}
-            />
+            <MapFrame title="Golf Course Map" shell={shell} data={mapData} visible={status === 'loaded'} />
         </div>
     );
 }
@@ -0,0 +1,51 @@
+import React, { useEffect, useMemo, useRef, useState } from 'react';
+import { nonceScriptTags } from '../utils/cspNonce';
+
+// Renders the backend's static map shell (see /map/shell) in a sandboxed
+// iframe and posts the marker document into it once it has loaded. The
+// shell only accepts messages from this window, and swapping `data` redraws
+// in place without reloading Leaflet. Messages the shell sends back (e.g. a
+// clustered map asking for the clusters in view) go to `onMessage`, along
+// with a `reply` that posts an answer into the frame.
+function MapFrame({ title, shell, data, visible, onMessage }) {
+    const frameRef = useRef(null);
+    const [ready, setReady] = useState(false);
+    const srcDoc = useMemo(() => (shell ? nonceScriptTags(shell) : ''), [shell]);
+
+    useEffect(() => { setReady(false); }, [shell]);
+
+    useEffect(() => {
+        if (ready && data) {
+            // The sandboxed document has an opaque origin, so there is no
+            // narrower target origin to name than '*'.
+            frameRef.current?.contentWindow?.postMessage(data, '*');
+        }
+    }, [ready, data]);
+
+    useEffect(() => {
+        if (!onMessage) return undefined;
+        const reply = (message) => frameRef.current?.contentWindow?.postMessage(message, '*');
+        const listener = (event) => {
+            // Only the frame's own document; the payload is untrusted either way.
+            if (event.source === frameRef.current?.contentWindow) onMessage(event.data, reply);
+        };
+        window.addEventListener('message', listener);
+        return () => window.removeEventListener('message', listener);
+    }, [onMessage]);
+
+    return (
+        <iframe
+            ref={frameRef}
+            title={title}
+            className="map-iframe"
+            srcDoc={srcDoc}
+            onLoad={() => setReady(Boolean(shell))}
+            // No allow-same-origin: keeps the map document in an opaque
+            // origin so injected content can't reach localStorage/the token.
+            sandbox="allow-scripts"
+            style={{ display: visible ? 'block' : 'none' }}
+        />
+    );
+}
+
+export default MapFrame;
@@ -1,10 +1,18 @@
 import api from '../services/api';
 
-export const generateUserMap = () => {
-    return api.get('/map/user_map_generate')
-        .then(response => response.data)
-        .catch(error => {
-            console.error(error);
-            throw error;
-        });
+// The map shell is the same static page for every map (the markers are
+// posted into it separately), so fetch it once per page load; the browser's
+// HTTP cache covers it across reloads.
+let shellPromise = null;
+
+export const loadMapShell = () => {
+    if (!shellPromise) {
+        shellPromise = api.get('/map/shell')
+            .then(response => response.data)
+            .catch(error => {
+                shellPromise = null;
+                throw error;
+            });
+    }
+    return shellPromise;
 };